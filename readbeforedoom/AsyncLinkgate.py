@@ -0,0 +1,158 @@
+"""
+linkgate for big URL lists, on asyncio.
+
+    async for url, result in linkgate_many(urls, concurrency=200):
+        ...
+
+Same checks and the same result dicts as linkgate(url): the offline checks are Linkgate's own, DNS goes through
+DnsCache.alookup (dns.asyncresolver, A and AAAA at once) and the HEAD request through an httpx.AsyncClient.
+At most `concurrency` URLs are in flight and at most `per_host` of them for one host. Results are yielded as
+they complete, not in input order, and `urls` is consumed lazily so a 100k line file never becomes 100k tasks.
+Verdicts are shared with linkgate through the VerdictCache.
+
+Offline testing: pass dns_cache=DnsCache(StubResolver(...)) and an httpx.AsyncClient whose transport sends
+everything to a local server.
+
+    python AsyncLinkgate.py urls.txt > verdicts.jsonl   # UrlPrefilter rejects the hopeless lines before any DNS
+"""
+
+import asyncio
+import json
+import sys
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from DnsCache import DnsCache, get_dns_cache
+from HttpClient import DEFAULT_HEADERS
+from Linkgate import _head_verdict, _ip_check, _precheck
+from UrlPrefilter import prefilter
+from VerdictCache import get_verdict_cache
+
+DEFAULT_CONCURRENCY = 100
+PER_HOST = 4  # Concurrent checks against one host, big lists often hold many URLs of the same site
+HEAD_TIMEOUT = 5  # Same as linkgate's HEAD
+
+
+class _HostLimiter:
+    # One semaphore per host, dropped again when nobody is using it so memory follows the in-flight hosts only
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self.slots: Dict[str, List] = {}  # host -> [semaphore, tasks using or waiting for it]
+
+    @asynccontextmanager
+    async def __call__(self, host: str):
+        slot = self.slots.get(host)
+        if slot is None:
+            slot = self.slots[host] = [asyncio.Semaphore(self.per_host), 0]
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                yield
+        finally:
+            slot[1] -= 1
+            if not slot[1]:
+                del self.slots[host]
+
+
+async def _check(url: str, dns_cache: DnsCache, client: httpx.AsyncClient, host_limit: _HostLimiter):
+    # linkgate's _linkgate(url) with the network parts awaited, returns (kind, result)
+    kind, checked = _precheck(url)
+    if kind:
+        return kind, checked
+    parsed, url0 = checked
+
+    async with host_limit(url0):
+        kind, checked = _ip_check(parsed, url0, await dns_cache.alookup(url0))
+        if not checked["valid"]:
+            return kind, checked
+
+        url1 = checked["url"]
+        try:
+            response = await client.head(url1, timeout=HEAD_TIMEOUT, follow_redirects=False)
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            return "unreachable", {"valid": False, "url": url1, "message": f"Connection failed: {str(e)}"}
+        return _head_verdict(url1, response)
+
+
+async def linkgate_many(
+    urls: Iterable[str],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    per_host: int = PER_HOST,
+    dns_cache: Optional[DnsCache] = None,
+    client: Optional[httpx.AsyncClient] = None,
+    cache: bool = True,
+) -> AsyncIterator[Tuple[str, dict]]:
+    """Yields (url, linkgate result) for every url as soon as it's checked"""
+    dns_cache = dns_cache or get_dns_cache()
+    verdicts = get_verdict_cache() if cache else None
+    host_limit = _HostLimiter(per_host)
+    own_client = client is None
+    if own_client:
+        client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            timeout=HEAD_TIMEOUT,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+
+    async def run(url: str):
+        if verdicts is not None:
+            cached = verdicts.get(url)
+            if cached is not None:
+                return url, cached[1]
+        try:
+            kind, result = await _check(url, dns_cache, client, host_limit)
+        except Exception as e:
+            # One odd URL shouldn't end the whole run, and an unexpected failure isn't worth caching
+            return url, {"valid": False, "url": url, "message": f"Validation failed: {e}"}
+        if verdicts is not None:
+            verdicts.put(url, kind, result)
+        return url, result
+
+    remaining = iter(urls)
+    pending = set()
+
+    def refill():
+        while len(pending) < concurrency:
+            url = next(remaining, None)
+            if url is None:
+                return
+            pending.add(asyncio.ensure_future(run(url)))
+
+    try:
+        refill()
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.discard(task)
+                yield task.result()
+            refill()
+    finally:
+        # The consumer may stop early: cancel what's left and wait for it, so DnsCache's in-flight lookups are
+        # cleaned up and no task is left pending
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        if own_client:
+            await client.aclose()
+
+
+def _read_urls(path: str):
+    # Runs the file through the offline prefilter: rejects are printed right away, only survivors get checked
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for record in prefilter(f, dedupe_hosts=False):  # Every distinct URL still gets its own verdict
+            if record["reason"] is None:
+                yield record["url"]
+            elif record["reason"] != "duplicate":
+                print(json.dumps({"input": record["input"], "valid": False, "url": record["input"],
+                                  "message": record["message"]}), flush=True)
+
+
+async def _main(path: str):
+    async for url, result in linkgate_many(_read_urls(path)):
+        print(json.dumps({"input": url, **result}), flush=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1]))
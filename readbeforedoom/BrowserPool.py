@@ -0,0 +1,344 @@
+"""
+Long-lived headless browsers for ClauseFetch.
+
+Launching Chromium is the slowest part of fetching a site, so instead of a browser per URL the pool keeps
+a few running (one per worker thread), reuses their contexts/pages and recycles a browser after a number of
+navigations (or when it stops responding).
+
+The pool only talks to a small "backend" object that can launch a browser. PlaywrightBackend is the real thing,
+FakeBackend fetches pages with urllib and pretends to be a browser, so the pool logic can be exercised
+offline against a local HTTP server:
+
+    pool = BrowserPool(FakeBackend(), max_navigations=3)
+    html = pool.fetch("http://127.0.0.1:8000/terms")
+"""
+
+import atexit
+import queue
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+from typing import Any, List, Optional, Tuple
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+
+class PlaywrightBackend:
+    # Playwright is only imported when a browser is actually launched. Its sync API is tied to the thread that
+    # started it, so every pool worker gets its own instance and stop() stops the calling thread's one
+    def __init__(self, headless: bool = True):
+        self.headless = headless
+        self.local = threading.local()
+
+    def launch(self):
+        from playwright.sync_api import sync_playwright
+
+        if getattr(self.local, "playwright", None) is None:
+            self.local.playwright = sync_playwright().start()
+        return self.local.playwright.chromium.launch(headless=self.headless)
+
+    def stop(self):
+        if getattr(self.local, "playwright", None) is not None:
+            self.local.playwright.stop()
+            self.local.playwright = None
+
+
+class _FakeResponse:
+    def __init__(self, status: int):
+        self.status = status
+
+
+class _FakePage:
+    def __init__(self, context: "_FakeContext"):
+        self.context = context
+        self.html = ""
+        self.closed = False
+
+    def goto(self, url: str, timeout: int = 30000, wait_until: str = "load"):
+        request = urllib.request.Request(url, headers={"User-Agent": self.context.user_agent})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout / 1000) as resp:
+                self.html = resp.read().decode("utf-8", errors="replace")
+                return _FakeResponse(resp.status)
+        except urllib.error.HTTPError as e:
+            return _FakeResponse(e.code)
+        except OSError as e:
+            raise TimeoutError(f"Navigation to {url} failed: {e}") from e
+
+    def wait_for_timeout(self, ms: int):
+        pass  # Nothing renders in the fake browser
+
+    def content(self) -> str:
+        return self.html
+
+    def close(self):
+        self.closed = True
+
+
+class _FakeContext:
+    def __init__(self, browser: "_FakeBrowser", user_agent: str):
+        self.browser = browser
+        self.user_agent = user_agent
+        self.pages: List[_FakePage] = []
+
+    def new_page(self) -> _FakePage:
+        page = _FakePage(self)
+        self.pages.append(page)
+        return page
+
+    def clear_cookies(self):
+        pass
+
+    def close(self):
+        for page in self.pages:
+            page.close()
+
+
+class _FakeBrowser:
+    def __init__(self):
+        self.connected = True
+        self.contexts: List[_FakeContext] = []
+
+    def new_context(self, user_agent: str = USER_AGENT) -> _FakeContext:
+        context = _FakeContext(self, user_agent)
+        self.contexts.append(context)
+        return context
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def close(self):
+        self.connected = False
+
+
+class FakeBackend:
+    """
+    Stand-in for PlaywrightBackend that needs no browser. Counts launches so tests can check recycling,
+    and crash() simulates the browser process dying.
+    """
+
+    def __init__(self):
+        self.launches = 0
+        self.browsers: List[_FakeBrowser] = []
+        self.lock = threading.Lock()  # Workers launch from their own threads
+
+    def launch(self) -> _FakeBrowser:
+        browser = _FakeBrowser()
+        with self.lock:
+            self.launches += 1
+            self.browsers.append(browser)
+        return browser
+
+    def crash(self):
+        for browser in self.browsers:
+            browser.connected = False
+
+    def stop(self):
+        pass
+
+
+class _Worker:
+    """
+    One browser thread. Playwright's sync API only works from the thread that started it, so a worker owns its
+    browser and idle page and only touches them from its own thread; jobs reach it through a queue.
+    """
+
+    def __init__(self, pool: "BrowserPool", name: str):
+        self.pool = pool
+        self.jobs: "queue.Queue" = queue.Queue()
+        self.pending = 0  # Fetches queued or running here, guarded by pool.lock
+        self.browser = None
+        self.navigations = 0
+        self.idle: Optional[Tuple[Any, Any]] = None  # (context, page) ready for the next URL
+        # A daemon thread instead of an executor: concurrent.futures stops its executors before atexit hooks run,
+        # this thread is still there when the pool is closed at exit
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            future, fn, args = job
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+
+    def submit(self, fn, *args) -> Future:
+        future: Future = Future()
+        self.jobs.put((future, fn, args))
+        return future
+
+    # Everything below runs on the worker thread
+
+    def close_browser(self):
+        if self.idle is not None:
+            try:
+                self.idle[0].close()
+            except Exception:
+                pass
+        self.idle = None
+        if self.browser is not None:
+            try:
+                self.browser.close()
+            except Exception:
+                pass
+        self.browser = None
+
+    def _healthy_browser(self):
+        # Health check + recycling: a dead or worn-out browser is replaced before the next navigation
+        if self.browser is not None:
+            if not self.browser.is_connected() or self.navigations >= self.pool.max_navigations:
+                self.close_browser()
+                self.pool._count("recycles")
+        if self.browser is None:
+            self.browser = self.pool.backend.launch()
+            self.navigations = 0
+            self.pool._count("launches")
+        return self.browser
+
+    def _checkout(self):
+        if self.idle is not None:
+            context_page, self.idle = self.idle, None
+            return context_page
+        context = self.browser.new_context(user_agent=USER_AGENT)
+        return context, context.new_page()
+
+    def _checkin(self, context, page, healthy: bool):
+        if healthy:
+            try:
+                context.clear_cookies()  # Don't carry one site's session into the next
+                self.idle = (context, page)
+                return
+            except Exception:
+                pass
+        try:
+            context.close()
+        except Exception:
+            pass
+
+    def fetch(self, url: str, timeout: int) -> Optional[str]:
+        try:
+            self._healthy_browser()
+            context, page = self._checkout()
+        except Exception:
+            self.pool._count("failures")
+            self.close_browser()
+            return None
+
+        healthy = True
+        try:
+            self.navigations += 1
+            self.pool._count("navigations")
+            response = page.goto(url, timeout=timeout, wait_until="domcontentloaded")
+            if not response or response.status >= 400:
+                return None
+
+            page.wait_for_timeout(self.pool.settle_ms)  # Waits briefly for any JS-rendered content
+            return page.content()
+
+        except Exception:
+            # Timeouts and crashed pages: drop this context, the browser gets checked on the next fetch
+            healthy = False
+            self.pool._count("failures")
+            return None
+        finally:
+            self._checkin(context, page, healthy)
+
+    def shutdown(self):
+        self.close_browser()
+        try:
+            self.pool.backend.stop()
+        except Exception:
+            pass
+
+
+class BrowserPool:
+    """
+    Fetcher that keeps browsers alive across URLs.
+
+    - workers: browser threads, each with its own Playwright and Chromium; that many pages load at once
+    - max_navigations: a browser is recycled after this many page loads, which keeps Chromium's memory in check
+    - settle_ms: how long to wait after DOMContentLoaded for JS-rendered content
+
+    fetch() is safe to call from any thread: it goes to the worker with the fewest fetches queued, and waits
+    there when all of them are busy.
+    """
+
+    def __init__(self, backend=None, workers: int = 2, max_navigations: int = 100, settle_ms: int = 2000):
+        self.backend = backend or PlaywrightBackend()
+        self.max_navigations = max_navigations
+        self.settle_ms = settle_ms
+
+        self.lock = threading.Lock()
+        self.closed = False
+        self.stats = {"launches": 0, "recycles": 0, "navigations": 0, "failures": 0}
+        self.workers = [_Worker(self, f"browser-pool-{i}") for i in range(max(1, workers))]
+
+    def _count(self, stat: str):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def fetch(self, url: str, timeout: int = 30000) -> Optional[str]:
+        """Rendered HTML of url, or None on any failure"""
+        with self.lock:
+            if self.closed:
+                return None
+            # Least busy worker, the first one on a tie so a single caller keeps reusing one browser
+            worker = min(self.workers, key=lambda w: w.pending)
+            worker.pending += 1
+            future = worker.submit(worker.fetch, url, timeout)
+        try:
+            return future.result()
+        finally:
+            with self.lock:
+                worker.pending -= 1
+
+    def close(self):
+        # Queued fetches finish first, then every worker shuts its browser down on its own thread
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            shutdowns = [worker.submit(worker.shutdown) for worker in self.workers]
+            for worker in self.workers:
+                worker.jobs.put(None)
+        for worker, shutdown in zip(self.workers, shutdowns):
+            if not worker.thread.is_alive() and not shutdown.done():
+                worker.shutdown()  # Thread already gone, stop from here as well as we can
+            else:
+                shutdown.result()
+                worker.thread.join()
+
+
+_default_pool: Optional[BrowserPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    # Process-wide pool, created on first use and closed at exit
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None or _default_pool.closed:
+            _default_pool = BrowserPool()
+            atexit.register(_default_pool.close)  # Backstop for programs that don't call close_browser_pool()
+        return _default_pool
+
+
+def close_browser_pool():
+    # Shuts the process-wide pool's browsers down, if it was ever started
+    with _default_pool_lock:
+        pool = _default_pool
+    if pool is not None:
+        pool.close()
+
+
+def set_browser_pool(pool: Optional[BrowserPool]):
+    # Swap the process-wide pool, e.g. for one built on FakeBackend in tests
+    global _default_pool
+    with _default_pool_lock:
+        _default_pool = pool
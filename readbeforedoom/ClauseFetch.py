@@ -1,9 +1,25 @@
 import requests as r
 from bs4 import BeautifulSoup as b
 import re
+import hashlib
+import html as html_lib
+import ipaddress
+import threading
 import urllib.parse as up
-from typing import List, Dict, Any, Optional
-import playwright
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple, Union
+from bs4.element import NavigableString, PreformattedString, CData
+from BrowserPool import get_browser_pool
+from Linkgate import _fetch_check, _validate_url
+from PageText import BLOCK_TAGS, PageDocument, parse_page, PageTextParser, TextBlock
+from TldRegistry import get_tld_registry
+from Database import (
+    get_fetch_strategy,
+    record_fetch_strategy,
+    get_legal_discovery,
+    record_legal_discovery,
+    forget_legal_discovery,
+)
 
 # Legal keyword fragments used for detection (disclaimer: very big)
 terms_fragments = [
@@ -21,80 +37,219 @@ terms_fragments = [
     ]
 
 
-def normalized_html(resp: r.Response) -> str:
-    # Standardize text decoding; avoid ISO-8859-1 pitfalls common in requests
-    enc = (resp.encoding or "").lower()
-    if not enc or enc == "iso-8859-1":
-        resp.encoding = "utf-8"
-    return resp.text
+def _keyword_trie_pattern(words: List[str]) -> str:
+    # Regex shaped like a trie of the words, so the engine walks one branch per position instead of trying every word
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True  # end of a word
 
+    def emit(node: Dict[str, Any]) -> str:
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Greedy optional tail: a word that is a prefix of a longer one still matches, the longer one wins
+        return f"(?:{body})?" if "" in node else body
 
-def clean_text_from_html(soup: b) -> str:
+    return emit(trie)
+
+
+# Keyword automaton over terms_fragments, built once at import.
+# The lookahead makes matches overlap, so one scan reports the longest fragment starting at every position;
+# the shorter fragments that are prefixes of it are filled in from _FRAGMENT_PREFIXES.
+_UNIQUE_FRAGMENTS = sorted({f for f in terms_fragments if f})
+_FRAGMENT_SCANNER = re.compile("(?=(" + _keyword_trie_pattern(_UNIQUE_FRAGMENTS) + "))")
+_FRAGMENT_PREFIXES = {f: [g for g in _UNIQUE_FRAGMENTS if f.startswith(g)] for f in _UNIQUE_FRAGMENTS}
+
+
+def match_fragments(text: str) -> List[str]:
+    """
+    Every legal keyword fragment found in text (case-insensitive), in order of first appearance.
+    One pass over the text, same hits as checking `fragment in text.lower()` for each fragment.
+    """
+    found: Dict[str, None] = {}
+    for longest in _FRAGMENT_SCANNER.findall(text.lower()):
+        for fragment in _FRAGMENT_PREFIXES[longest]:
+            found[fragment] = None
+    return list(found)
+
+
+def clean_text_with_index(soup: b) -> Tuple[str, Dict[str, Any]]:
+    """
+    Same text as clean_text_from_html, plus an index built in the same walk:
+    index["lines"][i] is the i-th non-empty line of the text and index["blocks"][i] the block element it came from,
+    so tac_in_page can find a line's parent block in O(1) instead of searching the DOM for it.
+    """
     for tag in soup(["script", "style", "noscript"]):
         tag.extract()
-    return soup.get_text(separator="\n", strip=True)
 
+    strings: List[str] = []
+    lines: List[str] = []
+    blocks: List[Any] = []
+    block_of: Dict[int, Any] = {}  # id(immediate parent) -> its block, most strings share a parent
+
+    for node in soup.descendants:
+        # Only real text, the same strings get_text() would use (no comments, doctype, ...)
+        if not isinstance(node, NavigableString) or (
+            isinstance(node, PreformattedString) and not isinstance(node, CData)
+        ):
+            continue
+        text = node.strip()
+        if not text:
+            continue
+        strings.append(text)
+
+        parent = node.parent
+        block = block_of.get(id(parent))
+        if block is None:
+            block = parent
+            while block.name not in BLOCK_TAGS and block.parent is not None:
+                block = block.parent
+            if block.parent is None:
+                block = parent  # Reached the document itself, the whole page is no "block", stay local
+            block_of[id(parent)] = block
+
+        for line in text.splitlines():
+            line = line.strip()
+            if line:
+                lines.append(line)
+                blocks.append(block)
+
+    return "\n".join(strings), {"lines": lines, "blocks": blocks}
+
+
+def clean_text_from_html(soup: b) -> str:
+    return clean_text_with_index(soup)[0]
 
-def tac_in_page(tac: str, soup: Optional[b] = None) -> Dict[str, Any]:
+
+def _parent_block(block: Any) -> Any:
+    # Block a line's block is nested in: PageText keeps it, in a soup walk up to the next block tag
+    if isinstance(block, TextBlock):
+        return block.parent
+    node = block.parent
+    while node is not None and node.name not in BLOCK_TAGS:
+        node = node.parent
+    return node
+
+
+def _extraction_stats(raw: str, extracted: str) -> Dict[str, Any]:
+    # How much tac_in_page cut the page text down before it goes to textsifter
+    return {
+        "raw_chars": len(raw),
+        "extracted_chars": len(extracted),
+        "raw_to_extracted": round(len(raw) / len(extracted), 2) if extracted else None,
+    }
+
+
+def tac_in_page(tac: str, soup: Optional[b] = None, index: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     MIN_LENGTH_HINT = 600  # helps avoid tiny/irrelevant matches
     # Quick guard for clearly empty or trivial pages
     if not tac or len(tac) < MIN_LENGTH_HINT:
         return {"success": False, "content": None}
 
-    relevant_sections: List[str] = []
     context_window = 5
+    MAX_BLOCK_LINES = 60  # A bigger block (text straight in <body>, a layout div) is no "context" anymore
     lines = [line.strip() for line in tac.splitlines() if line.strip()]
 
+    # Line -> parent block lookup from clean_text_with_index, only usable if it was built from this exact text
+    blocks = index["blocks"] if index and len(index["lines"]) == len(lines) else None
+    block_spans: Dict[int, Optional[Tuple[int, int]]] = {}  # id(block) -> (first line, last line + 1), None if too big
+
+    def inside(i: int, block: Any, outer: Set[int]) -> bool:
+        # Walking up from line i's block reaches block (nested in it) or one of block's ancestors (not)
+        node = blocks[i]
+        while node is not block:
+            if node is None or id(node) in outer:
+                return False
+            node = _parent_block(node)
+        return True
+
+    def block_span(idx: int) -> Tuple[int, int]:
+        # The block's own lines plus those of blocks nested in it, one contiguous run since lines are in
+        # document order. Scanning stops past MAX_BLOCK_LINES and falls back to the line window
+        block = blocks[idx]
+        if id(block) not in block_spans:
+            outer = set()
+            node = _parent_block(block)
+            while node is not None:
+                outer.add(id(node))
+                node = _parent_block(node)
+            start, end = idx, idx + 1
+            while start > 0 and end - start <= MAX_BLOCK_LINES and inside(start - 1, block, outer):
+                start -= 1
+            while end < len(lines) and end - start <= MAX_BLOCK_LINES and inside(end, block, outer):
+                end += 1
+            block_spans[id(block)] = (start, end) if end - start <= MAX_BLOCK_LINES else None
+        span = block_spans[id(block)]
+        if span is None:
+            return max(0, idx - context_window), min(len(lines), idx + context_window + 1)
+        return span
+
+    # Every legal line pulls in its parent block (or +-context_window lines without HTML structure).
+    # Collected as line ranges and merged, so each source line ends up in the output at most once
+    ranges: List[List[int]] = []
     for idx, line in enumerate(lines):
-        low = line.lower()
-        if any(fragment in low for fragment in terms_fragments):
-            start = max(0, idx - context_window)
-            end = min(len(lines), idx + context_window + 1)
-            content = "\n".join(lines[start:end])
-
-            # If we have structured HTML, prefer the immediate parent block’s text
-            if soup:
-                try:
-                    found = soup.find(string=re.compile(re.escape(line), re.IGNORECASE))
-                    if found and found.parent:
-                        content = found.parent.get_text(separator="\n", strip=True)
-                except Exception:
-                    pass
-
-            relevant_sections.append(content)
-
-    if relevant_sections:
-        combined = "\n\n".join(relevant_sections)
-        return {"success": True, "content": combined}
-
-    # Also try headings/title hints when body scan misses but soup exists
-    if soup:
-        headings = soup.find_all(["h1", "h2", "h3", "h4", "h5", "h6", "title"])
-        for h in headings:
-            txt = h.get_text().lower()
-            if any(
-                k in txt
-                for k in [
-                    "terms",
-                    "conditions",
-                    "privacy",
-                    "policy",
-                    "legal",
-                    "agreement",
-                    "service",
-                ]
-            ):
-                return {"success": True, "content": tac}
+        if match_fragments(line):
+            if blocks is not None:
+                start, end = block_span(idx)
+            else:
+                start = max(0, idx - context_window)
+                end = min(len(lines), idx + context_window + 1)
+            ranges.append([start, end])
+
+    merged: List[List[int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    if merged:
+        combined = "\n\n".join("\n".join(lines[start:end]) for start, end in merged)
+        return {"success": True, "content": combined, "stats": _extraction_stats(tac, combined)}
+
+    # Also try headings/title hints when body scan misses, from the PageText index or else the soup
+    if index and "headings" in index:
+        headings = index["headings"]
+    elif soup:
+        headings = [h.get_text() for h in soup.find_all(["h1", "h2", "h3", "h4", "h5", "h6", "title"])]
+    else:
+        headings = []
+    for h in headings:
+        txt = h.lower()
+        if any(
+            k in txt
+            for k in [
+                "terms",
+                "conditions",
+                "privacy",
+                "policy",
+                "legal",
+                "agreement",
+                "service",
+            ]
+        ):
+            return {"success": True, "content": tac, "stats": _extraction_stats(tac, tac)}
 
     return {"success": False, "content": None}
 
 
-def find_legal_links(soup: b, base_url: str) -> List[str]:
+def _anchors(page: Union[b, PageDocument]) -> Iterable[Tuple[str, str]]:
+    # (href, text) pairs, straight from a PageDocument or walked out of a soup
+    if isinstance(page, PageDocument):
+        return page.anchors
+    return ((a["href"], a.get_text(strip=True)) for a in page.find_all("a", href=True))  # type: ignore
+
+
+def find_legal_links(page: Union[b, PageDocument], base_url: str) -> List[str]:
     LEGAL_LINK_KEYWORDS = ["terms", "privacy", "policy", "disclaimer", "legal"]
     links = set()
-    for a in soup.find_all("a", href=True):
-        href = a["href"].strip()  # type: ignore
-        text = a.get_text(strip=True).lower()
+    for href, text in _anchors(page):
+        href = href.strip()
+        text = text.lower()
         href_lower = href.lower()
 
         candidate = any(k in href_lower for k in LEGAL_LINK_KEYWORDS) or any(
@@ -130,61 +285,425 @@ def guess_legal_paths(base_url: str) -> List[str]:
     )
     return [up.urljoin(origin, p) for p in common_paths]
 
+# How strongly a candidate URL looks like the terms page itself, checked against the URL path
+LINK_RANKS = [
+    (3, ("terms", "conditions", "eula", "user-agreement")),
+    (2, ("legal", "agreement")),
+    (1, ("policy", "policies", "privacy", "disclaimer")),
+]
+
+MAX_CANDIDATES = 8
+PROBE_WORKERS = 8
+PROBE_PER_HOST = 2
+
+
+def link_rank(link: str) -> int:
+    path = up.urlparse(link).path.lower()
+    for rank, words in LINK_RANKS:
+        if any(w in path for w in words):
+            return rank
+    return 0
+
+
+def rank_legal_links(links: List[str]) -> List[str]:
+    # Likely T&C URLs first, then shorter (less specific) paths, then alphabetical so the order is stable
+    return sorted(links, key=lambda link: (-link_rank(link), len(link), link))
+
+
 def playwright_fetching(url: str, timeout: int = 30000) -> Optional[str]:
     """
     Fetch page HTML using Playwright (headless browser)
     Returns rendered HTML or None on failure
+
+    Goes through the shared BrowserPool, so the browser is only started once per process
+    instead of once per URL
     """
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            )
-            page = context.new_page()
-            
-            try:
-                response = page.goto(url, timeout=timeout, wait_until="domcontentloaded")
-                
-                if not response or response.status >= 400:
-                    return None
-                
-                page.wait_for_timeout(2000) # Waits briefly for any JS-rendered content
-
-                
-                html = page.content()
-                return html
-            
-            except PlaywrightTimeout:
-                return None
-            finally:
-                page.close()
-                context.close()
-                browser.close()
-    
+        return get_browser_pool().fetch(url, timeout=timeout)
     except Exception:
         return None
 
 
-header = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8",
-    "Accept-Language": "en-US,en;q=0.9",
-    "Accept-Encoding": "gzip, deflate",
-    "Referer": "https://www.google.com/",
-    "Connection": "keep-alive",
-}
+SHELL_MIN_TEXT = 200  # Less visible text than this is a shell whatever the markup says
+SHELL_MARKER_TEXT = 2000  # With a shell marker (mount point div, "enable JavaScript"), pages below this still count
+
+MAX_PAGE_BYTES = 5 * 1024 * 1024  # Bigger pages are cut off, policies don't hide past the first few MB
+STREAM_CHUNK = 64 * 1024
+HTML_CONTENT_TYPES = {"", "text/html", "application/xhtml+xml", "text/plain", "text/xml", "application/xml"}
+
+
+def looks_like_js_shell(doc: PageDocument) -> bool:
+    """
+    Guess whether a statically fetched page is a JavaScript app shell whose content only appears after rendering.
+    Works off what PageTextParser already collected, so it costs nothing extra.
+    """
+    if doc.visible_chars < SHELL_MIN_TEXT:
+        return True
+    return doc.visible_chars < SHELL_MARKER_TEXT and doc.shell_marker
+
+
+def _response_encoding(resp: r.Response) -> str:
+    # Standardize text decoding; avoid ISO-8859-1 pitfalls common in requests
+    enc = (resp.encoding or "").lower()
+    return "utf-8" if not enc or enc == "iso-8859-1" else enc
+
+
+def _capped_body(resp: r.Response, max_bytes: int, digest) -> Iterable[bytes]:
+    # Body chunks up to max_bytes, hashed on the way so unchanged pages can be recognised on recrawl
+    size = 0
+    for chunk in resp.iter_content(STREAM_CHUNK):
+        chunk = chunk[:max_bytes - size]
+        digest.update(chunk)
+        size += len(chunk)
+        yield chunk
+        if size >= max_bytes:
+            return
 
 
-def Clausefetch(url: str, use_playwright: bool = True) -> Dict[str, Any]:
+def _validators(resp: r.Response, body_hash: str) -> Dict[str, Optional[str]]:
+    return {
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "body_hash": body_hash,
+    }
+
+
+def read_page(resp: r.Response, max_bytes: int = MAX_PAGE_BYTES) -> Dict[str, Any]:
+    """
+    Streams a response body into PageTextParser, at most max_bytes of it. PDFs and other non-HTML content types
+    are refused before the body is read; "content_type" tells the caller what it was.
+
+    Returns {"doc", "validators" (ETag/Last-Modified/body hash), "content_type", "error"}
+    """
+    content_type = resp.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    unsupported = {
+        "doc": None,
+        "validators": None,
+        "content_type": content_type,
+        "error": f"Unsupported content type: {content_type}",
+    }
+    try:
+        if content_type not in HTML_CONTENT_TYPES:
+            return unsupported
+
+        encoding = _response_encoding(resp)
+        parser = PageTextParser(encoding)
+        digest = hashlib.sha256()
+        size = 0
+        for chunk in _capped_body(resp, max_bytes, digest):
+            if not size and chunk.startswith(b"%PDF-"):
+                unsupported["content_type"] = "application/pdf"
+                unsupported["error"] = "Unsupported content type: application/pdf"
+                return unsupported
+            size += len(chunk)
+            parser.feed(chunk)
+
+        doc = parser.close()
+        doc.truncated = size >= max_bytes
+        return {
+            "doc": doc,
+            "validators": _validators(resp, digest.hexdigest()),
+            "content_type": content_type,
+            "error": None,
+        }
+    finally:
+        resp.close()
+
+
+def _fetch_static(url: str, timeout: float) -> Dict[str, Any]:
+    # Candidate, remembered and guessed legal pages come from the site itself, so the URL and every redirect hop
+    # go through linkgate's SSRF checks like robots.txt and sitemaps do
+    checked = _validate_url(url)[1]
+    if checked["valid"]:
+        checked = _fetch_check(checked["url"], timeout=timeout)[1]
+    if not checked["valid"]:
+        return {"doc": None, "validators": None, "content_type": None, "error": checked["message"]}
+    try:
+        return read_page(checked["response"])
+    except r.exceptions.RequestException as e:
+        return {"doc": None, "validators": None, "content_type": None, "error": e}
+
+
+def fetch_page(
+    url: str,
+    use_playwright: bool = True,
+    static_timeout: float = 10,
+    browser_timeout: int = 30000,
+    prefetched: Optional[r.Response] = None,
+) -> Dict[str, Any]:
+    """
+    Static-first fetch: plain GET, and only when the result looks like a JS shell (or failed) the headless browser.
+    The fetcher that worked is remembered per domain, so the next crawl of a browser-only site skips the GET.
+    Static pages are parsed while they download, the raw HTML is never kept.
+
+    Returns {"doc", "strategy" ("static"/"browser"/None), "validators" (static fetches only), "error"}
+    """
+    domain = up.urlparse(url).netloc
+    remembered = get_fetch_strategy(domain) if domain and use_playwright else None
+
+    def done(doc: PageDocument, strategy: str, validators: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        # Only worth remembering when both fetchers were on the table
+        if domain and use_playwright and strategy != remembered:
+            record_fetch_strategy(domain, strategy)
+        return {"doc": doc, "strategy": strategy, "validators": validators, "error": None}
+
+    static = None
+    if remembered != "browser" or prefetched is not None:
+        if prefetched is not None:
+            static = read_page(prefetched)
+        else:
+            print(f"Fetching statically: {url}")
+            static = _fetch_static(url, static_timeout)
+        if static["doc"] is not None and not (use_playwright and looks_like_js_shell(static["doc"])):
+            return done(static["doc"], "static", static["validators"])
+        if static["content_type"] not in (None, *HTML_CONTENT_TYPES):
+            # A PDF or binary file, rendering it in a browser won't give us HTML either
+            return {"doc": None, "strategy": None, "validators": None, "error": static["error"]}
+
+    if use_playwright:
+        print(f"Fetching with Playwright: {url}")
+        html = playwright_fetching(url, timeout=browser_timeout)
+        if html is not None:
+            return done(parse_page([html]), "browser")
+
+    # Browser failed: a JS shell is still better than nothing, and a remembered "browser" site gets one static try
+    if static is None:
+        print(f"Fallback to requests: {url}")
+        static = _fetch_static(url, static_timeout)
+    if static["doc"] is not None:
+        return done(static["doc"], "static", static["validators"])
+    return {"doc": None, "strategy": None, "validators": None, "error": static["error"]}
+
+
+def revalidate_page(url: str, validators: Dict[str, Any], timeout: float = 10) -> Dict[str, Any]:
+    """
+    Conditional GET of a legal page that was analysed before, using the stored ETag / Last-Modified.
+    On a 304, or a body that hashes the same as last time, nothing gets parsed. A changed body whose T&C text
+    hashes the same as the stored tc_text_hash (only a timestamp or token in the HTML moved) counts as unchanged.
+    The GET follows redirects through linkgate's hop loop, every hop is validated like the page URL itself.
+
+    Returns {"changed" (True/False, None when the page couldn't be fetched), "validators", "content", "error"}
+    "content" is the page's T&C text when it changed (None if it no longer has any).
+    """
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    checked = _validate_url(url)[1]
+    if checked["valid"]:
+        checked = _fetch_check(checked["url"], headers=headers, timeout=timeout)[1]
+    if not checked["valid"]:
+        return {"changed": None, "validators": validators, "content": None, "error": checked["message"]}
+
+    resp = checked["response"]
+    digest = hashlib.sha256()
+    try:
+        try:
+            if resp.status_code == 304:
+                # A 304 can carry refreshed validators, the body is the one we already have
+                fresh = {
+                    "etag": resp.headers.get("ETag") or validators.get("etag"),
+                    "last_modified": resp.headers.get("Last-Modified") or validators.get("last_modified"),
+                    "body_hash": validators.get("body_hash"),
+                }
+                return {"changed": False, "validators": fresh, "content": None, "error": None}
+
+            content_type = resp.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if content_type not in HTML_CONTENT_TYPES:
+                return {
+                    "changed": None,
+                    "validators": validators,
+                    "content": None,
+                    "error": f"Unsupported content type: {content_type}",
+                }
+            chunks = list(_capped_body(resp, MAX_PAGE_BYTES, digest))
+        finally:
+            resp.close()
+    except r.exceptions.RequestException as e:
+        return {"changed": None, "validators": validators, "content": None, "error": e}
+
+    fresh = _validators(resp, digest.hexdigest())
+    if fresh["body_hash"] == validators.get("body_hash"):
+        return {"changed": False, "validators": fresh, "content": None, "error": None}
+
+    doc = parse_page(chunks, _response_encoding(resp))
+    content = tac_in_page(doc.text, None, doc.index)["content"]
+    if content is not None and hashlib.sha256(content.encode()).hexdigest() == validators.get("tc_text_hash"):
+        return {"changed": False, "validators": fresh, "content": None, "error": None}
+    return {"changed": True, "validators": fresh, "content": content, "error": None}
+
+
+def fetch_candidate(link: str, use_playwright: bool = True) -> Optional[Dict[str, Any]]:
+    """Fetch one candidate legal link, returns {"url", "content", "validators"} if it holds T&C text"""
+    print(f"Checking legal link: {link}")
+
+    page = fetch_page(link, use_playwright, static_timeout=7, browser_timeout=15000)
+    doc = page["doc"]
+    if doc is None:
+        return None
+
+    sub_check = tac_in_page(doc.text, None, doc.index)
+
+    if sub_check["success"]:
+        return {"url": link, "content": sub_check["content"], "validators": page["validators"]}
+    return None
+
+
+def probe_candidates(
+    candidates: List[str],
+    use_playwright: bool = True,
+    workers: int = PROBE_WORKERS,
+    per_host: int = PROBE_PER_HOST,
+    stop_after: Optional[int] = None,
+) -> List[Dict[str, str]]:
+    """
+    Fetches candidate links concurrently, at most `per_host` at a time against the same host.
+    With stop_after set, fetches that haven't started yet are dropped once that many T&C pages are found.
+    Results come back in candidate order, not completion order.
+    """
+    if not candidates:
+        return []
+
+    host_slots = {up.urlparse(link).netloc: threading.Semaphore(per_host) for link in candidates}
+    done = threading.Event()
+
+    def probe(link: str) -> Optional[Dict[str, Any]]:
+        with host_slots[up.urlparse(link).netloc]:
+            if done.is_set():
+                return None  # Enough was found while this one waited for its host
+            return fetch_candidate(link, use_playwright)
+
+    found: Dict[int, Dict[str, Any]] = {}
+    pool = ThreadPoolExecutor(max_workers=min(workers, len(candidates)))
+    try:
+        futures = {pool.submit(probe, link): i for i, link in enumerate(candidates)}
+        for future in as_completed(futures):
+            doc = future.result()
+            if doc:
+                found[futures[future]] = doc
+            if stop_after and len(found) >= stop_after:
+                done.set()
+                break
+    finally:
+        # Don't wait on fetches still in flight, they finish (or time out) in the background
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return [found[i] for i in sorted(found)]
+
+
+MAX_SITEMAP_BYTES = 2 * 1024 * 1024
+MAX_SITEMAPS = 3  # Sitemap files read per site, sitemap indexes included
+_ROBOTS_SITEMAP = re.compile(r"^\s*sitemap\s*:\s*(\S+)", re.IGNORECASE | re.MULTILINE)
+_SITEMAP_LOC = re.compile(r"<loc>\s*(.*?)\s*</loc>", re.IGNORECASE | re.DOTALL)
+
+
+def _fetch_capped(url: str, max_bytes: int, timeout: float = 5) -> Optional[str]:
+    # Small text files only (robots.txt, sitemaps), anything past max_bytes is dropped.
+    # Their URLs come from the site itself, so the URL and every redirect hop go through linkgate's SSRF checks
+    checked = _validate_url(url)[1]
+    if checked["valid"]:
+        checked = _fetch_check(checked["url"], timeout=timeout)[1]
+    if not checked["valid"]:
+        return None
+
+    resp = checked["response"]
+    try:
+        data = b""
+        for chunk in resp.iter_content(64 * 1024):
+            data += chunk
+            if len(data) >= max_bytes:
+                break
+        return data[:max_bytes].decode("utf-8", errors="replace")
+    except r.exceptions.RequestException:
+        return None
+    finally:
+        resp.close()
+
+
+def _site(url: str) -> Optional[str]:
+    # Registrable domain of url's host ("shop.example.co.uk" -> "example.co.uk"), the host itself for IPs
+    try:
+        host = up.urlparse(url).hostname
+    except ValueError:
+        return None
+    if not host:
+        return None
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        return get_tld_registry().registrable_domain(host) or host
+
+
+def sitemap_legal_links(base_url: str) -> List[str]:
+    """
+    Legal-looking URLs listed in the site's sitemaps (from robots.txt, else /sitemap.xml), ranked like link candidates.
+    Costs a couple of small requests and no HTML parsing.
+    """
+    origin = up.urlunparse(up.urlparse(base_url)._replace(path="/", params="", query="", fragment=""))
+    host = up.urlparse(origin).hostname
+    site = _site(origin)
+
+    robots = _fetch_capped(up.urljoin(origin, "/robots.txt"), 256 * 1024)
+    # Sitemaps may live on another subdomain (cdn.example.com), never on another site
+    queue = [u for u in _ROBOTS_SITEMAP.findall(robots or "") if _site(u) == site]
+    queue = queue or [up.urljoin(origin, "/sitemap.xml")]
+
+    links = set()
+    for _ in range(MAX_SITEMAPS):
+        if not queue:
+            break
+        xml = _fetch_capped(queue.pop(0), MAX_SITEMAP_BYTES)
+        if not xml:
+            continue
+        locs = [html_lib.unescape(loc) for loc in _SITEMAP_LOC.findall(xml)]
+        if "<sitemapindex" in xml.lower():
+            # An index of sitemaps: read the ones that look like legal/page sitemaps first
+            queue = rank_legal_links([loc for loc in locs if _site(loc) == site]) + queue
+            continue
+        links.update(loc for loc in locs if link_rank(loc) > 0 and up.urlparse(loc).hostname == host)
+
+    return rank_legal_links(list(links))
+
+
+def _release(prefetched: Optional[r.Response]):
+    # linkgate's streamed response holds a pooled connection until its body is read or it is closed
+    if prefetched is not None:
+        prefetched.close()
+
+
+def _found_in_links(found_docs: List[Dict[str, str]], links: List[str]) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "found_in_page": False,
+        "found_in_links": True,
+        "content": found_docs,
+        "links": links,
+        "error": None,
+    }
+
+
+def Clausefetch(
+    url: str,
+    use_playwright: bool = True,
+    stop_after: Optional[int] = None,
+    prefetched: Optional[r.Response] = None,
+    use_sitemap: bool = True,
+) -> Dict[str, Any]:
     """
     Fetch and extract T&C content from a URL
     
     Args:
         url: The URL to fetch
-        use_playwright: If True, uses Playwright for dynamic content (default: True)
+        use_playwright: If True, pages that look like JS shells are rendered with Playwright (default: True)
+        stop_after: Stop probing legal links once this many T&C pages were found (default: probe them all)
+        prefetched: The homepage response from linkgate(url, fetch=True), its body is read instead of fetching the page again
+        use_sitemap: Look for legal pages in robots.txt/sitemap.xml when the page links to none (default: True)
     """
     if not url.startswith(("http://", "https://")):
+        _release(prefetched)
         return {
             "success": False,
             "found_in_page": False,
@@ -194,38 +713,25 @@ def Clausefetch(url: str, use_playwright: bool = True) -> Dict[str, Any]:
             "error": "Invalid URL format",
         }
     
-    # Fetch homepage with Playwright
-    html = None
-    if use_playwright:
-        print(f"Fetching with Playwright: {url}")
-        html = playwright_fetching(url)
-    
-    # Fallback to requests if Playwright fails or disabled
-    if html is None:
-        print(f"Fallback to requests: {url}")
-        try:
-            header = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-            }
-            resp = r.get(url, headers=header, timeout=10)
-            resp.raise_for_status()
-            html = normalized_html(resp)
-        except r.exceptions.RequestException as e:
-            return {
-                "success": False,
-                "found_in_page": False,
-                "found_in_links": False,
-                "content": None,
-                "links": None,
-                "error": f"Connection error: {e}",
-            }
+    domain = up.urlparse(url).netloc
+
+    page = fetch_page(url, use_playwright, prefetched=prefetched)
+    doc = page["doc"]
+    if doc is None:
+        return {
+            "success": False,
+            "found_in_page": False,
+            "found_in_links": False,
+            "content": None,
+            "links": None,
+            "error": f"Connection error: {page['error']}",
+        }
     
-    soup = b(html, "lxml")
-    page_text = clean_text_from_html(soup)
+    # One parse gives the text, the line -> block index, headings and links
+    page_text, index = doc.text, doc.index
     
     # 1) Try to detect T&C in-page
-    in_page = tac_in_page(page_text, soup)
+    in_page = tac_in_page(page_text, None, index)
     if in_page["success"]:
         return {
             "success": True,
@@ -234,49 +740,31 @@ def Clausefetch(url: str, use_playwright: bool = True) -> Dict[str, Any]:
             "content": in_page["content"],
             "links": None,
             "error": None,
+            "validators": page["validators"],
         }
     
-    # 2) Look for legal links, then probe common paths
-    candidates = find_legal_links(soup, url)
+    # 2) Legal pages that worked for this domain last time, no discovery needed
+    known = get_legal_discovery(domain) if domain else None
+    if known:
+        found_docs = probe_candidates(known, use_playwright, stop_after=stop_after)
+        if found_docs:
+            return _found_in_links(found_docs, known)
+        forget_legal_discovery(domain)
+
+    # 3) Look for legal links, then the sitemap, then probe common paths
+    candidates = find_legal_links(doc, url)
+    if not candidates and use_sitemap:
+        candidates = sitemap_legal_links(url)
     if not candidates:
         candidates = guess_legal_paths(url)
     
-    found_docs: List[Dict[str, str]] = []
-    
-    for link in candidates[:8]:  # Check first 8 candidates
-        print(f"Checking legal link: {link}")
-        
-        # Fetch each candidate with Playwright
-        link_html = None
-        if use_playwright:
-            link_html = playwright_fetching(link, timeout=15000)
-        
-        # Fallback to requests
-        if link_html is None:
-            try:
-                header = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
-                r2 = r.get(link, headers=header, timeout=7)
-                r2.raise_for_status()
-                link_html = normalized_html(r2)
-            except r.exceptions.RequestException:
-                continue
-        
-        soup2 = b(link_html, "lxml")
-        sub_text = clean_text_from_html(soup2)
-        sub_check = tac_in_page(sub_text, soup2)
-        
-        if sub_check["success"]:
-            found_docs.append({"url": link, "content": sub_check["content"]})
+    candidates = rank_legal_links(candidates)
+    found_docs = probe_candidates(candidates[:MAX_CANDIDATES], use_playwright, stop_after=stop_after)
     
     if found_docs:
-        return {
-            "success": True,
-            "found_in_page": False,
-            "found_in_links": True,
-            "content": found_docs,
-            "links": candidates,
-            "error": None,
-        }
+        if domain:
+            record_legal_discovery(domain, [doc["url"] for doc in found_docs])
+        return _found_in_links(found_docs, candidates)
     
     return {
         "success": False,
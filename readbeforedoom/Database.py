@@ -1,6 +1,138 @@
 import sqlite3 as sql
 import hashlib
 import json
+import os
+import threading
+
+
+DB_PATH = "tc_analysis.db"
+DISCOVERY_TTL = 14 * 24 * 3600  # Seconds before a domain's legal pages are rediscovered from scratch
+
+# Columns that were added after the table first shipped, added to older databases on connect
+RESULT_COLUMNS = {
+    "clause_offsets": "TEXT",
+    "risk_hits": "TEXT",  # JSON {category: hit count}, what rescore_all_results works from
+    "pattern_version": "TEXT",  # PatternRegistry version that produced the analysis
+    "source_url": "TEXT",  # Page the T&C text was extracted from (the site itself or one of its legal pages)
+}
+
+
+def init_db(connect):
+    # Creates the tables if they don't exist yet and brings older tc_analysis_results tables up to date
+    connect.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tc_analysis_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL,
+            url_hash TEXT NOT NULL UNIQUE,
+            domain TEXT,
+            tc_text_hash TEXT,
+            tc_length INTEGER,
+            suspicious_clauses TEXT,
+            safety_rating TEXT,
+            recommendation TEXT,
+            risk_categories TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    # Every distinct T&C text is stored once, results point into it with clause offsets
+    connect.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tc_documents (
+            tc_text_hash TEXT PRIMARY KEY,
+            tc_text TEXT NOT NULL
+        )
+        """
+    )
+
+    # Which fetcher produced usable HTML for a domain last time ("static" or "browser")
+    connect.execute(
+        """
+        CREATE TABLE IF NOT EXISTS fetch_strategy (
+            domain TEXT PRIMARY KEY,
+            strategy TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+    # Legal page URLs that held T&C text last time, so recrawls can skip link discovery
+    connect.execute(
+        """
+        CREATE TABLE IF NOT EXISTS legal_discovery (
+            domain TEXT PRIMARY KEY,
+            urls TEXT NOT NULL,
+            discovered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+    # HTTP validators of every legal page an analysis came from, for conditional GETs on recrawl
+    connect.execute(
+        """
+        CREATE TABLE IF NOT EXISTS page_validators (
+            url_hash TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            body_hash TEXT,
+            tc_text_hash TEXT,
+            checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+    # MinHash signature of every analysed T&C text for NearDup, plus the [start, end, category] of its
+    # matching sentences under pattern_version so near-copies can reuse them
+    connect.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tc_signatures (
+            tc_text_hash TEXT PRIMARY KEY,
+            signature BLOB NOT NULL,
+            hit_spans TEXT,
+            pattern_version TEXT
+        )
+        """
+    )
+
+    existing = {row[1] for row in connect.execute("PRAGMA table_info(tc_analysis_results)")}
+    for column, column_type in RESULT_COLUMNS.items():
+        if column not in existing:
+            connect.execute(f"ALTER TABLE tc_analysis_results ADD COLUMN {column} {column_type}")
+
+
+_initialized = set()  # Database files whose schema init_db already brought up to date in this process
+_init_lock = threading.Lock()
+
+
+def _connect():
+    # Connection to DB_PATH. The schema setup only runs on the first connection of the process (per file), not
+    # on every helper call: the fetch helpers sit on the crawl's hot path
+    connect = sql.connect(DB_PATH)
+    path = os.path.abspath(DB_PATH)
+    if path not in _initialized:
+        with _init_lock:
+            if path not in _initialized:
+                init_db(connect)
+                connect.commit()
+                _initialized.add(path)
+    return connect
+
+
+def rehydrate_clauses(cursor, tc_text_hash, clause_offsets):
+    # Slices the clauses back out of the stored T&C text, inside SQLite so the full text never gets loaded
+    clauses = []
+    for start, end in clause_offsets:
+        cursor.execute(
+            "SELECT substr(tc_text, ?, ?) FROM tc_documents WHERE tc_text_hash = ?",
+            (start + 1, end - start, tc_text_hash),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        clauses.append(row[0])
+    return clauses
 
 
 # This function checks if the entered link is already in a mysql_database or not, if yes, returns the prestored analysis results
@@ -8,7 +140,7 @@ import json
 
 def sql_cache_check(link):
     try:
-        with sql.connect("tc_analysis.db") as connect:
+        with _connect() as connect:
             connect.row_factory = sql.Row
             cursor = connect.cursor()
             url_hash = hashlib.sha256(link.encode()).hexdigest()
@@ -17,11 +149,29 @@ def sql_cache_check(link):
                 "SELECT * FROM tc_analysis_results WHERE url_hash = ?;", (url_hash,)
             )
 
-            result = cursor.fetchone()
+            row = cursor.fetchone()
+            result = dict(row) if row else None  # sqlite3.Row has no .get()
+
+            # Analysed with outdated rules: re-sift the stored text if we have it, else it's a cache miss
+            if result and result.get("pattern_version") != current_pattern_version():
+                result = resift_result(cursor, result)
+                if result is None:
+                    return {"link_in_db": False, "stale": True}
+
+            # Newer rows only keep clause offsets into the stored T&C text
+            suspicious_clauses = None
+            if result and result.get("clause_offsets"):
+                try:
+                    suspicious_clauses = rehydrate_clauses(
+                        cursor, result["tc_text_hash"], json.loads(result["clause_offsets"])
+                    )
+                except (json.JSONDecodeError, TypeError, ValueError):
+                    suspicious_clauses = None
 
         if result:
             # Parse json strings back to lists or dicts if needed
-            suspicious_clauses = result.get("suspicious_clauses", "[]")
+            if suspicious_clauses is None:
+                suspicious_clauses = result.get("suspicious_clauses") or "[]"
             if isinstance(suspicious_clauses, str):
                 try:
                     suspicious_clauses = json.loads(suspicious_clauses)
@@ -34,6 +184,7 @@ def sql_cache_check(link):
                 "safety_rating": result.get("safety_rating", "Unknown"),
                 "suspicious_clauses": suspicious_clauses,
                 "recommendation": result.get("recommendation", "Analysis pending"),
+                "source_url": result.get("source_url"),
             }
         else:
             return {"link_in_db": False}
@@ -42,10 +193,117 @@ def sql_cache_check(link):
         return {"link_in_db": False}
 
 
+def current_pattern_version():
+    from textsifter import pattern_registry
+
+    return pattern_registry.current().version
+
+
+def _short_rating(safety_rating):
+    # Extract just the number from safety_rating (e.g., "4/10" -> "4")
+    if "/" in safety_rating:
+        return safety_rating.split("/")[0]
+    return safety_rating[:2]  # Just in case
+
+
+def _update_analysis(cursor, row_id, analysis):
+    # Overwrites the analysis columns of one row with a fresh textsifter result
+    cursor.execute(
+        """
+        UPDATE tc_analysis_results
+        SET suspicious_clauses = NULL, clause_offsets = ?, risk_hits = ?, safety_rating = ?,
+            recommendation = ?, risk_categories = ?, pattern_version = ?
+        WHERE id = ?
+        """,
+        (
+            json.dumps(analysis["clause_spans"]),
+            json.dumps(analysis["risk_hits"]),
+            _short_rating(analysis["safety_rating"]),
+            analysis["recommendation"],
+            str(analysis["risks_found"]),
+            analysis["pattern_version"],
+            row_id,
+        ),
+    )
+
+
+# Re-runs textsifter on the stored T&C text of a stale row and updates it in place.
+# Returns the updated row as a dict, or None when the text was never stored (older rows).
+def resift_result(cursor, result):
+    from textsifter import textsifter
+
+    cursor.execute(
+        "SELECT tc_text FROM tc_documents WHERE tc_text_hash = ?", (result["tc_text_hash"],)
+    )
+    doc = cursor.fetchone()
+    if doc is None:
+        return None
+
+    analysis = textsifter(doc[0])
+    _update_analysis(cursor, result["id"], analysis)
+
+    result = dict(result)
+    result.update(
+        {
+            "suspicious_clauses": None,
+            "clause_offsets": json.dumps(analysis["clause_spans"]),
+            "risk_hits": json.dumps(analysis["risk_hits"]),
+            "safety_rating": _short_rating(analysis["safety_rating"]),
+            "recommendation": analysis["recommendation"],
+            "pattern_version": analysis["pattern_version"],
+        }
+    )
+    return result
+
+
+# Nightly job: re-sifts every row analysed with an older rule set straight from tc_documents, on a process pool.
+def resift_stale_results(workers=None, batch_size=500):
+    from textsifter import textsifter_batch
+
+    try:
+        with _connect() as connect:
+            cursor = connect.cursor()
+            version = current_pattern_version()
+
+            cursor.execute(
+                """
+                SELECT r.id FROM tc_analysis_results r
+                JOIN tc_documents d ON d.tc_text_hash = r.tc_text_hash
+                WHERE r.pattern_version IS NULL OR r.pattern_version != ?
+                """,
+                (version,),
+            )
+            stale_ids = [row[0] for row in cursor.fetchall()]
+
+            resifted = 0
+            for i in range(0, len(stale_ids), batch_size):
+                ids = stale_ids[i:i + batch_size]
+                cursor.execute(
+                    f"""
+                    SELECT r.id, d.tc_text FROM tc_analysis_results r
+                    JOIN tc_documents d ON d.tc_text_hash = r.tc_text_hash
+                    WHERE r.id IN ({",".join("?" * len(ids))})
+                    """,
+                    ids,
+                )
+                rows = cursor.fetchall()
+                analyses = textsifter_batch((text for _, text in rows), workers=workers)
+                for (row_id, _), analysis in zip(rows, analyses):
+                    _update_analysis(cursor, row_id, analysis)
+                connect.commit()
+                resifted += len(rows)
+
+        return {"success": True, "resifted": resifted}
+
+    except Exception as e:
+        print(f"Database resift error: {e}")
+        return {"success": False, "message": f"Error re-sifting results: {e}"}
+
+
 # After the T&C analysis, the results will be stored in the MySQL database.
 def store_analysis_result(url, tc_text, analysis_result):
     try:
-        with sql.connect("tc_analysis.db") as connect:
+        with _connect() as connect:
             cursor = connect.cursor()
 
             url_hash = hashlib.sha256(url.encode()).hexdigest()
@@ -67,12 +325,22 @@ def store_analysis_result(url, tc_text, analysis_result):
                 "recommendation", "No analysis available"
             )
             risk_categories = analysis_result.get("risk_categories", [])
+            clause_offsets = analysis_result.get("clause_offsets")
+            risk_hits = analysis_result.get("risk_hits")
+            pattern_version = analysis_result.get("pattern_version")
+            source_url = analysis_result.get("source_url")
 
-            # Convert lists to JSON strings for storage
-            if isinstance(suspicious_clauses, list):
+            # Convert lists to JSON strings for storage. With offsets the clauses can be sliced back out of
+            # tc_documents, so the clause text itself isn't stored a second time
+            if clause_offsets:
+                suspicious_clauses_json = None
+                clause_offsets_json = json.dumps(clause_offsets)
+            elif isinstance(suspicious_clauses, list):
                 suspicious_clauses_json = json.dumps(suspicious_clauses)
+                clause_offsets_json = None
             else:
                 suspicious_clauses_json = str(suspicious_clauses)
+                clause_offsets_json = None
 
             if isinstance(risk_categories, list):
                 risk_categories_json = json.dumps(risk_categories)
@@ -81,26 +349,56 @@ def store_analysis_result(url, tc_text, analysis_result):
 
             # Check if record already exists
             cursor.execute(
-                "SELECT * FROM tc_analysis_results WHERE url_hash = ?", (url_hash,)
+                "SELECT id, tc_text_hash, pattern_version FROM tc_analysis_results WHERE url_hash = ?",
+                (url_hash,),
             )
             existing = cursor.fetchone()
+            safety_rating_short = _short_rating(safety_rating)
+
+            cursor.execute(
+                "INSERT OR IGNORE INTO tc_documents (tc_text_hash, tc_text) VALUES (?, ?)",
+                (tc_hash, tc_text),
+            )
 
             if existing:
-                print("Record already exists in database, skipping...")
-                return {"success": True, "message": "Record already exists"}
+                # Same text analysed with the same rules is a duplicate, anything else replaces the outdated analysis
+                if existing[1] == tc_hash and existing[2] == pattern_version:
+                    print("Record already exists in database, skipping...")
+                    return {"success": True, "message": "Record already exists"}
 
-            # Extract just the number from safety_rating (e.g., "4/10" -> "4")
-            if "/" in safety_rating:
-                safety_rating_short = safety_rating.split("/")[0]
-            else:
-                safety_rating_short = safety_rating[:2]  # Just in case
+                cursor.execute(
+                    """
+                    UPDATE tc_analysis_results
+                    SET url = ?, domain = ?, tc_text_hash = ?, tc_length = ?, suspicious_clauses = ?,
+                        safety_rating = ?, recommendation = ?, risk_categories = ?, clause_offsets = ?,
+                        risk_hits = ?, pattern_version = ?, source_url = ?
+                    WHERE id = ?
+                    """,
+                    (
+                        url,
+                        domain,
+                        tc_hash,
+                        len(tc_text),
+                        suspicious_clauses_json,
+                        safety_rating_short,
+                        recommendation,
+                        risk_categories_json,
+                        clause_offsets_json,
+                        json.dumps(risk_hits) if risk_hits is not None else None,
+                        pattern_version,
+                        source_url,
+                        existing[0],
+                    ),
+                )
+                print("Outdated record updated successfully")
+                return {"success": True, "message": "Analysis result updated successfully"}
 
             # Simple insert query without updated_at column
             insert_query = """
             INSERT INTO tc_analysis_results
             (url, url_hash, domain, tc_text_hash, tc_length, suspicious_clauses,
-            safety_rating, recommendation, risk_categories)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            safety_rating, recommendation, risk_categories, clause_offsets, risk_hits, pattern_version, source_url)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """
 
             cursor.execute(
@@ -115,6 +413,10 @@ def store_analysis_result(url, tc_text, analysis_result):
                     safety_rating_short,
                     recommendation,
                     risk_categories_json,
+                    clause_offsets_json,
+                    json.dumps(risk_hits) if risk_hits is not None else None,
+                    pattern_version,
+                    source_url,
                 ),
             )
 
@@ -126,5 +428,237 @@ def store_analysis_result(url, tc_text, analysis_result):
         return {"success": False, "message": f"Error storing to database: {e}"}
 
 
+def _hit_matrix(risk_hits_json):
+    # (documents x categories) count matrix and its sorted categories from a batch of risk_hits JSON texts.
+    # One json.loads for the whole batch and one scatter into the matrix instead of a Python loop per row
+    import numpy as np
+
+    hit_dicts = json.loads("[" + ",".join(risk_hits_json) + "]")
+    keys = [c for hits in hit_dicts for c in hits]
+    counts = [count for hits in hit_dicts for count in hits.values()]
+    categories = sorted(set(keys))
+    column = {c: i for i, c in enumerate(categories)}
+
+    matrix = np.zeros((len(hit_dicts), len(categories)), dtype=np.int32)
+    rows = np.repeat(np.arange(len(hit_dicts)), [len(hits) for hits in hit_dicts])
+    matrix[rows, np.fromiter(map(column.__getitem__, keys), dtype=np.int64, count=len(keys))] = counts
+    return matrix, categories
+
+
+# Recomputes safety_rating and recommendation for every stored result from its risk_hits, no re-crawling or re-sifting.
+# Used after the "scoring" section of risk_patterns.json changes. Only rows whose rating or recommendation moved
+# are written back.
+def rescore_all_results(policy=None, batch_size=200000):
+    from textsifter import score_matrix
+    import numpy as np
+
+    try:
+        with _connect() as connect:
+            read_cursor = connect.cursor()
+            write_cursor = connect.cursor()
+            read_cursor.execute(
+                """
+                SELECT id, risk_hits, safety_rating, recommendation FROM tc_analysis_results
+                WHERE risk_hits IS NOT NULL
+                """
+            )
+
+            rescored = updated = 0
+            while True:
+                rows = read_cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+
+                matrix, categories = _hit_matrix([row[1] for row in rows])
+                scores, recommendations = score_matrix(matrix, categories, policy)
+                ratings = np.array(list(map(str, scores.tolist())), dtype=object)
+                changed = np.flatnonzero(
+                    (ratings != np.array([row[2] for row in rows], dtype=object))
+                    | (recommendations != np.array([row[3] for row in rows], dtype=object))
+                )
+                write_cursor.executemany(
+                    "UPDATE tc_analysis_results SET safety_rating = ?, recommendation = ? WHERE id = ?",
+                    ((ratings[i], recommendations[i], rows[i][0]) for i in changed.tolist()),
+                )
+                rescored += len(rows)
+                updated += len(changed)
+
+        return {"success": True, "rescored": rescored, "updated": updated}
+
+    except Exception as e:
+        print(f"Database rescoring error: {e}")
+        return {"success": False, "message": f"Error rescoring results: {e}"}
+
+
+def get_fetch_strategy(domain):
+    # Remembered fetcher for this domain, or None if we haven't crawled it yet
+    try:
+        with _connect() as connect:
+            row = connect.execute(
+                "SELECT strategy FROM fetch_strategy WHERE domain = ?", (domain.lower(),)
+            ).fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        print(f"Database error: {e}")
+        return None
+
+
+def record_fetch_strategy(domain, strategy):
+    try:
+        with _connect() as connect:
+            connect.execute(
+                """
+                INSERT INTO fetch_strategy (domain, strategy) VALUES (?, ?)
+                ON CONFLICT(domain) DO UPDATE SET strategy = excluded.strategy, updated_at = CURRENT_TIMESTAMP
+                """,
+                (domain.lower(), strategy),
+            )
+        return {"success": True}
+    except Exception as e:
+        print(f"Database storage error: {e}")
+        return {"success": False, "message": f"Error storing fetch strategy: {e}"}
+
+
+def get_legal_discovery(domain, ttl=DISCOVERY_TTL):
+    # Legal URLs found for this domain within the last `ttl` seconds, or None
+    try:
+        with _connect() as connect:
+            row = connect.execute(
+                "SELECT urls FROM legal_discovery WHERE domain = ? AND discovered_at > datetime('now', ?)",
+                (domain.lower(), f"-{int(ttl)} seconds"),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+    except Exception as e:
+        print(f"Database error: {e}")
+        return None
+
+
+def record_legal_discovery(domain, urls):
+    try:
+        with _connect() as connect:
+            connect.execute(
+                """
+                INSERT INTO legal_discovery (domain, urls) VALUES (?, ?)
+                ON CONFLICT(domain) DO UPDATE SET urls = excluded.urls, discovered_at = CURRENT_TIMESTAMP
+                """,
+                (domain.lower(), json.dumps(urls)),
+            )
+        return {"success": True}
+    except Exception as e:
+        print(f"Database storage error: {e}")
+        return {"success": False, "message": f"Error storing legal discovery: {e}"}
+
+
+def forget_legal_discovery(domain):
+    # Called when the remembered pages stopped holding T&C text
+    try:
+        with _connect() as connect:
+            connect.execute("DELETE FROM legal_discovery WHERE domain = ?", (domain.lower(),))
+    except Exception as e:
+        print(f"Database error: {e}")
+
+
+def get_page_validators(url):
+    # {"etag", "last_modified", "body_hash", "tc_text_hash"} stored for this page, or None
+    try:
+        with _connect() as connect:
+            connect.row_factory = sql.Row
+            row = connect.execute(
+                "SELECT etag, last_modified, body_hash, tc_text_hash FROM page_validators WHERE url_hash = ?",
+                (hashlib.sha256(url.encode()).hexdigest(),),
+            ).fetchone()
+        return dict(row) if row else None
+    except Exception as e:
+        print(f"Database error: {e}")
+        return None
+
+
+def store_page_validators(url, validators, tc_text=None):
+    # Upserts the validators and bumps checked_at; a revalidated page keeps its tc_text_hash unless new text is given
+    try:
+        with _connect() as connect:
+            connect.execute(
+                """
+                INSERT INTO page_validators (url_hash, url, etag, last_modified, body_hash, tc_text_hash)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url_hash) DO UPDATE SET
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    body_hash = excluded.body_hash,
+                    tc_text_hash = COALESCE(excluded.tc_text_hash, page_validators.tc_text_hash),
+                    checked_at = CURRENT_TIMESTAMP
+                """,
+                (
+                    hashlib.sha256(url.encode()).hexdigest(),
+                    url,
+                    validators.get("etag"),
+                    validators.get("last_modified"),
+                    validators.get("body_hash"),
+                    hashlib.sha256(tc_text.encode()).hexdigest() if tc_text is not None else None,
+                ),
+            )
+        return {"success": True}
+    except Exception as e:
+        print(f"Database storage error: {e}")
+        return {"success": False, "message": f"Error storing page validators: {e}"}
+
+
+def stored_result_urls():
+    # Every analysed site, for recrawls. Read up front so no read lock is held while the recrawl writes
+    with _connect() as connect:
+        return [row[0] for row in connect.execute("SELECT url FROM tc_analysis_results ORDER BY id")]
+
+
+def store_text_signature(tc_text_hash, signature, hit_spans, pattern_version):
+    try:
+        with _connect() as connect:
+            connect.execute(
+                """
+                INSERT INTO tc_signatures (tc_text_hash, signature, hit_spans, pattern_version)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(tc_text_hash) DO UPDATE SET
+                    signature = excluded.signature,
+                    hit_spans = excluded.hit_spans,
+                    pattern_version = excluded.pattern_version
+                """,
+                (tc_text_hash, signature, json.dumps(hit_spans), pattern_version),
+            )
+        return {"success": True}
+    except Exception as e:
+        print(f"Database storage error: {e}")
+        return {"success": False, "message": f"Error storing text signature: {e}"}
+
+
+def load_text_signatures():
+    # ([tc_text_hash], [signature blob]) of every stored text, what NearDup builds its index from
+    try:
+        with _connect() as connect:
+            rows = connect.execute("SELECT tc_text_hash, signature FROM tc_signatures").fetchall()
+        return [row[0] for row in rows], [row[1] for row in rows]
+    except Exception as e:
+        print(f"Database error: {e}")
+        return [], []
+
+
+def get_sifted_text(tc_text_hash):
+    # {"tc_text", "hit_spans", "pattern_version"} of a stored text, or None
+    try:
+        with _connect() as connect:
+            row = connect.execute(
+                """
+                SELECT d.tc_text, s.hit_spans, s.pattern_version
+                FROM tc_signatures s JOIN tc_documents d ON d.tc_text_hash = s.tc_text_hash
+                WHERE s.tc_text_hash = ?
+                """,
+                (tc_text_hash,),
+            ).fetchone()
+        if row is None or row[1] is None:
+            return None
+        return {"tc_text": row[0], "hit_spans": json.loads(row[1]), "pattern_version": row[2]}
+    except Exception as e:
+        print(f"Database error: {e}")
+        return None
+
+
 if __name__ == "__main__":
     print("Database module loaded. Your existing table structure will be used.")
@@ -0,0 +1,315 @@
+"""
+Caching DNS layer for Linkgate.
+
+A host is resolved with its A and AAAA queries in flight at the same time, and the answer is cached for as long
+as its records' TTL says (clamped to [MIN_TTL, MAX_TTL]). NXDOMAIN and empty answers are cached too, for the
+negative TTL the zone's SOA gives. The cache is an LRU capped at max_entries hosts, and concurrent lookups of the
+same host share one set of queries.
+
+The cache only talks to a small resolver object with lookup(host, rdtype) -> (addresses, ttl), raising the
+usual dns.resolver exceptions, and the coroutine alookup(host, rdtype) doing the same for DnsCache.alookup.
+DnspythonResolver is the real thing, StubResolver answers from a dict so validation can run offline:
+
+    set_dns_cache(DnsCache(StubResolver({"example.com": {"A": ["93.184.216.34"]}})))
+    get_dns_cache().lookup("example.com")  # {"iplist": ["93.184.216.34"]}
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import dns.asyncresolver
+import dns.exception
+import dns.name
+import dns.rdatatype
+import dns.resolver
+
+DNS_TIMEOUT = 5  # Seconds per query, the dnspython default lifetime
+MIN_TTL = 30  # Don't hammer the resolver for records with tiny TTLs
+MAX_TTL = 3600
+NEGATIVE_TTL = 300  # For NXDOMAIN/no answer when the response has no SOA to take it from
+MAX_ENTRIES = 10000
+AAAA_WORKERS = 16  # Threads running the AAAA half of lookups while the calling thread does the A query
+
+
+def _soa_ttl(response) -> Optional[int]:
+    # RFC 2308: negative answers are cached for min(SOA TTL, SOA MINIMUM) of the authority section
+    if response is None:
+        return None
+    for rrset in response.authority:
+        if rrset.rdtype == dns.rdatatype.SOA and len(rrset):
+            return min(rrset.ttl, rrset[0].minimum)
+    return None
+
+
+class DnspythonResolver:
+    def __init__(self, resolver: Optional[dns.resolver.Resolver] = None, lifetime: float = DNS_TIMEOUT):
+        self.resolver = resolver or dns.resolver.get_default_resolver()
+        self.lifetime = lifetime
+        self.async_resolver: Optional[dns.asyncresolver.Resolver] = None  # Made on first alookup
+
+    def lookup(self, host: str, rdtype: str) -> Tuple[List[str], Optional[int]]:
+        """(addresses, ttl) of host's rdtype records, ttl None when unknown. Raises NXDOMAIN, Timeout, ..."""
+        try:
+            answer = self.resolver.resolve(host, rdtype, lifetime=self.lifetime, raise_on_no_answer=False)
+        except dns.resolver.NXDOMAIN as e:
+            self._note_negative_ttl(e)
+            raise
+        return self._addresses(answer)
+
+    async def alookup(self, host: str, rdtype: str) -> Tuple[List[str], Optional[int]]:
+        if self.async_resolver is None:
+            # Same nameservers and per-server timeout as the sync resolver
+            self.async_resolver = dns.asyncresolver.Resolver(configure=False)
+            self.async_resolver.nameservers = self.resolver.nameservers
+            self.async_resolver.timeout = self.resolver.timeout
+        try:
+            answer = await self.async_resolver.resolve(
+                host, rdtype, lifetime=self.lifetime, raise_on_no_answer=False
+            )
+        except dns.resolver.NXDOMAIN as e:
+            self._note_negative_ttl(e)
+            raise
+        return self._addresses(answer)
+
+    @staticmethod
+    def _note_negative_ttl(e: dns.resolver.NXDOMAIN):
+        try:
+            e.negative_ttl = _soa_ttl(e.response(e.qnames()[-1]))
+        except Exception:
+            pass
+
+    @staticmethod
+    def _addresses(answer) -> Tuple[List[str], Optional[int]]:
+        if answer.rrset is None:
+            return [], _soa_ttl(answer.response)
+        return [rdata.to_text() for rdata in answer], answer.rrset.ttl
+
+
+class StubResolver:
+    """
+    Offline resolver: records is {host: {"A": [...], "AAAA": [...]}}, unknown hosts are NXDOMAIN and
+    hosts in `timeouts` time out. delay (seconds) is slept per query to mimic network latency.
+    queries counts every (host, rdtype) asked, so tests can check what the cache saved.
+    """
+
+    def __init__(self, records: Dict[str, Dict[str, List[str]]], ttl: int = 300, delay: float = 0.0, timeouts=()):
+        self.records = {host.lower().rstrip("."): rrs for host, rrs in records.items()}
+        self.ttl = ttl
+        self.delay = delay
+        self.timeouts = {host.lower() for host in timeouts}
+        self.queries: List[Tuple[str, str]] = []
+
+    def _answer(self, host: str, rdtype: str) -> Tuple[List[str], Optional[int]]:
+        host = host.lower().rstrip(".")
+        if host in self.timeouts:
+            raise dns.resolver.LifetimeTimeout(timeout=self.delay, errors=[])
+        if host not in self.records:
+            raise dns.resolver.NXDOMAIN(qnames=[dns.name.from_text(host)])
+        return list(self.records[host].get(rdtype, [])), self.ttl
+
+    def lookup(self, host: str, rdtype: str) -> Tuple[List[str], Optional[int]]:
+        self.queries.append((host, rdtype))
+        if self.delay:
+            time.sleep(self.delay)
+        return self._answer(host, rdtype)
+
+    async def alookup(self, host: str, rdtype: str) -> Tuple[List[str], Optional[int]]:
+        self.queries.append((host, rdtype))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self._answer(host, rdtype)
+
+
+class DnsCache:
+    """
+    lookup(host) returns what Linkgate's ipvcollector always has: {"iplist": [...]} or an error dict
+    with "valid": False and a message. Timeouts are never cached, the next lookup tries again
+    (their error dict has "transient": True). clock is swappable for tests.
+    """
+
+    def __init__(
+        self,
+        resolver=None,
+        max_entries: int = MAX_ENTRIES,
+        min_ttl: int = MIN_TTL,
+        max_ttl: int = MAX_TTL,
+        negative_ttl: int = NEGATIVE_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.resolver = resolver or DnspythonResolver()
+        self.max_entries = max_entries
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()  # host -> (expires_at, result)
+        self.in_flight: Dict[str, Future] = {}
+        self.async_in_flight: Dict[str, "asyncio.Future"] = {}
+        self.executor = ThreadPoolExecutor(max_workers=AAAA_WORKERS, thread_name_prefix="dns-aaaa")
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def _ttl(self, ttl: Optional[int], default: int) -> int:
+        return max(self.min_ttl, min(self.max_ttl, default if ttl is None else ttl))
+
+    def _outcome(self, host: str, rdtype: str):
+        try:
+            return self.resolver.lookup(host, rdtype)
+        except Exception as e:
+            return e
+
+    def _answer(self, host: str, a, aaaa) -> Tuple[dict, Optional[int]]:
+        """
+        (result, seconds to cache it for) from the outcomes of the A and AAAA queries, each (addresses, ttl)
+        or the exception the query raised. None as the time means don't cache.
+        """
+        if isinstance(a, dns.resolver.NXDOMAIN):
+            message = {"valid": False, "url": host, "message": f"Hostname does not exist: {host}"}
+            return message, self._ttl(getattr(a, "negative_ttl", None), self.negative_ttl)
+        if isinstance(a, dns.exception.Timeout):
+            message = {"valid": False, "url": host, "message": f"DNS query timed out for: {host}", "transient": True}
+            return message, None
+        if isinstance(a, dns.name.LabelTooLong):
+            message = {"valid": False, "url": host, "message": f"DNS label too long in hostname: {host}"}
+            return message, self.max_ttl
+        if isinstance(a, dns.resolver.NoAnswer):
+            a = ([], None)
+        elif isinstance(a, BaseException):
+            raise a
+
+        # Same leniency as before: a broken AAAA lookup just means no IPv6 addresses
+        if isinstance(aaaa, (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.exception.Timeout)):
+            aaaa = ([], None)
+        elif isinstance(aaaa, BaseException):
+            raise aaaa
+
+        (ipv4_add, ttl4), (ipv6_add, ttl6) = a, aaaa
+        ttls = [ttl for ttl in (ttl4, ttl6) if ttl is not None]
+        if not ipv4_add and not ipv6_add:
+            return {"iplist": []}, self._ttl(min(ttls, default=None), self.negative_ttl)
+        return {"iplist": ipv4_add + ipv6_add}, self._ttl(min(ttls, default=None), self.max_ttl)
+
+    def _resolve(self, host: str) -> Tuple[dict, Optional[int]]:
+        aaaa = self.executor.submit(self._outcome, host, "AAAA")
+        a = self._outcome(host, "A")
+        if isinstance(a, Exception) and not isinstance(a, dns.resolver.NoAnswer):
+            aaaa.cancel()  # The A error decides, whatever AAAA says
+            return self._answer(host, a, None)
+        return self._answer(host, a, aaaa.result())
+
+    async def _aresolve(self, host: str) -> Tuple[dict, Optional[int]]:
+        a, aaaa = await asyncio.gather(
+            self.resolver.alookup(host, "A"), self.resolver.alookup(host, "AAAA"), return_exceptions=True
+        )
+        return self._answer(host, a, aaaa)
+
+    def _cached(self, host: str) -> Optional[dict]:
+        entry = self.entries.get(host)
+        if entry is None:
+            return None
+        if entry[0] <= self.clock():
+            del self.entries[host]
+            self.stats["expired"] += 1
+            return None
+        self.entries.move_to_end(host)
+        self.stats["negative_hits" if "iplist" not in entry[1] or not entry[1]["iplist"] else "hits"] += 1
+        return entry[1]
+
+    def _store(self, host: str, result: dict, ttl: int):
+        self.entries[host] = (self.clock() + ttl, result)
+        self.entries.move_to_end(host)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def lookup(self, host: str) -> dict:
+        host = host.lower().rstrip(".")
+        with self.lock:
+            cached = self._cached(host)
+            if cached is not None:
+                return dict(cached)
+            future = self.in_flight.get(host)
+            owner = future is None
+            if owner:
+                future = self.in_flight[host] = Future()
+                self.stats["misses"] += 1
+
+        if not owner:
+            return dict(future.result())  # Someone else is already resolving this host
+
+        try:
+            result, ttl = self._resolve(host)
+        except BaseException as e:
+            with self.lock:
+                del self.in_flight[host]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            if ttl is not None:
+                self._store(host, result, ttl)
+            del self.in_flight[host]
+        future.set_result(result)
+        return dict(result)
+
+    async def alookup(self, host: str) -> dict:
+        """lookup() for asyncio code: both queries go out together through resolver.alookup, same cache"""
+        host = host.lower().rstrip(".")
+        with self.lock:
+            cached = self._cached(host)
+            if cached is not None:
+                return dict(cached)
+            future = self.async_in_flight.get(host)
+            owner = future is None
+            if owner:
+                future = self.async_in_flight[host] = asyncio.get_running_loop().create_future()
+                self.stats["misses"] += 1
+
+        if not owner:
+            return dict(await asyncio.shield(future))
+
+        try:
+            result, ttl = await self._aresolve(host)
+        except BaseException as e:
+            with self.lock:
+                del self.async_in_flight[host]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # Marks it retrieved when nobody else was waiting
+            raise
+        with self.lock:
+            if ttl is not None:
+                self._store(host, result, ttl)
+            del self.async_in_flight[host]
+        future.set_result(result)
+        return dict(result)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_default_cache: Optional[DnsCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_dns_cache() -> DnsCache:
+    # Process-wide cache, created on first use
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = DnsCache()
+        return _default_cache
+
+
+def set_dns_cache(cache: Optional[DnsCache]):
+    # Swap the process-wide cache, e.g. for one built on StubResolver in tests
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = cache
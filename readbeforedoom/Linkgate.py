@@ -9,68 +9,37 @@ What linkgate(url) does:
 ## Yeah 250+ lines of code for simply verifying a link is.... a bit too much, but its more like optimization, validating links
 # offline is faster than using requests to validate it that causes internet wastage.
 
-import os
-import json
-import time
 import re
 import ipaddress
 from urllib.parse import urlparse, urlunparse, urljoin
 import requests
 import idna
-import dns.resolver
-import dns.name
+
+from DnsCache import get_dns_cache
+from HttpClient import get_client
+from TldRegistry import get_tld_registry
+from VerdictCache import get_verdict_cache, with_scheme
 
 
 # Helper Functions:
+# A/AAAA addresses of hostname as {"iplist": [...]}, or an error dict. Goes through the process-wide DNS cache,
+# which queries A and AAAA concurrently and remembers answers (and NXDOMAINs) for their TTL
 def ipvcollector(hostname):
-    try:
-        answers = dns.resolver.resolve(hostname, "A")
-        ipv4_add = [rdata.to_text() for rdata in answers]
-    except dns.resolver.NXDOMAIN:
-        return {
-            "valid": False,
-            "url": hostname,
-            "message": f"Hostname does not exist: {hostname}",
-        }
-    except dns.resolver.Timeout:
-        return {
-            "valid": False,
-            "url": hostname,
-            "message": f"DNS query timed out for: {hostname}",
-        }
-    except dns.resolver.NoAnswer:
-        ipv4_add = []
-    except dns.name.LabelTooLong:
-        return {
-            "valid": False,
-            "url": hostname,
-            "message": f"DNS label too long in hostname: {hostname}",
-        }
+    return get_dns_cache().lookup(hostname)
 
-    try:
-        answers6 = dns.resolver.resolve(hostname, "AAAA")  # IPv6
-        ipv6_add = [rdata.to_text() for rdata in answers6]
-    except (dns.resolver.NXDOMAIN, dns.resolver.Timeout, dns.resolver.NoAnswer):
-        ipv6_add = []
 
-    return {"iplist": ipv4_add + ipv6_add}
+# One hostname label: letters, digits and inner hyphens, at most 63 characters, and not a run of one repeated
+# character ("wwww"). Compiled once, each label is checked with a single match
+_HOSTNAME_LABEL = re.compile(r"(?!(.)\1{3,}\Z)[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\Z", re.IGNORECASE)
+_NON_ASCII = re.compile(r"[^\x00-\x7F]")
 
 
 # Checks if the hostname (specifically the subdomain part) is valid or not.
 def is_valid_hostname(hostname):
     if len(hostname) > 253:
         return False
-    labels = hostname.split(".")
-    # Check each label length must be <= 63
-    for label in labels:
-        if len(label) > 63:
-            return False
-    pattern = re.compile(r"^[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?$", re.IGNORECASE)
-    for label in labels:
-        if not pattern.match(label):
-            return False
-    for label in labels:
-        if re.match(r"^(.)\1{3,}$", label, re.IGNORECASE):
+    for label in hostname.split("."):
+        if not _HOSTNAME_LABEL.match(label):
             return False
     return True
 
@@ -85,113 +54,76 @@ def status_code_checker(response):
         return {"valid": False, "redirect/link": False}
 
 
-# Functions to cache the TLD IDNA list, because getting it each time from the internet is wasteful.
+# Kept for callers that want the whole TLD set, validate_url goes through the registry directly.
+# Loaded once per process and refreshed in the background, see TldRegistry
 def tld_check():
-    cache_dir = os.path.expanduser("~/.linkgate_cache")
-    os.makedirs(cache_dir, exist_ok=True)
-    cache_path = os.path.join(cache_dir, "tld_cache.json")
-    max_age = 604800  # 7 days in seconds
+    return get_tld_registry().tlds
+
+
+MAX_REDIRECTS = 10
 
-    # Check cache validity and load if fresh
+
+# The url normalization linkgate and UrlPrefilter share, so the prefilter never passes what linkgate rejects or
+# the other way around: scheme added like VerdictCache keys it ("example.com:8080/x" is a host and port), http or
+# https only, IDNA, hostname labels and TLD. The hostname is taken as is, "example.com." fails on its empty label.
+# Returns (parsed url, ascii hostname, None) or (None, None, (reason, message)), reasons as listed in UrlPrefilter.
+def split_url(url):
     try:
-        if (
-            os.path.exists(cache_path)
-            and (time.time() - os.path.getmtime(cache_path)) < max_age
-        ):
-            try:
-                with open(cache_path, "r") as f:
-                    return json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
-                pass  # Fall through to fetch fresh data
-    except OSError:
-        pass  # Permission issues with cache file, fall through to fetch
-
-    # Fetch fresh data from IANA
+        parsed = urlparse(with_scheme(url.strip()))
+    except ValueError as e:
+        return None, None, ("malformed", f"Malformed url: {e}")
     try:
-        response = requests.get(
-            "https://data.iana.org/TLD/tlds-alpha-by-domain.txt", timeout=10
-        )
-        response.raise_for_status()
-        tld_list = response.text.split()
+        parsed.port
+    except ValueError as e:
+        return None, None, ("bad_port", f"Invalid port: {e}")
 
-        # Save to cache
-        try:
-            with open(cache_path, "w") as f:
-                json.dump(tld_list, f)
-        except Exception:
-            pass  # Cache save failure shouldn't break functionality
+    if parsed.scheme not in ("http", "https"):
+        return None, None, ("bad_scheme", "The given link doesn't have a valid scheme (http or https).")
+    hostname = parsed.hostname
+    if not hostname:
+        return None, None, ("no_host", "The given link has no hostname.")
 
-        return tld_list
+    try:
+        ipaddress.ip_address(hostname)
+        return None, None, ("ip_literal", f"IP address instead of a hostname: {hostname}")
+    except ValueError:
+        pass
 
-    except requests.RequestException:
-        # if ntwork fails try to use stale cache as backup.
+    # IDNA processing first, the label rules below are about the ASCII (punycode) form of the name
+    if _NON_ASCII.search(hostname):
         try:
-            with open(cache_path, "r") as f:
-                return json.load(f)
-        except Exception:
-            raise
+            hostname = idna.encode(hostname).decode("ascii")
+        except idna.IDNAError:
+            return None, None, ("idna", f"Invalid Internationalized domain: {hostname}")
 
+    if not is_valid_hostname(hostname):
+        return None, None, ("bad_label", "The hostname of the given url is invalid.")
 
-# Main function that Checks if the given url has a valid format and is reachable.
-def linkgate(url):
-    parsed = urlparse(url)
-    if not parsed.scheme:
-        url = "https://" + url
-        parsed = urlparse(url)
+    # TLD verification, a set lookup that never waits on IANA
+    tld = hostname.rsplit(".", 1)[-1]
+    if not get_tld_registry().is_tld(tld):
+        return None, None, ("unknown_tld", f"This url has an invalid hostname (unknown TLD: {tld}).")
+    return parsed, hostname, None
 
-    # Validate scheme and hostname
-    if parsed.scheme not in ("http", "https"):
-        return {
-            "valid": False,
-            "url": url,
-            "message": "The given link doesn't have a valid scheme (http or https).",
-        }
 
-    if parsed.hostname and not is_valid_hostname(parsed.hostname):
-        return {
-            "valid": False,
-            "url": url,
-            "message": "The hostname of the given url is invalid.",
-        }
+# The offline half of validate_url. Returns ("invalid", error dict) or (None, (parsed url, ascii hostname)) for
+# the DNS/IP checks to continue from.
+def _precheck(url):
+    parsed, url0, problem = split_url(url)
+    if problem:
+        return "invalid", {"valid": False, "url": url, "message": problem[1]}
+    return None, (parsed, url0)
 
-    # TLD verification using the merged function
-    IDN = parsed.hostname.split(".")[-1] if parsed.hostname else ""
-    try:
-        TLD = tld_check()  # Uses the new merged function
-        if IDN.upper() not in TLD:
-            return {
-                "valid": False,
-                "url": url,
-                "message": "This url has an invalid hostname.",
-            }
-    except requests.RequestException:
-        return {
-            "valid": False,
-            "url": url,
-            "message": "Couldn't load TLDs from IANA",
-        }
-
-    # IDNA processing
-    try:
-        if parsed.hostname and re.search(r"[^\x00-\x7F]", parsed.hostname):
-            url0 = idna.encode(parsed.hostname).decode("ascii")
-        else:
-            url0 = parsed.hostname or ""
-    except idna.IDNAError:
-        return {
-            "valid": False,
-            "url": parsed.hostname or "",
-            "message": f"Invalid Internationalized domain: {parsed.hostname}",
-        }
 
-    # IP validation
-    ips = ipvcollector(url0)
+# The SSRF rules on what DNS returned for url0, then the normalized url. Same (kind, result) as _validate_url
+def _ip_check(parsed, url0, ips):
     if isinstance(ips, dict) and "iplist" not in ips:
-        return ips
+        # DNS timeouts may clear up, everything else DNS says is final
+        return ("unreachable" if ips.pop("transient", False) else "invalid"), ips
 
     iplist = ips.get("iplist", []) if isinstance(ips, dict) else []
     if not iplist:
-        return {
+        return "invalid", {
             "valid": False,
             "url": url0,
             "message": f"No IP addresses found for hostname: {url0}",
@@ -205,7 +137,7 @@ def linkgate(url):
             or ipobject.is_reserved
             or ipobject.is_multicast
         ):
-            return {
+            return "invalid", {
                 "valid": False,
                 "url": url0,
                 "message": f"Reserved/Loopback/private/multicast URL: {url0}",
@@ -230,42 +162,143 @@ def linkgate(url):
         )
     )
 
-    # HTTP validation
-    header = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Referer": "https://www.google.com/",
-        "Connection": "keep-alive",
+    return "valid", {"valid": True, "url": url1}
+
+
+# Everything linkgate checks before touching the site: format, hostname, TLD, IDNA, DNS and the SSRF rules on
+# the resolved IPs. Returns (kind, result): ("valid", {"valid": True, "url": normalized_url}) or
+# ("invalid" / "unreachable", the same error dict linkgate would return). See VerdictCache for the kinds.
+def _validate_url(url):
+    kind, checked = _precheck(url)
+    if kind:
+        return kind, checked
+    parsed, url0 = checked
+    return _ip_check(parsed, url0, ipvcollector(url0))
+
+
+def validate_url(url):
+    return _validate_url(url)[1]
+
+
+def _status_kind(status_code):
+    # Server errors and rate limiting can go away, other error statuses are the site's answer. Except for 403, 405
+    # and 408: bot walls, servers that don't do HEAD and slow answers turn this client away, not the URL
+    if status_code >= 500 or status_code == 429:
+        return "unreachable"
+    return "blocked" if status_code in (403, 405, 408) else "invalid"
+
+
+# What the HEAD response for url1 says, works on requests and httpx responses alike
+def _head_verdict(url1, response):
+    status_code_valid = status_code_checker(response)
+    redir = status_code_valid.get("redirect/link")
+
+    if status_code_valid["valid"]:
+        if isinstance(redir, str) and redir:
+            url_final = urljoin(url1, redir)
+        else:
+            url_final = str(response.url or url1)
+    else:
+        return _status_kind(response.status_code), {
+            "valid": False,
+            "url": url1,
+            "message": "Invalid response status code",
+        }
+
+    return "valid", {
+        "valid": True,
+        "url": url_final,
+        "message": "URL is valid and reachable",
     }
 
+
+# HEAD request without following redirects, the original linkgate behaviour
+def _head_check(url1):
     try:
-        response = requests.head(url1, timeout=5, headers=header, allow_redirects=False)
-        status_code_valid = status_code_checker(response)
-        redir = status_code_valid.get("redirect/link")
-
-        if status_code_valid["valid"]:
-            if isinstance(redir, str) and redir:
-                url_final = urljoin(url1, redir)
-            else:
-                url_final = response.url or url1
-        else:
-            return {
+        response = get_client().head(url1, timeout=5, allow_redirects=False)
+    except requests.exceptions.RequestException as e:
+        return "unreachable", {"valid": False, "url": url1, "message": f"Connection failed: {str(e)}"}
+    return _head_verdict(url1, response)
+
+
+# GET that follows the whole redirect chain by hand, so every hop goes through validate_url again
+# (a public site redirecting to 127.0.0.1 or an internal host is rejected like the original url would be).
+# The final response is returned with its body still unread, Clausefetch(prefetched=...) streams it from there.
+# It holds a pooled connection until then: whoever gets a "response" owns it and has to read it or close() it.
+# url1 has to be validated already (validate_url), ClauseFetch uses this for every static fetch of a page, robots.txt
+# or sitemap (the headless browser follows redirects on its own). headers go out with every hop, and with conditional headers a 304 is a valid answer too.
+def _fetch_check(url1, max_redirects=MAX_REDIRECTS, headers=None, timeout=10):
+    current = url1
+    for _ in range(max_redirects + 1):
+        try:
+            response = get_client().get(
+                current, headers=headers, timeout=timeout, allow_redirects=False, stream=True
+            )
+        except requests.exceptions.RequestException as e:
+            return "unreachable", {"valid": False, "url": current, "message": f"Connection failed: {str(e)}"}
+
+        # Not Modified answers a conditional request (If-None-Match / If-Modified-Since), it's no redirect
+        not_modified = response.status_code == 304 and any(h.lower().startswith("if-") for h in headers or ())
+        location = response.headers.get("Location")
+        if 300 <= response.status_code <= 399 and location and not not_modified:
+            response.close()
+            kind, hop = _validate_url(urljoin(current, location))
+            if not hop["valid"]:
+                hop["message"] = f"Redirect rejected: {hop['message']}"
+                return kind, hop
+            current = hop["url"]
+            continue
+
+        if response.status_code >= 300 and not not_modified:
+            response.close()
+            return _status_kind(response.status_code), {
                 "valid": False,
-                "url": url1,
+                "url": current,
                 "message": "Invalid response status code",
             }
 
-    except requests.exceptions.RequestException as e:
-        return {"valid": False, "url": url1, "message": f"Connection failed: {str(e)}"}
+        return "valid", {
+            "valid": True,
+            "url": current,
+            "message": "URL is valid and reachable",
+            "response": response,
+        }
 
-    return {
-        "valid": True,
-        "url": url_final,
-        "message": "URL is valid and reachable",
+    return "invalid", {
+        "valid": False,
+        "url": current,
+        "message": f"Too many redirects (more than {max_redirects})",
     }
 
 
+def _linkgate(url, fetch=False):
+    kind, checked = _validate_url(url)
+    if not checked["valid"]:
+        return kind, checked
+
+    if fetch:
+        return _fetch_check(checked["url"])
+    return _head_check(checked["url"])
+
+
+# Main function that Checks if the given url has a valid format and is reachable.
+# With fetch=True the reachability check is a GET that follows all redirects, and the result carries the
+# final "response" so the page doesn't have to be downloaded a second time. The caller owns that response:
+# hand it to Clausefetch(prefetched=...) or close() it, an unclosed one keeps its connection out of the pool.
+# Verdicts are cached (see VerdictCache): repeated URLs and hosts in backoff are answered without any network
+# traffic. fetch=True still needs a live response, so for it only cached failures count. cache=False skips all that.
+def linkgate(url, fetch=False, cache=True):
+    verdicts = get_verdict_cache() if cache else None
+    if verdicts is not None:
+        cached = verdicts.get(url, valid=not fetch)
+        if cached is not None:
+            return cached[1]
+
+    kind, result = _linkgate(url, fetch)
+    if verdicts is not None:
+        verdicts.put(url, kind, result)
+    return result
+
+
 if __name__ == "__main__":
     print(linkgate("www.fitgirlrepacks.org")["url"])
@@ -0,0 +1,229 @@
+"""
+Near-duplicate lookup for T&C texts (MinHash + LSH).
+
+Lots of sites ship the same template terms with only the company name or a date changed, which the exact
+tc_text_hash never matches. Every analysed text gets a MinHash signature (NUM_PERM minimums over its hashed
+word shingles), and the banded LSH index finds the stored texts whose estimated Jaccard similarity is above a
+threshold without comparing against all of them.
+
+sift() uses that before textsifter: sentences the new text shares with its closest stored near-duplicate take
+their verdicts from it, only the differing ones go through the matcher (see textsifter.sift_document).
+
+    result, hit_spans, signature, match = sift(tc_text)
+    ... store the analysis ...
+    remember(tc_text, signature, hit_spans, result["pattern_version"])
+"""
+
+import hashlib
+import re
+import threading
+import zlib
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from Database import get_sifted_text, load_text_signatures, store_text_signature
+from textsifter import pattern_registry, sift_document
+
+NUM_PERM = 128
+BANDS = 16  # 16 bands of 8 rows: ~99% of pairs at 0.85 similarity become candidates, ~6% at 0.5
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 5
+SIMILARITY_THRESHOLD = 0.8
+MERGE_EVERY = 1024  # Rows added one by one are scanned linearly until there are this many, then re-sorted in
+MINHASH_BLOCK = 8192  # Shingles hashed per numpy step, keeps the (shingles x NUM_PERM) temporary small
+
+_WORD = re.compile(r"\w+")
+_SHIFT = np.uint64(32)
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+# Fixed seeds: signatures are stored in the database, so the hash functions must never change between runs
+_rng = np.random.default_rng(6008)
+_PERM_A = _rng.integers(1, 2**63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_PERM_B = _rng.integers(0, 2**63, NUM_PERM, dtype=np.uint64)
+_SHINGLE_MULT = _rng.integers(1, 2**63, SHINGLE_WORDS, dtype=np.uint64) | np.uint64(1)
+_BAND_MULT = _rng.integers(1, 2**63, ROWS, dtype=np.uint64) | np.uint64(1)
+
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """Distinct 32-bit hashes of the SHINGLE_WORDS-word shingles of text (lowercased)"""
+    words = _WORD.findall(text.lower())
+    if not words:
+        return np.zeros(1, dtype=np.uint64)
+    tokens = np.fromiter((zlib.crc32(w.encode()) for w in words), dtype=np.uint64, count=len(words))
+
+    k = min(SHINGLE_WORDS, len(tokens))
+    count = len(tokens) - k + 1
+    combined = np.zeros(count, dtype=np.uint64)
+    for j in range(k):
+        combined += tokens[j:j + count] * _SHINGLE_MULT[j]  # Wraps around mod 2**64, which is fine for a hash
+    return np.unique((combined ^ (combined >> _SHIFT)) & _MASK32)
+
+
+def minhash(shingles: np.ndarray) -> np.ndarray:
+    # NUM_PERM minimums over the shingles of the multiply-shift hashes (a * x + b) mod 2**64 >> 32, as uint32.
+    # Same spread as a modulo-prime hash, but numpy does it without a single division
+    shingles = np.asarray(shingles, dtype=np.uint64)
+    mins = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    buffer = np.empty((min(len(shingles), MINHASH_BLOCK), NUM_PERM), dtype=np.uint64)
+    for i in range(0, len(shingles), MINHASH_BLOCK):
+        block = shingles[i:i + MINHASH_BLOCK, None]
+        hashed = buffer[:len(block)]
+        # In place, so no (shingles x NUM_PERM) temporaries get allocated
+        np.multiply(block, _PERM_A, out=hashed)
+        np.add(hashed, _PERM_B, out=hashed)
+        np.right_shift(hashed, _SHIFT, out=hashed)
+        np.minimum(mins, hashed.min(axis=0), out=mins)
+    return mins.astype(np.uint32)
+
+
+def signature(text: str) -> np.ndarray:
+    return minhash(shingle_hashes(text))
+
+
+def band_hashes(signatures: np.ndarray) -> np.ndarray:
+    # (n, NUM_PERM) signatures -> (n, BANDS) one 64-bit hash per band
+    bands = signatures.reshape(len(signatures), BANDS, ROWS).astype(np.uint64)
+    return (bands * _BAND_MULT).sum(axis=2, dtype=np.uint64)
+
+
+class NearDupIndex:
+    """
+    In-memory LSH index over MinHash signatures, keyed by tc_text_hash.
+
+    Each band keeps its hashes sorted (with the row they belong to), so a query is BANDS binary searches.
+    Rows added one at a time wait in a small pending list that queries scan directly, and are merged
+    into the sorted arrays every MERGE_EVERY additions.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.keys: List[str] = []
+        self.rows = {}  # key -> row
+        self.signatures = np.empty((0, NUM_PERM), dtype=np.uint32)
+        self.hashes = np.empty((0, BANDS), dtype=np.uint64)
+        self.size = 0  # The two arrays above grow by doubling, only the first `size` rows are used
+        self.sorted_hashes = np.empty((BANDS, 0), dtype=np.uint64)
+        self.sorted_rows = np.empty((BANDS, 0), dtype=np.int64)
+        self.pending: List[int] = []
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, extra: int):
+        needed = self.size + extra
+        if needed <= len(self.signatures):
+            return
+        capacity = max(needed, 2 * len(self.signatures), 64)
+        signatures = np.empty((capacity, NUM_PERM), dtype=np.uint32)
+        hashes = np.empty((capacity, BANDS), dtype=np.uint64)
+        signatures[:self.size] = self.signatures[:self.size]
+        hashes[:self.size] = self.hashes[:self.size]
+        self.signatures, self.hashes = signatures, hashes
+
+    def _merge(self):
+        # Re-sorts every band over all rows, O(n log n) but all in numpy
+        hashes = self.hashes[:self.size].T
+        order = np.argsort(hashes, axis=1, kind="stable")
+        self.sorted_hashes = np.take_along_axis(hashes, order, axis=1)
+        self.sorted_rows = order
+        self.pending = []
+
+    def add_many(self, keys: Sequence[str], signatures: np.ndarray):
+        """Bulk insert, used when the index is loaded. Keys already in the index are skipped."""
+        signatures = np.asarray(signatures, dtype=np.uint32).reshape(-1, NUM_PERM)
+        with self.lock:
+            fresh = [i for i, key in enumerate(keys) if key not in self.rows]
+            if not fresh:
+                return
+            self._grow(len(fresh))
+            rows = slice(self.size, self.size + len(fresh))
+            self.signatures[rows] = signatures[fresh]
+            self.hashes[rows] = band_hashes(signatures[fresh])
+            for offset, i in enumerate(fresh):
+                self.rows[keys[i]] = self.size + offset
+                self.keys.append(keys[i])
+            self.size += len(fresh)
+            self._merge()
+
+    def add(self, key: str, signature: np.ndarray):
+        with self.lock:
+            if key in self.rows:
+                return
+            self._grow(1)
+            self.signatures[self.size] = signature
+            self.hashes[self.size] = band_hashes(signature.reshape(1, NUM_PERM))[0]
+            self.rows[key] = self.size
+            self.keys.append(key)
+            self.pending.append(self.size)
+            self.size += 1
+            if len(self.pending) >= MERGE_EVERY:
+                self._merge()
+
+    def query(self, signature: np.ndarray, threshold: float = SIMILARITY_THRESHOLD, limit: int = 5):
+        """[(key, estimated similarity)] of the closest stored signatures at or above threshold, best first"""
+        wanted = band_hashes(signature.reshape(1, NUM_PERM))[0]
+        with self.lock:
+            found = []
+            for band in range(BANDS):
+                column = self.sorted_hashes[band]
+                lo = np.searchsorted(column, wanted[band], side="left")
+                hi = np.searchsorted(column, wanted[band], side="right")
+                if hi > lo:
+                    found.append(self.sorted_rows[band, lo:hi])
+            if self.pending:
+                pending = np.array(self.pending, dtype=np.int64)
+                found.append(pending[(self.hashes[pending] == wanted).any(axis=1)])
+            if not found:
+                return []
+
+            rows = np.unique(np.concatenate(found))
+            similarity = (self.signatures[rows] == signature).mean(axis=1)
+            keep = similarity >= threshold
+            rows, similarity = rows[keep], similarity[keep]
+            best = np.argsort(-similarity, kind="stable")[:limit]
+            return [(self.keys[rows[i]], float(similarity[i])) for i in best]
+
+
+_default_index: Optional[NearDupIndex] = None
+_default_index_lock = threading.Lock()
+
+
+def get_index() -> NearDupIndex:
+    # Process-wide index, loaded from the tc_signatures table on first use
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            index = NearDupIndex()
+            keys, blobs = load_text_signatures()
+            if keys:
+                index.add_many(keys, np.frombuffer(b"".join(blobs), dtype=np.uint32))
+            _default_index = index
+        return _default_index
+
+
+def sift(text: str, threshold: float = SIMILARITY_THRESHOLD):
+    """
+    textsifter(text), reusing the sentence verdicts of the most similar stored text when one is at or above
+    threshold and was sifted with the current rules. The result is the same as a full textsifter run.
+    Returns (result, hit_spans, signature, match), match being (tc_text_hash, similarity) of the reused text or None.
+    """
+    text_signature = signature(text)
+    version = pattern_registry.current().version
+    for key, similarity in get_index().query(text_signature, threshold):
+        reference = get_sifted_text(key)
+        if reference and reference["pattern_version"] == version:
+            result, hit_spans = sift_document(text, (reference["tc_text"], reference["hit_spans"]))
+            return result, hit_spans, text_signature, (key, similarity)
+
+    result, hit_spans = sift_document(text)
+    return result, hit_spans, text_signature, None
+
+
+def remember(text: str, text_signature: np.ndarray, hit_spans: list, pattern_version: str):
+    """Stores the signature and sentence verdicts of an analysed text and adds it to the index"""
+    key = hashlib.sha256(text.encode()).hexdigest()
+    stored = store_text_signature(key, text_signature.tobytes(), hit_spans, pattern_version)
+    if stored.get("success"):
+        get_index().add(key, text_signature)
+    return stored
@@ -0,0 +1,247 @@
+"""
+Streaming HTML -> visible text.
+
+PageTextParser sits on lxml's parser "target" interface, so no tree is ever built: bytes go in as they
+are downloaded, and visible text strings come out as soon as the parser has seen them, each tagged with the
+block element it belongs to. script, style and noscript contents are dropped on the way.
+Headings and links ((href, text) pairs) are picked up in the same pass, so one parse gives ClauseFetch
+everything it needs from a page.
+
+    parser = PageTextParser(encoding="utf-8")
+    for chunk in response.iter_content(64 * 1024):
+        for text, block in parser.feed(chunk):
+            ...
+    doc = parser.close()
+
+The PageDocument it builds holds the same text/lines/blocks that ClauseFetch.clean_text_with_index produces
+from a BeautifulSoup tree, so tac_in_page takes either.
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from lxml import etree
+
+# Elements whose text is a self-contained block, used as the "context" of a legal line
+BLOCK_TAGS = {
+    "p", "div", "li", "td", "th", "tr", "table", "ul", "ol", "dl", "dd", "dt", "section", "article", "main",
+    "aside", "header", "footer", "nav", "blockquote", "pre", "form", "fieldset", "figure", "figcaption",
+    "details", "summary", "address", "h1", "h2", "h3", "h4", "h5", "h6", "title", "body",
+}
+SKIP_TAGS = {"script", "style", "noscript"}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6", "title"}
+
+# Signs of a client-side rendered app shell, seen in attributes and in <noscript> text
+SHELL_IDS = {"root", "app", "__next", "__nuxt", "svelte"}
+SHELL_ATTRS = {"ng-app", "data-reactroot"}
+SHELL_TEXT = re.compile(r"enable javascript|javascript is (?:required|disabled)|requires javascript", re.IGNORECASE)
+
+
+class TextBlock:
+    # Stand-in for the block element a line came from: its identity, and the block it's nested in
+    __slots__ = ("tag", "parent")
+
+    def __init__(self, tag: str, parent: Optional["TextBlock"] = None):
+        self.tag = tag
+        self.parent = parent
+
+    def __repr__(self):
+        return f"<TextBlock {self.tag}>"
+
+
+class PageDocument:
+    """Everything ClauseFetch needs from a page, collected in one parse"""
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self.lines: List[str] = []
+        self.blocks: List[TextBlock] = []
+        self.headings: List[str] = []
+        self.anchors: List[Tuple[str, str]] = []  # (href, link text) of every <a href>
+        self.visible_chars = 0
+        self.shell_marker = False
+        self.truncated = False  # The download hit its byte cap, the text is only the start of the page
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.strings)
+
+    @property
+    def index(self) -> Dict[str, Any]:
+        # The shape tac_in_page expects from clean_text_with_index
+        return {"lines": self.lines, "blocks": self.blocks, "headings": self.headings}
+
+
+class _Element:
+    __slots__ = ("tag", "block", "own", "heading", "anchors", "href")
+
+    def __init__(
+        self,
+        tag: str,
+        block: Optional[TextBlock],
+        heading: Optional[List[str]] = None,
+        anchors: Tuple[List[str], ...] = (),
+        href: Optional[str] = None,
+    ):
+        self.tag = tag
+        self.block = block  # Nearest real block element, itself included
+        self.own: Optional[TextBlock] = None  # Used when there is no block ancestor at all
+        self.heading = heading  # Text collector when inside a heading
+        self.anchors = anchors  # Text collectors of the links this element is in (nested links happen)
+        self.href = href
+
+
+class _TextTarget:
+    # lxml parser target: receives start/end/data events and never builds elements
+    def __init__(self, doc: PageDocument):
+        self.doc = doc
+        self.stack: List[_Element] = []
+        self.skip = 0
+        self.skip_root = ""  # Outermost skipped tag, noscript text is still checked for shell hints
+        self.skip_text: List[str] = []
+        self.pending: List[str] = []
+        self.ready: List[Tuple[str, TextBlock]] = []
+
+    def _flush(self):
+        if not self.pending:
+            return
+        raw = "".join(self.pending)
+        self.pending = []
+        if self.skip:
+            if self.skip_root == "noscript":
+                self.skip_text.append(raw)
+            return
+
+        text = raw.strip()
+        if not text or not self.stack:
+            return
+
+        top = self.stack[-1]
+        block = top.block
+        if block is None:
+            # No block ancestor: the immediate parent is the context, like in clean_text_with_index
+            if top.own is None:
+                top.own = TextBlock(top.tag)
+            block = top.own
+        if top.heading is not None:
+            top.heading.append(raw)
+        for anchor in top.anchors:
+            anchor.append(text)
+
+        doc = self.doc
+        doc.strings.append(text)
+        doc.visible_chars += len(text) + 1
+        for line in text.splitlines():
+            line = line.strip()
+            if line:
+                doc.lines.append(line)
+                doc.blocks.append(block)
+        self.ready.append((text, block))
+
+    def start(self, tag, attrib):
+        self._flush()
+        if not isinstance(tag, str):
+            return
+        tag = tag.lower()
+        if self.skip or tag in SKIP_TAGS:
+            if not self.skip:
+                self.skip_root = tag
+            self.skip += 1
+            self.stack.append(_Element(tag, None))
+            return
+
+        if not self.doc.shell_marker and (
+            attrib.get("id") in SHELL_IDS or any(a in attrib for a in SHELL_ATTRS)
+        ):
+            self.doc.shell_marker = True
+
+        parent = self.stack[-1] if self.stack else None
+        outer = parent.block if parent else None
+        block = TextBlock(tag, outer) if tag in BLOCK_TAGS else outer
+        heading = [] if tag in HEADING_TAGS else (parent.heading if parent else None)
+        href = attrib.get("href") if tag == "a" else None
+        anchors = parent.anchors if parent else ()
+        if href is not None:
+            anchors = anchors + ([],)
+        self.stack.append(_Element(tag, block, heading, anchors, href))
+
+    def end(self, tag):
+        self._flush()
+        if not self.stack:
+            return
+        element = self.stack.pop()
+        if self.skip:
+            self.skip -= 1
+            if not self.skip:
+                if self.skip_root == "noscript" and SHELL_TEXT.search(" ".join(self.skip_text)):
+                    self.doc.shell_marker = True
+                self.skip_text = []
+            return
+        if element.tag in HEADING_TAGS and element.heading:
+            self.doc.headings.append("".join(element.heading).strip())
+        if element.href is not None:
+            self.doc.anchors.append((element.href, "".join(element.anchors[-1])))
+
+    def data(self, data):
+        self.pending.append(data)
+
+    def comment(self, text):
+        self._flush()
+
+    def pi(self, target, data=None):
+        self._flush()
+
+    def doctype(self, *args):
+        pass
+
+    def close(self):
+        self._flush()
+        while self.stack:
+            self.end(self.stack[-1].tag)
+        return self.doc
+
+
+class PageTextParser:
+    """
+    Incremental parser: feed() bytes (or str) as they arrive, get back the text strings completed so far.
+    encoding is the charset to decode bytes with, None lets lxml sniff it from the document.
+    """
+
+    def __init__(self, encoding: Optional[str] = None):
+        self.doc = PageDocument()
+        self.target = _TextTarget(self.doc)
+        self.encoding = encoding
+        self.parser: Optional[etree.HTMLParser] = None
+
+    def _parser_for(self, data: Union[bytes, str]) -> etree.HTMLParser:
+        if self.parser is None:
+            # An explicit encoding only makes sense for bytes, str input is already decoded
+            encoding = self.encoding if isinstance(data, bytes) else None
+            self.parser = etree.HTMLParser(target=self.target, encoding=encoding, recover=True)
+        return self.parser
+
+    def _drain(self) -> List[Tuple[str, TextBlock]]:
+        ready, self.target.ready = self.target.ready, []
+        return ready
+
+    def feed(self, data: Union[bytes, str]) -> List[Tuple[str, TextBlock]]:
+        if data:
+            self._parser_for(data).feed(data)
+        return self._drain()
+
+    def close(self) -> PageDocument:
+        if self.parser is not None:
+            try:
+                self.parser.close()
+            except etree.XMLSyntaxError:
+                pass  # Empty or hopeless input, whatever was parsed so far is kept
+        self.target.close()
+        self._drain()
+        return self.doc
+
+
+def parse_page(chunks: Iterable[Union[bytes, str]], encoding: Optional[str] = None) -> PageDocument:
+    parser = PageTextParser(encoding)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close()
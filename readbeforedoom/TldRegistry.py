@@ -0,0 +1,223 @@
+"""
+Process-wide registry of top-level domains, plus optional Public Suffix List lookups.
+
+validate_url checks the TLD of every URL. The set of TLDs is loaded once, from the disk cache or (first run,
+no network) the bundled tld_snapshot.txt, and kept as a frozenset. When the cache gets older than MAX_AGE a daemon
+thread downloads a fresh copy from IANA and swaps the set in, so a lookup never waits on the network.
+
+The Public Suffix List is only loaded when registrable_domain() is first used: cached copy, or the one
+distributions ship in /usr/share/publicsuffix, refreshed in the background the same way.
+
+    registry = get_tld_registry()
+    registry.is_tld("com")                          # True
+    registry.registrable_domain("shop.example.co.uk")  # "example.co.uk"
+"""
+
+import os
+import threading
+import time
+from typing import FrozenSet, Optional, Tuple
+
+import idna
+import requests
+
+from HttpClient import get_client
+
+IANA_TLD_URL = "https://data.iana.org/TLD/tlds-alpha-by-domain.txt"
+PSL_URL = "https://publicsuffix.org/list/public_suffix_list.dat"
+CACHE_DIR = os.path.expanduser("~/.linkgate_cache")
+TLD_SNAPSHOT = os.path.join(os.path.dirname(__file__), "tld_snapshot.txt")
+SYSTEM_PSL = "/usr/share/publicsuffix/public_suffix_list.dat"
+MAX_AGE = 7 * 24 * 3600  # Refresh the lists weekly
+RETRY_AFTER = 3600  # Wait this long after a failed download before trying again
+MIN_TLDS = 1000  # A download with fewer entries than this is a broken response, not a real list
+
+# (rules, wildcard rules without their "*.", exception rules without their "!")
+SuffixRules = Tuple[FrozenSet[str], FrozenSet[str], FrozenSet[str]]
+
+
+def parse_tld_list(text: str) -> FrozenSet[str]:
+    # IANA format: one uppercase TLD per line, "#" lines are comments (the first one is the version header)
+    return frozenset(
+        line.strip().upper() for line in text.splitlines() if line.strip() and not line.startswith("#")
+    )
+
+
+def _ascii_rule(rule: str) -> str:
+    # Hostnames reach us punycoded (validate_url runs idna.encode), so rules are stored that way too
+    if rule.isascii():
+        return rule
+    try:
+        return idna.encode(rule).decode("ascii")
+    except idna.IDNAError:
+        return rule
+
+
+def parse_suffix_list(text: str, private: bool = True) -> SuffixRules:
+    """Rules of a public_suffix_list.dat. private=False leaves out the PRIVATE DOMAINS section (github.io, ...)"""
+    rules, wildcards, exceptions = set(), set(), set()
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("// ===BEGIN PRIVATE DOMAINS===") and not private:
+            break
+        if not line or line.startswith("//"):
+            continue
+        rule = line.split()[0].lower()
+        if rule.startswith("!"):
+            exceptions.add(_ascii_rule(rule[1:]))
+        elif rule.startswith("*."):
+            wildcards.add(_ascii_rule(rule[2:]))
+        else:
+            rules.add(_ascii_rule(rule))
+    return frozenset(rules), frozenset(wildcards), frozenset(exceptions)
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _age(path: str) -> float:
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return float("inf")
+
+
+def _write_atomic(path: str, text: str):
+    # Readers in other processes never see a half written cache file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class _List:
+    # One downloadable list: where it's cached, when it was loaded and whether a refresh is running
+    def __init__(self, url: str, cache_path: str):
+        self.url = url
+        self.cache_path = cache_path
+        self.loaded_at = 0.0  # time.time() the loaded copy was downloaded (cache mtime), 0 for bundled copies
+        self.failed_at = 0.0
+        self.refreshing = False
+
+
+class TldRegistry:
+    """
+    - is_tld(label): label is a delegated top-level domain (case-insensitive, punycode for IDN TLDs)
+    - public_suffix(host) / registrable_domain(host): Public Suffix List lookups
+    - background=False turns the refresh threads off, e.g. for offline batch jobs
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_age: float = MAX_AGE, background: bool = True):
+        self.max_age = max_age
+        self.background = background
+        self.lock = threading.Lock()
+        self.tld_list = _List(IANA_TLD_URL, os.path.join(cache_dir, "tlds-alpha-by-domain.txt"))
+        self.psl_list = _List(PSL_URL, os.path.join(cache_dir, "public_suffix_list.dat"))
+        self.tlds = self._load_tlds()
+        self.suffixes: Optional[SuffixRules] = None
+
+    def _load_tlds(self) -> FrozenSet[str]:
+        cached = _read(self.tld_list.cache_path)
+        tlds = parse_tld_list(cached) if cached else frozenset()
+        if len(tlds) >= MIN_TLDS:
+            self.tld_list.loaded_at = time.time() - _age(self.tld_list.cache_path)
+            return tlds
+        return parse_tld_list(_read(TLD_SNAPSHOT) or "")
+
+    def _load_suffixes(self) -> SuffixRules:
+        for path in (self.psl_list.cache_path, SYSTEM_PSL):
+            text = _read(path)
+            if text and "===BEGIN ICANN DOMAINS===" in text:
+                if path == self.psl_list.cache_path:
+                    self.psl_list.loaded_at = time.time() - _age(path)
+                return parse_suffix_list(text)
+        return frozenset(), frozenset(), frozenset()
+
+    def _maybe_refresh(self, source: _List):
+        # Cheap enough for every lookup: two comparisons unless a refresh is actually due
+        now = time.time()
+        if not self.background or now - source.loaded_at < self.max_age or now - source.failed_at < RETRY_AFTER:
+            return
+        with self.lock:
+            if source.refreshing:
+                return
+            source.refreshing = True
+        threading.Thread(target=self.refresh, args=(source,), name="tld-refresh", daemon=True).start()
+
+    def refresh(self, source: Optional[_List] = None):
+        """Downloads a list (the TLDs by default) and swaps it in. Returns False if the download failed."""
+        source = source or self.tld_list
+        try:
+            response = get_client().get(source.url, timeout=10)
+            response.raise_for_status()
+            text = response.text
+            if source is self.tld_list:
+                tlds = parse_tld_list(text)
+                if len(tlds) < MIN_TLDS:
+                    raise ValueError(f"only {len(tlds)} TLDs in the IANA response")
+                self.tlds = tlds
+            else:
+                if "===BEGIN ICANN DOMAINS===" not in text:
+                    raise ValueError("not a public suffix list")
+                self.suffixes = parse_suffix_list(text)
+            source.loaded_at = time.time()
+            try:
+                _write_atomic(source.cache_path, text)
+            except OSError:
+                pass  # Cache save failure shouldn't break functionality
+            return True
+        except (requests.RequestException, ValueError) as e:
+            source.failed_at = time.time()
+            print(f"Warning: could not refresh {source.url}: {e}")
+            return False
+        finally:
+            source.refreshing = False
+
+    def is_tld(self, label: str) -> bool:
+        self._maybe_refresh(self.tld_list)
+        return label.upper() in self.tlds
+
+    def public_suffix(self, host: str) -> str:
+        """Longest public suffix of host, per the PSL rules (the last label when nothing matches)"""
+        if self.suffixes is None:
+            with self.lock:
+                if self.suffixes is None:
+                    self.suffixes = self._load_suffixes()
+        self._maybe_refresh(self.psl_list)
+        rules, wildcards, exceptions = self.suffixes
+
+        labels = host.lower().rstrip(".").split(".")
+        for i in range(len(labels)):
+            candidate = ".".join(labels[i:])
+            if candidate in exceptions:
+                return ".".join(labels[i + 1:])
+            if candidate in rules or (i + 1 < len(labels) and ".".join(labels[i + 1:]) in wildcards):
+                return candidate
+        return labels[-1]
+
+    def registrable_domain(self, host: str) -> Optional[str]:
+        """The public suffix plus one label ("example.co.uk"), None if host is itself a public suffix"""
+        labels = host.lower().rstrip(".").split(".")
+        suffix_labels = self.public_suffix(host).count(".") + 1
+        if len(labels) <= suffix_labels:
+            return None
+        return ".".join(labels[-suffix_labels - 1:])
+
+
+_default_registry: Optional[TldRegistry] = None
+_default_registry_lock = threading.Lock()
+
+
+def get_tld_registry() -> TldRegistry:
+    # Process-wide registry, loaded on first use
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = TldRegistry()
+        return _default_registry
@@ -0,0 +1,91 @@
+"""
+Network-free first pass over big URL lists.
+
+Lots of URLs in customer lists fail for purely syntactic reasons, and there's no point spending DNS and HTTP
+on them. prefilter() streams the input, normalizes every URL and rejects, with a reason:
+
+- malformed: urlparse can't parse it
+- bad_scheme: anything but http/https
+- no_host / bad_port
+- ip_literal: linkgate only checks named sites
+- idna: a non-ASCII hostname IDNA can't encode
+- bad_label: a hostname label linkgate's is_valid_hostname refuses
+- unknown_tld: not in the TLD registry
+- duplicate: same host as an earlier URL (or the same URL again with dedupe_hosts=False)
+
+All but duplicate come from Linkgate.split_url, the normalization linkgate itself runs, so whatever survives
+here linkgate won't reject offline either.
+
+Survivors come out normalized (scheme and host lowercased, punycode host, default port and fragment dropped)
+in input order. Only the set of hosts seen so far is kept in memory.
+
+    python UrlPrefilter.py urls.txt survivors.txt rejects.jsonl
+"""
+
+import json
+import sys
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from urllib.parse import urlunparse
+
+from Linkgate import split_url
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> Tuple[Optional[str], Optional[str], Optional[Tuple[str, str]]]:
+    """(normalized url, ascii host, None) or (None, None, (reason, message)) for one URL, no network involved"""
+    parsed, host, problem = split_url(url)
+    if problem:
+        return None, None, problem
+    port = parsed.port
+    netloc = host if port is None or port == DEFAULT_PORTS[parsed.scheme] else f"{host}:{port}"
+    return urlunparse((parsed.scheme, netloc, parsed.path or "/", parsed.params, parsed.query, "")), host, None
+
+
+def prefilter(lines: Iterable[str], dedupe_hosts: bool = True) -> Iterator[Dict[str, Optional[str]]]:
+    """
+    One dict per non-blank, non-"#" line: {"input", "url", "reason", "message"}.
+    Survivors have the normalized "url" and reason None, rejects have url None.
+    """
+    seen = set()  # Hosts (or normalized urls with dedupe_hosts=False) already let through
+    for line in lines:
+        raw = line.strip()
+        if not raw or raw.startswith("#"):
+            continue
+
+        url, host, problem = normalize_url(raw)
+        if problem is None:
+            key = host if dedupe_hosts else url
+            if key in seen:
+                problem = ("duplicate", f"Already listed: {key}")
+            else:
+                seen.add(key)
+
+        if problem is None:
+            yield {"input": raw, "url": url, "reason": None, "message": None}
+        else:
+            yield {"input": raw, "url": None, "reason": problem[0], "message": problem[1]}
+
+
+def prefilter_file(in_path: str, survivors_path: str, rejects_path: str, dedupe_hosts: bool = True) -> Dict[str, int]:
+    """Streams in_path into survivors (one url per line) and rejects (JSON lines), returns counts per reason"""
+    counts = {"survivors": 0}
+    with open(in_path, "r", encoding="utf-8", errors="replace") as src, open(
+        survivors_path, "w", encoding="utf-8"
+    ) as survivors, open(rejects_path, "w", encoding="utf-8") as rejects:
+        for record in prefilter(src, dedupe_hosts):
+            if record["reason"] is None:
+                survivors.write(record["url"] + "\n")
+                counts["survivors"] += 1
+            else:
+                rejects.write(json.dumps(record, ensure_ascii=False) + "\n")
+                counts[record["reason"]] = counts.get(record["reason"], 0) + 1
+    return counts
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print("usage: python UrlPrefilter.py urls.txt survivors.txt rejects.jsonl")
+        sys.exit(1)
+    for reason, count in prefilter_file(*sys.argv[1:]).items():
+        print(f"{reason}: {count}")
@@ -0,0 +1,165 @@
+"""
+Verdict cache for linkgate.
+
+Batch runs see the same URLs (and the same dead sites) over and over. linkgate's verdicts are remembered per
+normalized URL, each kind for its own TTL:
+
+- "valid": the URL checked out and the site answered
+- "invalid": it never will (bad format, unknown TLD, NXDOMAIN, private IP, 4xx)
+- "blocked": the site turned this client away (403, 405, 408), a GET or a later try may well get through
+- "unreachable": it might later (timeouts, connection errors, 5xx/429)
+
+Unreachable verdicts also put the host that failed (a redirect target, not necessarily the URL's own host) into
+exponential backoff: while it lasts every URL on that host gets the cached failure straight away instead of
+another connection attempt. One valid verdict clears the backoff.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+VERDICT_TTLS = {"valid": 3600, "invalid": 24 * 3600, "blocked": 60, "unreachable": 60}
+BACKOFF_BASE = 30  # Seconds a host is skipped after its first failure, doubled on every further one
+BACKOFF_MAX = 3600
+MAX_ENTRIES = 100000
+
+
+def with_scheme(url: str) -> str:
+    """
+    url with https:// added when it has no scheme of its own. "example.com:8080/x" is a host and port, not the
+    scheme "example.com", while "mailto:bob@example.com" or "ftp:host" keep theirs. Raises ValueError like urlsplit.
+    """
+    if url.startswith("//"):
+        return "https:" + url
+    scheme = urlsplit(url).scheme
+    if scheme and not url[len(scheme) + 1:len(scheme) + 2].isdigit():
+        return url
+    return "https://" + url
+
+
+def cache_key(url: str) -> str:
+    # Cheap normalization before any validation: scheme added if missing, scheme/host lowercased, no fragment
+    url = url.strip()
+    try:
+        parts = urlsplit(with_scheme(url))
+    except ValueError:
+        return url
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", parts.query, ""))
+
+
+def _host(key: str) -> str:
+    try:
+        return urlsplit(key).hostname or ""
+    except ValueError:
+        return ""
+
+
+class VerdictCache:
+    """
+    get(url) -> (kind, result) or None, put(url, kind, result).
+    stats counts hits (by kind), misses, backoff skips and stored verdicts. clock is swappable for tests.
+    """
+
+    def __init__(
+        self,
+        ttls: Optional[Dict[str, float]] = None,
+        backoff_base: float = BACKOFF_BASE,
+        backoff_max: float = BACKOFF_MAX,
+        max_entries: int = MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttls = dict(VERDICT_TTLS, **(ttls or {}))
+        self.clock = clock
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_entries = max_entries
+
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, Tuple[float, str, dict]]" = OrderedDict()  # key -> (expires_at, kind, result)
+        self.backoff: Dict[str, Tuple[int, float]] = {}  # host -> (consecutive failures, retry_at)
+        self.stats = {
+            "hits": 0, "valid_hits": 0, "invalid_hits": 0, "blocked_hits": 0, "unreachable_hits": 0,
+            "misses": 0, "backoff_skips": 0, "stored": 0,
+        }
+
+    def get(self, url: str, valid: bool = True) -> Optional[Tuple[str, dict]]:
+        """
+        Cached verdict for url. valid=False (callers that need a live response) only returns failures that a
+        GET would run into as well, so no valid or blocked verdicts (a 405 to HEAD says nothing about GET).
+        """
+        key = cache_key(url)
+        now = self.clock()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self.entries[key]
+                entry = None
+            if entry is not None and (valid or entry[1] not in ("valid", "blocked")):
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                self.stats[f"{entry[1]}_hits"] += 1
+                return entry[1], dict(entry[2])
+
+            host = _host(key)
+            failures, retry_at = self.backoff.get(host, (0, 0.0))
+            if failures and now < retry_at:
+                self.stats["backoff_skips"] += 1
+                return "unreachable", {
+                    "valid": False,
+                    "url": url,
+                    "message": f"Host unreachable, retrying in {retry_at - now:.0f}s after {failures} failure(s)",
+                }
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, url: str, kind: str, result: dict):
+        key = cache_key(url)
+        now = self.clock()
+        stored = {k: v for k, v in result.items() if k != "response"}  # A live response can't be replayed
+        with self.lock:
+            self.entries[key] = (now + self.ttls[kind], kind, stored)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.stats["stored"] += 1
+
+            # result["url"] is where the check ended: the redirect hop that timed out, or the final page
+            ended_at = _host(cache_key(result["url"])) if result.get("url") else _host(key)
+            if kind == "unreachable":
+                failures = self.backoff.get(ended_at, (0, 0.0))[0] + 1
+                delay = min(self.backoff_base * 2 ** (failures - 1), self.backoff_max)
+                self.backoff[ended_at] = (failures, now + delay)
+            elif kind == "valid":
+                # Every host on the way answered
+                self.backoff.pop(_host(key), None)
+                self.backoff.pop(ended_at, None)
+            if len(self.backoff) > self.max_entries:
+                # Forget hosts whose backoff ran out long ago, their next failure starts from the base delay again
+                self.backoff = {h: b for h, b in self.backoff.items() if b[1] + self.backoff_max > now}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.backoff.clear()
+
+
+_default_cache: Optional[VerdictCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_verdict_cache() -> VerdictCache:
+    # Process-wide cache, created on first use
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = VerdictCache()
+        return _default_cache
+
+
+def set_verdict_cache(cache: Optional[VerdictCache]):
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = cache
@@ -0,0 +1,393 @@
+"""
+Micro-benchmarks for the hot paths of ReadBeforeDoom.
+
+Run from the readbeforedoom directory:
+    python benchmarks.py            # runs everything
+    python benchmarks.py sifter     # runs just one of them
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import time
+
+import textsifter as ts
+
+
+def _timeit(func, *args, repeat=5):
+    # Best of `repeat` runs, the usual way of cutting out scheduler noise
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def synthetic_tc_corpus(size_bytes: int, seed: int = 6008) -> str:
+    """
+    Builds a fake T&C document of roughly `size_bytes` characters out of the examples in
+    risk_patterns.json, mixed with boring filler sentences like a real policy
+    """
+    pattern_file = os.path.join(os.path.dirname(__file__), "risk_patterns.json")
+    with open(pattern_file, "r") as f:
+        data = json.load(f)
+
+    risky = [ex for info in data["patterns"].values() for ex in info.get("examples", [])]
+    filler = [
+        "These terms apply to all visitors of the website and its subdomains",
+        "Please read this agreement carefully before using our platform",
+        "The headings in this document are for convenience only and have no legal effect",
+        "If any provision is found unenforceable the remaining provisions stay in force",
+        "You must be at least thirteen years old to create an account on the platform",
+        "Our support team can be reached through the contact form on the help page",
+        "Section titles are provided for reference and do not limit the scope of each section",
+        "Nothing in these terms creates a partnership or employment relationship between us",
+    ]
+
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    while total < size_bytes:
+        sent = rng.choice(risky) if rng.random() < 0.1 else rng.choice(filler)
+        parts.append(sent + ". ")
+        total += len(sent) + 2
+    return "".join(parts)
+
+
+# The regex rules risk_patterns.json shipped with before proximity rules, kept here as the baseline
+LEGACY_PATTERNS = {
+    "data_collection": r"(collect|store|process|gather|track).*(personal|data|information)",
+    "third_party_sharing": r"(share|disclose|transfer|provide).*(third.?party|partner|affiliate)",
+    "liability_disclaimer": r"(not liable|disclaim|exclude|limit liability|no responsibility)",
+    "unilateral_changes": r"(modify|change|alter|update).*(without notice|at any time|sole discretion)",
+    "broad_permissions": r"(any purpose|unlimited|perpetual|irrevocable)",
+    "content_rights": r"(license|grant|assign).*(content|material|intellectual property)",
+    "payment_traps": r"(non.?refundable|automatic.?renewal|recurring.?charge|subscription.?fee)",
+    "dispute_waiver": r"(waive|forfeit|relinquish).*(right|claim|dispute|litigation|arbitration)",
+    "account_termination": r"(terminate|suspend|disable).*(account|access|service).*(any time|discretion)",
+}
+
+
+def _per_category_loop(sentences):
+    # The original textsifter loop
+    found = []
+    for sent in sentences:
+        for risk_category, pattern in LEGACY_PATTERNS.items():
+            if re.search(pattern, sent, re.IGNORECASE):
+                found.append(risk_category)
+                break
+    return found
+
+
+def _matcher_loop(matcher, sentences):
+    found = []
+    for sent in sentences:
+        category = matcher.match(sent)
+        if category:
+            found.append(category)
+    return found
+
+
+def bench_sifter():
+    print("textsifter matcher: per-category re.search vs RiskMatcher (legacy regexes) vs RiskMatcher (current rules)")
+    legacy_matcher = ts.RiskMatcher(LEGACY_PATTERNS)
+    for size_kb in (50, 100, 200):
+        corpus = synthetic_tc_corpus(size_kb * 1024)
+        sentences = ts.text_preprocessor(corpus)["cleaned_stuff"]
+
+        old_time, old_found = _timeit(_per_category_loop, sentences)
+        new_time, new_found = _timeit(_matcher_loop, legacy_matcher, sentences)
+        assert old_found == new_found, "combined matcher disagrees with the per-category loop"
+        cur_time, cur_found = _timeit(_matcher_loop, ts.pattern_registry.current().matcher, sentences)
+
+        print(
+            f"  {size_kb:>4} KB, {len(sentences):>5} sentences: "
+            f"loop {old_time * 1000:8.2f} ms | combined {new_time * 1000:8.2f} ms (x{old_time / new_time:.1f}) | "
+            f"current rules {cur_time * 1000:8.2f} ms, {len(cur_found)} hits"
+        )
+
+
+def bench_runon():
+    # Bulleted legal text without any periods ends up as one giant "sentence"
+    print("run-on sentence: legacy '.*' regexes vs proximity rules")
+    bullet = "\u2022 we may collect and store usage records from your device "
+    for size_kb in (5, 10, 20, 40):
+        sent = bullet * (size_kb * 1024 // len(bullet))
+        old_time, _ = _timeit(_per_category_loop, [sent], repeat=1)
+        new_time, _ = _timeit(_matcher_loop, ts.pattern_registry.current().matcher, [sent], repeat=3)
+        print(f"  {size_kb:>4} KB: legacy {old_time * 1000:10.2f} ms | proximity {new_time * 1000:8.2f} ms")
+
+
+def bench_stream():
+    # Peak traced memory of the whole-string textsifter vs the streaming one, fed 64 KB chunks
+    import tracemalloc
+
+    print("textsifter vs textsifter_stream: peak memory on big documents")
+    for size_mb in (1, 4):
+        doc = synthetic_tc_corpus(size_mb * 1024 * 1024)
+        chunk_size = 64 * 1024
+
+        tracemalloc.start()
+        whole = ts.textsifter(doc)
+        whole_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        streamed = ts.textsifter_stream(doc[i:i + chunk_size] for i in range(0, len(doc), chunk_size))
+        stream_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        assert whole == streamed
+        print(
+            f"  {size_mb:>2} MB: textsifter peak {whole_peak / 1e6:8.2f} MB | "
+            f"textsifter_stream peak {stream_peak / 1e6:6.2f} MB"
+        )
+
+
+def bench_batch():
+    # Throughput of textsifter_batch for growing worker counts, on a fixed corpus of 100 KB policies
+    print(f"textsifter_batch scaling ({os.cpu_count()} cores available)")
+    docs = [synthetic_tc_corpus(100 * 1024, seed) for seed in range(64)]
+    expected = [ts.textsifter(doc) for doc in docs]
+
+    worker_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    base = None
+    for workers in worker_counts:
+        elapsed, results = _timeit(ts.textsifter_batch, docs, workers, repeat=1)
+        assert results == expected, "batch results differ from textsifter"
+        base = base or elapsed
+        print(
+            f"  {workers:>3} workers: {elapsed:7.2f} s | {len(docs) / elapsed:7.1f} docs/s | x{base / elapsed:.2f}"
+        )
+
+
+def bench_rescore(rows: int = 1000000):
+    # rescore_all_results on a throwaway database filled with random hit vectors
+    import sqlite3
+    import tempfile
+
+    import Database as db
+
+    print(f"rescore_all_results on {rows:,} stored results")
+    rng = random.Random(6008)
+    categories = list(ts.pattern_registry.current().patterns)
+    with tempfile.TemporaryDirectory() as tmp:
+        old_path = db.DB_PATH
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        try:
+            with sqlite3.connect(db.DB_PATH) as connect:
+                db.init_db(connect)
+                connect.executemany(
+                    "INSERT INTO tc_analysis_results (url, url_hash, risk_hits) VALUES (?, ?, ?)",
+                    (
+                        (
+                            f"https://site{i}.example/terms",
+                            f"{i:064x}",
+                            json.dumps({c: rng.randint(1, 4) for c in rng.sample(categories, rng.randint(0, 6))}),
+                        )
+                        for i in range(rows)
+                    ),
+                )
+
+            elapsed, result = _timeit(db.rescore_all_results, repeat=1)
+            assert result["success"] and result["rescored"] == rows
+
+            with sqlite3.connect(db.DB_PATH) as connect:
+                # Spot check against the per-document scorer
+                for hits_json, rating in connect.execute(
+                    "SELECT risk_hits, safety_rating FROM tc_analysis_results ORDER BY RANDOM() LIMIT 1000"
+                ):
+                    expected = ts.risk_analysis(list(json.loads(hits_json)))["safety_score"].split("/")[0]
+                    assert rating == expected
+        finally:
+            db.DB_PATH = old_path
+
+    print(f"  {elapsed:.2f} s ({rows / elapsed:,.0f} rows/s)")
+
+
+def _text_dumps():
+    """
+    Text dumps of real pages from the directory in $RBD_TEXT_DUMPS (one page per .txt file),
+    or a synthetic homepage + policy page when it isn't set
+    """
+    dump_dir = os.environ.get("RBD_TEXT_DUMPS")
+    if dump_dir:
+        pages = {}
+        for name in sorted(os.listdir(dump_dir)):
+            if name.endswith(".txt"):
+                with open(os.path.join(dump_dir, name), "r", encoding="utf-8", errors="replace") as f:
+                    pages[name] = f.read()
+        return pages
+
+    nav = "Home\nAbout us\nProducts\nPricing\nBlog\nCareers\nContact\nSign in\nDownload the app\n"
+    return {
+        "synthetic homepage": nav * 400,
+        "synthetic policy page": synthetic_tc_corpus(200 * 1024).replace(". ", ".\n"),
+    }
+
+
+def bench_fragments():
+    import ClauseFetch as cf
+
+    print("tac_in_page line scan: any(fragment in line) vs keyword automaton (all hits)")
+    for name, text in _text_dumps().items():
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+
+        def old_scan():
+            hits = []
+            for line in lines:
+                low = line.lower()
+                hits.append(any(f in low for f in cf.terms_fragments))
+            return hits
+
+        def new_scan():
+            return [cf.match_fragments(line) for line in lines]
+
+        old_time, old_hits = _timeit(old_scan)
+        new_time, new_hits = _timeit(new_scan)
+        assert old_hits == [bool(h) for h in new_hits]
+        print(
+            f"  {name:<24} {len(lines):>6} lines: any() {old_time * 1000:8.2f} ms | "
+            f"automaton {new_time * 1000:8.2f} ms (x{old_time / new_time:.1f})"
+        )
+
+def _html_dumps():
+    """
+    Saved pages from the directory in $RBD_HTML_DUMPS (one page per .html file, raw bytes as downloaded),
+    or a synthetic homepage + policy page when it isn't set
+    """
+    dump_dir = os.environ.get("RBD_HTML_DUMPS")
+    if dump_dir:
+        pages = {}
+        for name in sorted(os.listdir(dump_dir)):
+            if name.endswith((".html", ".htm")):
+                with open(os.path.join(dump_dir, name), "rb") as f:
+                    pages[name] = f.read()
+        return pages
+
+    script = "<script>window.__STATE__ = " + json.dumps({"items": list(range(2000))}) + ";</script>"
+    style = "<style>" + ".c{color:red}" * 2000 + "</style>"
+    nav = "".join(f'<li><a href="/section/{i}">Section {i}</a></li>' for i in range(200))
+    footer = '<footer><a href="/terms">Terms of Service</a> <a href="/privacy">Privacy Policy</a></footer>'
+    cards = "".join(f"<div class='card'><h3>Product {i}</h3><p>Great product number {i} for you</p></div>" for i in range(800))
+    policy = "".join(
+        f"<h2>Section {i}</h2><p>{sent}.</p>"
+        for i, sent in enumerate(synthetic_tc_corpus(300 * 1024).split(". "))
+    )
+    return {
+        "synthetic homepage": f"<html><head>{style}{script}</head><body><ul>{nav}</ul>{cards}{footer}</body></html>".encode(),
+        "synthetic policy page": f"<html><head><title>Terms</title>{script}</head><body>{policy}{footer}</body></html>".encode(),
+    }
+
+
+def bench_extract():
+    from bs4 import BeautifulSoup
+
+    import ClauseFetch as cf
+    import PageText
+
+    print("page extraction: BeautifulSoup tree + walks vs single-pass PageText (text, legal links, tac_in_page)")
+    base = "https://example.com/"
+    for name, raw in _html_dumps().items():
+
+        def soup_path():
+            soup = BeautifulSoup(raw.decode("utf-8", errors="replace"), "lxml")
+            text, index = cf.clean_text_with_index(soup)
+            links = cf.find_legal_links(soup, base)
+            return text, sorted(links), cf.tac_in_page(text, soup, index)["content"]
+
+        def pagetext_path():
+            doc = PageText.parse_page([raw], "utf-8")
+            links = cf.find_legal_links(doc, base)
+            return doc.text, sorted(links), cf.tac_in_page(doc.text, None, doc.index)["content"]
+
+        old_time, old_out = _timeit(soup_path, repeat=3)
+        new_time, new_out = _timeit(pagetext_path, repeat=3)
+        assert old_out == new_out, f"PageText disagrees with the soup path on {name}"
+        print(
+            f"  {name:<24} {len(raw) / 1024:8.0f} KB: soup {old_time * 1000:8.2f} ms | "
+            f"PageText {new_time * 1000:8.2f} ms (x{old_time / new_time:.1f})"
+        )
+
+
+def _template_variant(rng, template, vocab_size, edit_rate):
+    # Shingle set of a near-copy of template: edit_rate of its shingles swapped for random ones
+    import numpy as np
+
+    shingles = template.copy()
+    edits = rng.random(len(shingles)) < edit_rate
+    shingles[edits] = rng.integers(0, vocab_size, edits.sum(), dtype=np.uint64)
+    return shingles
+
+
+def bench_neardup(docs: int = 100000, templates: int = 2000, queries: int = 1000):
+    # NearDup on a synthetic corpus: `templates` families of ~400-shingle documents, every stored document
+    # a lightly edited copy of one of them (company names, dates), then fresh copies as queries
+    import numpy as np
+
+    import NearDup as nd
+
+    print(f"NearDup MinHash/LSH index: {docs:,} documents from {templates:,} templates")
+    rng = np.random.default_rng(6008)
+    vocab_size = 2**32
+    bases = [rng.integers(0, vocab_size, 400, dtype=np.uint64) for _ in range(templates)]
+    family = rng.integers(0, templates, docs)
+
+    start = time.perf_counter()
+    signatures = np.stack([nd.minhash(_template_variant(rng, bases[f], vocab_size, 0.03)) for f in family])
+    sign_time = time.perf_counter() - start
+    text = synthetic_tc_corpus(60 * 1024)
+    text_time, _ = _timeit(nd.signature, text)
+
+    keys = [f"{i:064x}" for i in range(docs)]
+    index = nd.NearDupIndex()
+    build_time, _ = _timeit(index.add_many, keys, signatures, repeat=1)
+
+    probes = rng.integers(0, templates, queries)
+    query_sigs = [nd.minhash(_template_variant(rng, bases[f], vocab_size, 0.03)) for f in probes]
+    start = time.perf_counter()
+    answers = [index.query(sig, nd.SIMILARITY_THRESHOLD, limit=1) for sig in query_sigs]
+    query_time = (time.perf_counter() - start) / queries
+    hits = sum(1 for f, answer in zip(probes, answers) if answer and family[int(answer[0][0], 16)] == f)
+
+    start = time.perf_counter()
+    for sig in query_sigs[:100]:
+        similarity = (signatures == sig).mean(axis=1)
+        similarity.argmax()
+    scan_time = (time.perf_counter() - start) / 100
+
+    start = time.perf_counter()
+    for i, sig in enumerate(query_sigs):
+        index.add(f"extra{i}", sig)
+    add_time = (time.perf_counter() - start) / queries
+
+    print(f"  signatures: {docs / sign_time:,.0f} shingle sets/s | 60 KB T&C text {text_time * 1000:.2f} ms")
+    print(f"  index build: {build_time:.2f} s ({docs / build_time:,.0f} docs/s)")
+    print(
+        f"  query: {query_time * 1000:.3f} ms (brute-force scan {scan_time * 1000:.2f} ms, "
+        f"x{scan_time / query_time:.0f}) | found the right template for {hits}/{queries}"
+    )
+    print(f"  incremental add: {add_time * 1e6:.1f} us")
+
+
+BENCHMARKS = {
+    "sifter": bench_sifter,
+    "runon": bench_runon,
+    "stream": bench_stream,
+    "batch": bench_batch,
+    "rescore": bench_rescore,
+    "fragments": bench_fragments,
+    "extract": bench_extract,
+    "neardup": bench_neardup,
+}
+
+
+if __name__ == "__main__":
+    chosen = sys.argv[1:] or list(BENCHMARKS)
+    for name in chosen:
+        BENCHMARKS[name]()
+        print()
@@ -1,7 +1,16 @@
-from Linkgate import linkgate
-from ClauseFetch import Clausefetch
-from textsifter import textsifter
-from Database import sql_cache_check, store_analysis_result
+import sys
+
+from Linkgate import linkgate, validate_url
+from ClauseFetch import Clausefetch, revalidate_page
+import NearDup
+from BrowserPool import close_browser_pool
+from Database import (
+    sql_cache_check,
+    store_analysis_result,
+    get_page_validators,
+    store_page_validators,
+    stored_result_urls,
+)
 
 
 def show_disclaimer():
@@ -29,52 +38,102 @@ def show_disclaimer():
             print("Please type 'accept' or 'reject'")
 
 
-def check_terms_and_conditions(url):
+def _cached_result(url, cache_result):
+    return {
+        "url": url,
+        "from_cache": True,
+        "safety_rating": cache_result["safety_rating"],
+        "recommendation": cache_result["recommendation"],
+        "suspicious_clauses": cache_result["suspicious_clauses"],
+    }
+
+
+def revalidate_cached(url, cache_result):
+    """
+    Recrawl of an analysed site: conditional GET of the page its T&C text came from.
+    Unchanged (304 or same body) -> the stored analysis stands, only the timestamp is refreshed.
+    Returns None when the site needs a full analysis again.
+    """
+    source_url = cache_result.get("source_url")
+    validators = get_page_validators(source_url) if source_url else None
+    if not validators or not validate_url(source_url)["valid"]:
+        return None
+
+    check = revalidate_page(source_url, validators)
+    if check["changed"] is False:
+        store_page_validators(source_url, check["validators"])
+        print("Terms & Conditions unchanged since the last analysis")
+        return _cached_result(url, cache_result)
+    if check["changed"] and check["content"] and len(check["content"]) >= 100:
+        print(f"Terms & Conditions changed: {source_url}")
+        return analyze_and_store(cache_result["url"], check["content"], source_url, check["validators"])
+    return None
+
+
+def check_terms_and_conditions(url, refresh=False):
     print(f"Analyzing website: {url}")
     print("Checking database for previous analysis...")
     cache_result = sql_cache_check(url)
     if cache_result["link_in_db"]:
-        print("Found previous analysis in database!")
-        return {
-            "url": url,
-            "from_cache": True,
-            "safety_rating": cache_result["safety_rating"],
-            "recommendation": cache_result["recommendation"],
-            "suspicious_clauses": cache_result["suspicious_clauses"],
-        }
+        if not refresh:
+            print("Found previous analysis in database!")
+            return _cached_result(url, cache_result)
+        revalidated = revalidate_cached(url, cache_result)
+        if revalidated:
+            return revalidated
     print("Validating URL...")
-    url_check = linkgate(url)
+    url_check = linkgate(url, fetch=True)
     if not url_check["valid"]:
         return {"url": url, "error": f"Invalid URL: {url_check['message']}"}
     verified_url = url_check["url"]
-    print(f"URL is valid: {verified_url}")
-    print("Looking for Terms & Conditions on website...")
-    tc_result = Clausefetch(verified_url)  # type: ignore
+    response = url_check.get("response")
+    try:
+        print(f"URL is valid: {verified_url}")
+        print("Looking for Terms & Conditions on website...")
+        # linkgate already downloaded the homepage, Clausefetch starts from that response
+        tc_result = Clausefetch(verified_url, prefetched=response)  # type: ignore
+    finally:
+        # Clausefetch normally reads or releases it, this covers its early returns and exceptions
+        if response is not None:
+            response.close()
     if not tc_result["success"]:
         return {
             "url": verified_url,
             "error": f"Could not find Terms & Conditions: {tc_result.get('error', 'Unknown error')}",
         }
     tc_text = ""
+    source_url = verified_url
+    validators = None
     if tc_result["found_in_page"]:
         tc_text = tc_result["content"]
+        validators = tc_result.get("validators")
         print("Found Terms & Conditions on main page")
     elif tc_result["found_in_links"]:
         content = tc_result["content"]
         if isinstance(content, list) and content:
-            tc_text = content["content"]  # type: ignore
-            print(f"Found Terms & Conditions in linked page: {content['url']}")  # type: ignore
+            tc_text = content[0]["content"]
+            source_url = content[0]["url"]
+            validators = content[0].get("validators")
+            print(f"Found Terms & Conditions in linked page: {content[0]['url']}")
         else:
             tc_text = str(content)
             print("Found Terms & Conditions in linked pages")
+    return analyze_and_store(verified_url, tc_text, source_url, validators)
+
+
+def analyze_and_store(url, tc_text, source_url=None, validators=None):
+    """Runs textsifter on the extracted T&C text and saves the result (plus the source page's HTTP validators and the text's NearDup signature)."""
     if not tc_text or len(tc_text) < 100:
         return {
-            "url": verified_url,
+            "url": url,
             "error": "Terms & Conditions text too short or empty",
         }
     print(f"Extracted {len(tc_text)} characters of text")
     print("Analyzing text for risky phrases...")
-    analysis = textsifter(tc_text)
+    # Near-copies of an already analysed text (same template, other company name) only re-sift what differs
+    analysis, hit_spans, signature, near_duplicate = NearDup.sift(tc_text)
+    if near_duplicate:
+        print(f"Reused the analysis of a {near_duplicate[1]:.0%} similar T&C text, only the differences were sifted")
     print("Saving results to database...")
     try:
         analysis_result = {
@@ -82,11 +141,18 @@ def check_terms_and_conditions(url):
             "safety_rating": analysis.get("safety_rating", "0/10"),
             "recommendation": analysis.get("recommendation", "No analysis available"),
             "risk_categories": analysis.get("risks_found", 0),
+            "clause_offsets": analysis.get("clause_spans", []),
+            "risk_hits": analysis.get("risk_hits"),
+            "pattern_version": analysis.get("pattern_version"),
+            "source_url": source_url,
         }
         store_result = store_analysis_result(
-            url=verified_url, tc_text=tc_text, analysis_result=analysis_result
+            url=url, tc_text=tc_text, analysis_result=analysis_result
         )
         if store_result.get("success"):
+            if source_url and validators:
+                store_page_validators(source_url, validators, tc_text)
+            NearDup.remember(tc_text, signature, hit_spans, analysis["pattern_version"])
             print("Results saved successfully!")
         else:
             print(
@@ -95,7 +161,7 @@ def check_terms_and_conditions(url):
     except Exception as e:
         print(f"Warning: Could not save to database: {e}")
     return {
-        "url": verified_url,
+        "url": url,
         "from_cache": False,
         "safety_rating": analysis["safety_rating"],
         "recommendation": analysis["recommendation"],
@@ -154,6 +220,19 @@ def main():
             print(f"\nUnexpected error: {e}\nPlease try again with a different URL.")
 
 
+def refresh_all():
+    """Recrawls every stored site, cheaply for the ones whose policy pages haven't changed."""
+    urls = stored_result_urls()
+    print(f"Refreshing {len(urls)} stored analyses...")
+    for url in urls:
+        try:
+            result = check_terms_and_conditions(url, refresh=True)
+        except Exception as e:
+            result = {"url": url, "error": str(e)}
+        status = result.get("error") or ("unchanged" if result.get("from_cache") else "re-analysed")
+        print(f"{url}: {status}")
+
+
 def test_program():
     """Test the program with a sample URL."""
     test_url = "https://www.google.com"
@@ -165,4 +244,10 @@ def test_program():
 if __name__ == "__main__":
     # Uncomment below to run a test instead of interactive mode
     # test_program()
-    main()
+    try:
+        if "--refresh" in sys.argv[1:]:
+            refresh_all()
+        else:
+            main()
+    finally:
+        close_browser_pool()
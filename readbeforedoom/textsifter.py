@@ -1,6 +1,13 @@
 import re
 import json
 import os
+import bisect
+import codecs
+import collections
+import hashlib
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 
 # Cleans and unclutters text for easier processing it using textsifter
@@ -18,54 +25,475 @@ def text_preprocessor(txt: str):
     return {"cleaned_stuff": cleaned_sent}
 
 
+_SENTENCE_END = re.compile(r'[.!?]+')
 
-def load_risk_patterns(): # Gets the risk patterns from risk_patterns.json
 
-    pattern_file = os.path.join(os.path.dirname(__file__), 'risk_patterns.json')
-    
+def _trimmed(txt: str, start: int, end: int):
+    # Same as .strip() on txt[start:end], but moves the offsets instead of copying the text
+    while start < end and txt[start].isspace():
+        start += 1
+    while end > start and txt[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def sentence_spans(txt: str):
+    """
+    (start, end) offsets of the sentences text_preprocessor would return, without copying any of them.
+    txt[start:end] is the sentence.
+    """
+    prev = 0
+    for m in _SENTENCE_END.finditer(txt):
+        start, end = _trimmed(txt, prev, m.start())
+        if end - start > 10:
+            yield start, end
+        prev = m.end()
+    start, end = _trimmed(txt, prev, len(txt))
+    if end - start > 10:
+        yield start, end
+
+
+
+DEFAULT_PROXIMITY_WINDOW = 15  # tokens allowed between two terms of a proximity rule
+MAX_GAP_CHARS = 200  # what an unbounded ".*" gets rewritten to when it can't become a proximity rule
+
+# Unbounded wildcards sitting between two parts of a pattern, these are what make the engine backtrack
+_UNBOUNDED_GAP = re.compile(r"(?<!\\)\.[*+]\??")
+# A quantified group that itself contains a quantifier, like (a+)+ , which is exponential in the worst case
+_NESTED_QUANTIFIER = re.compile(r"\((?:[^()\\]|\\.)*(?:[*+]|\{\d*,\d*\})(?:[^()\\]|\\.)*\)(?:[*+]|\{\d*,\d*\})")
+# "(a|b|c).*(d|e).*(f)" where every alternative is plain words, optionally joined by ".?"
+_PROXIMITY_SHAPE = re.compile(r"\(([a-z |]|\.\?)+\)(\.\*\(([a-z |]|\.\?)+\))+")
+
+
+def _terms_from_alternation(group: str):
+    terms = []
+    for alt in group.split("|"):
+        if ".?" in alt:
+            # "third.?party" -> "third party" and "thirdparty"
+            terms.append(alt.replace(".?", " "))
+            terms.append(alt.replace(".?", ""))
+        else:
+            terms.append(alt)
+    return terms
+
+
+def check_risk_rule(category: str, regex: str):
+    """
+    Makes sure a regex rule runs in linear time on long sentences.
+    Returns the rule to use (the regex itself, a proximity rule or a bounded regex) or None if it has to be rejected.
+    """
+    if _NESTED_QUANTIFIER.search(regex):
+        print(f"Warning: risk pattern '{category}' has nested quantifiers and can backtrack exponentially, skipping it")
+        return None
+
+    if not _UNBOUNDED_GAP.search(regex):
+        return regex
+
+    if _PROXIMITY_SHAPE.fullmatch(regex):
+        groups = re.findall(r"\(([^()]*)\)", regex)
+        return {
+            "terms": [_terms_from_alternation(g) for g in groups],
+            "within": DEFAULT_PROXIMITY_WINDOW,
+        }
+
+    # Anything fancier keeps being a regex, but the gap gets a hard limit
+    return _UNBOUNDED_GAP.sub(f".{{0,{MAX_GAP_CHARS}}}", regex)
+
+
+def load_risk_rule(category: str, info: dict):
+    # A rule is either a regex string or a proximity dict: {"terms": [[...], [...]], "within": N}
+    if info.get("type") == "proximity":
+        return {
+            "terms": [[t.lower() for t in group] for group in info["terms"]],
+            "within": int(info.get("within", DEFAULT_PROXIMITY_WINDOW)),
+        }
+    return check_risk_rule(category, info["regex"])
+
+
+PATTERN_FILE = os.path.join(os.path.dirname(__file__), 'risk_patterns.json')
+
+# Used when risk_patterns.json is missing
+DEFAULT_RISK_PATTERNS = {
+    'data_collection': {
+        'terms': [['collect', 'store', 'process', 'gather', 'track'], ['personal', 'data', 'information']],
+        'within': DEFAULT_PROXIMITY_WINDOW,
+    },
+    'third_party_sharing': {
+        'terms': [['share', 'disclose', 'transfer', 'provide'], ['third party', 'thirdparty', 'partner', 'affiliate']],
+        'within': DEFAULT_PROXIMITY_WINDOW,
+    },
+}
+
+
+def _rules_from_data(data: dict):
+    rules = {}
+    for category, info in data['patterns'].items():
+        rule = load_risk_rule(category, info)
+        if rule is not None:
+            rules[category] = rule
+    return rules
+
+
+def load_risk_patterns(): # Gets the risk patterns from risk_patterns.json
     try:
-        with open(pattern_file, 'r') as f:
+        with open(PATTERN_FILE, 'r') as f:
             data = json.load(f)
-            # Extracting just the regex patterns for backward compatibility
-            return {
-                category: info['regex'] 
-                for category, info in data['patterns'].items()
-            }
+        return _rules_from_data(data)
 
     except FileNotFoundError:
         print("Warning: risk_patterns.json not found. Using default patterns (less accurate obv)")
+        return dict(DEFAULT_RISK_PATTERNS)
 
-        return {
-            'data_collection': r'(collect|store|process|gather|track).*(personal|data|information)',
-            'third_party_sharing': r'(share|disclose|transfer|provide).*(third.?party|partner|affiliate)',
-        }
 
-risk_patterns = load_risk_patterns()
+_TOKEN = re.compile(r"\w+")
+
+
+class TokenIndex:
+    """
+    Positions of every token of one (lowercased) sentence, built once and shared by all the proximity rules.
+    Terms match on token prefixes, so "collect" also finds "collected" and "collection".
+    """
+
+    def __init__(self, low: str, start: int = 0, end=None):
+        self.tokens = _TOKEN.findall(low, start, len(low) if end is None else end)
+        self.positions = {}
+        for i, token in enumerate(self.tokens):
+            self.positions.setdefault(token, []).append(i)
+        self.vocab = sorted(self.positions)
+
+    def _prefixed(self, word: str):
+        lo = bisect.bisect_left(self.vocab, word)
+        hi = bisect.bisect_left(self.vocab, word + "\uffff")
+        return self.vocab[lo:hi]
+
+    def term_spans(self, term: str):
+        # (first, last) token positions of every place the term occurs
+        words = term.split()
+        if not words:
+            return []
+        spans = []
+        for token in self._prefixed(words[0]):
+            for start in self.positions[token]:
+                end = start + len(words) - 1
+                if end < len(self.tokens) and all(
+                    self.tokens[start + k].startswith(w) for k, w in enumerate(words[1:], 1)
+                ):
+                    spans.append((start, end))
+        return spans
+
+    def near(self, rule: dict) -> bool:
+        # Every term group has to follow the previous one with at most `within` tokens in between
+        within = rule["within"]
+        ends = None
+        for group in rule["terms"]:
+            spans = [span for term in group for span in self.term_spans(term)]
+            if ends is not None:
+                spans = [
+                    (start, end) for start, end in spans
+                    if bisect.bisect_right(ends, start - 1) > bisect.bisect_left(ends, start - within - 1)
+                ]
+            if not spans:
+                return False
+            ends = sorted(end for _, end in spans)
+        return True
+
+
+# Anything that can make "lowercase the text, then match case-sensitively" behave differently from re.IGNORECASE:
+# uppercase literals, inline flags and escapes that spell out a character code
+_CASE_SENSITIVE_BITS = re.compile(r"[A-Z]|\\[xuUN0-7]|\(\?[aiLmsux-]")
+# The only non-ASCII characters re.IGNORECASE matches against ASCII letters (and \u0130 is also the only
+# character whose lower() is longer than itself). Text without them can be lowercased safely, offsets included
+_CASE_TRAPS = re.compile("[\u0130\u0131\u017f\u212a]")
+# Anchors and lookbehinds see different things in txt[start:end] than in txt searched between start and end
+_CONTEXT_SENSITIVE = re.compile(r"(?<!\\)[$^]|\\[AZ]|\(\?<[=!]")
+
+
+def _lowercase_safe(pattern: str) -> bool:
+    # Escaped backslashes and the uppercase class escapes (\S, \W, ...) are fine, drop them before checking
+    stripped = re.sub(r"\\[\\SWDBAZ]", "", pattern)
+    return pattern.isascii() and not _CASE_SENSITIVE_BITS.search(stripped)
+
+
+def _leading_group(pattern: str):
+    """
+    Returns the first top-level group of a pattern if every match of the pattern has to go through it,
+    e.g. "(collect|store)" for "(collect|store).*(data)". Returns None when that can't be guaranteed.
+    """
+    if not pattern.startswith("("):
+        return None
+
+    depth = 0
+    end = None
+    class_start = None
+    escaped = False
+    for i, ch in enumerate(pattern):
+        if escaped:
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif class_start is not None:
+            # A "]" right after "[" or "[^" is a literal, not the end of the class
+            if ch == "]" and i > class_start + 1 and pattern[class_start + 1 : i] != "^":
+                class_start = None
+        elif ch == "[":
+            class_start = i
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+            if depth == 0 and end is None:
+                end = i + 1
+        elif ch == "|" and depth == 0:
+            return None  # Top level alternation, the first group is optional
+
+    if end is None or pattern[end:end + 1] in ("?", "*") or pattern[end:].startswith(("{0", "{,")):
+        return None
+    group = pattern[:end]
+    if group.startswith("(?") and not group.startswith(("(?:", "(?P<")):
+        return None  # Lookarounds and flag groups
+    return group
+
+
+class RiskMatcher:
+    """
+    Compiles all the risk rules once. The leading group of every rule is merged into a single
+    combined regex that is run once per sentence, most sentences don't hit it and are done after that one scan.
+    The few that do get the per-category rules, in file order, so match() returns the first category that matches.
+    """
+
+    def __init__(self, patterns: dict):
+        self.categories = list(patterns)
+        self.rules = list(patterns.values())
+        self.compiled = [
+            None if isinstance(rule, dict) else re.compile(rule, re.IGNORECASE) for rule in self.rules
+        ]
+
+        # Fast path works on text.lower() without IGNORECASE, which is a lot quicker in the re module.
+        # It is only exact for text without _CASE_TRAPS and patterns without case-sensitive bits,
+        # everything else takes the slow path
+        self.prefilter = None
+        self.lowered = []
+        regexes = [rule for rule in self.rules if not isinstance(rule, dict)]
+        # Rules with anchors or lookbehinds get a copy of the sentence instead of offsets into the document
+        self.needs_slices = any(_CONTEXT_SENSITIVE.search(p) for p in regexes)
+        if self.categories and all(_lowercase_safe(p) for p in regexes):
+            anchors = []
+            for rule in self.rules:
+                if isinstance(rule, dict):
+                    # A proximity rule needs one of its first terms to start a token
+                    first_words = sorted({term.split()[0] for term in rule["terms"][0] if term.split()})
+                    anchors.append(r"\b(?:" + "|".join(re.escape(w) for w in first_words) + ")")
+                else:
+                    anchors.append(_leading_group(rule) or f"(?:{rule})")
+            try:
+                self.prefilter = re.compile("|".join(anchors))
+                self.lowered = [
+                    None if isinstance(rule, dict) else re.compile(rule) for rule in self.rules
+                ]
+            except re.error:
+                # e.g. the same group name used in two patterns
+                self.prefilter = None
+                self.lowered = []
+
+    def lowered_text(self, txt: str):
+        """
+        txt.lower() if the fast path can be used on it, else None. Offsets into txt and into the result are the same.
+        Computed once per document and passed to match().
+        """
+        if self.prefilter is None or _CASE_TRAPS.search(txt):
+            return None
+        return txt.lower()
+
+    def match(self, txt: str, start: int = 0, end=None, low=None):
+        """
+        First risk category matching the sentence txt[start:end], or None.
+        low is lowered_text(txt) if the caller has it, otherwise it's worked out for just this sentence.
+        """
+        if end is None:
+            end = len(txt)
+        if (start, end) != (0, len(txt)) and (low is None or self.needs_slices):
+            # Nothing precomputed for the document (or a rule that needs the bare sentence), work on a copy
+            return self.match(txt[start:end], low=None if low is None else low[start:end])
+        if low is None:
+            low = self.lowered_text(txt)
+
+        fast = low is not None
+        if fast and not self.prefilter.search(low, start, end):
+            return None
+
+        index = None  # Only tokenized if a proximity rule actually needs it
+        for i, rule in enumerate(self.rules):
+            if isinstance(rule, dict):
+                if index is None:
+                    index = TokenIndex(low, start, end) if fast else TokenIndex(txt[start:end].lower())
+                hit = index.near(rule)
+            elif fast:
+                hit = self.lowered[i].search(low, start, end)
+            else:
+                hit = self.compiled[i].search(txt, start, end)
+            if hit:
+                return self.categories[i]
+        return None
+
+
+# Same rules risk_analysis always had: every unique risk category counts 1
+DEFAULT_SCORING = {
+    "default_weight": 1,
+    "weights": {},
+    "base_score": 9,
+    "thresholds": [
+        {"min_risk": 5, "score": 2},
+        {"min_risk": 3, "score": 4},
+        {"min_risk": 2, "score": 6},
+        {"min_risk": 1, "score": 7},
+    ],
+    "recommendations": [
+        {"min_score": 8, "text": "The T&Cs look fine, you can continue..."},
+        {"min_score": 6, "text": "Proceed with caution"},
+        {"min_score": 0, "text": "High risk - consider alternatives"},
+    ],
+}
+
+
+def _policy_from_data(data: dict):
+    policy = dict(DEFAULT_SCORING)
+    policy.update(data.get("scoring", {}))
+
+    # Checked top down like an if/elif chain, so keep them sorted
+    policy["thresholds"] = sorted(policy["thresholds"], key=lambda t: t["min_risk"], reverse=True)
+    policy["recommendations"] = sorted(policy["recommendations"], key=lambda r: r["min_score"], reverse=True)
+    return policy
+
+
+def load_scoring_policy(): # Gets the "scoring" section of risk_patterns.json, anything missing comes from DEFAULT_SCORING
+    try:
+        with open(PATTERN_FILE, 'r') as f:
+            return _policy_from_data(json.load(f))
+    except FileNotFoundError:
+        return _policy_from_data({})
+
+
+PATTERN_CACHE_DIR = os.path.expanduser("~/.readbeforedoom_cache")
+RELOAD_CHECK_SECONDS = 5  # how often current() looks at the file's mtime
+# Bump whenever _rules_from_data/_policy_from_data or the rule rewriting change what a pattern file compiles to,
+# it's part of both the disk cache key and the pattern version so old caches and stored results go stale
+LOADER_VERSION = 1
+
+# One consistent set of rules, swapped as a whole on reload so readers never see half of an update
+LoadedPatterns = collections.namedtuple("LoadedPatterns", ["version", "patterns", "policy", "matcher"])
+
+
+class PatternRegistry:
+    """
+    Keeps the compiled risk rules and scoring policy, tagged with a version: a hash of the "patterns" section
+    of risk_patterns.json and LOADER_VERSION (a scoring-only change keeps the version, stored results just need
+    a rescore). The checked and rewritten rules are cached on disk per file hash, and current() reloads the file
+    when its mtime changes, so long-running processes pick up new rules without a restart.
+    """
+
+    def __init__(self, path: str = PATTERN_FILE, cache_dir: str = PATTERN_CACHE_DIR):
+        self.path = path
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.checked_at = time.monotonic()
+        self.mtime, self.loaded = self._load()
+
+    def _cache_path(self, file_hash: str):
+        return os.path.join(self.cache_dir, f"patterns-{file_hash[:16]}.json")
+
+    def _read_cache(self, file_hash: str):
+        try:
+            with open(self._cache_path(file_hash), "r") as f:
+                cached = json.load(f)
+            if cached.get("file_hash") == file_hash:
+                return cached
+        except (OSError, ValueError):
+            pass  # No cache yet or a broken one, fall through to parsing the file
+        return None
+
+    def _write_cache(self, file_hash: str, version: str, patterns: dict, policy: dict):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self._cache_path(file_hash), "w") as f:
+                json.dump({"file_hash": file_hash, "version": version, "patterns": patterns, "policy": policy}, f)
+        except OSError:
+            pass  # Cache save failure shouldn't break functionality
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            print("Warning: risk_patterns.json not found. Using default patterns (less accurate obv)")
+            patterns = dict(DEFAULT_RISK_PATTERNS)
+            return None, LoadedPatterns("builtin", patterns, _policy_from_data({}), RiskMatcher(patterns))
+
+        file_hash = hashlib.sha256(b"loader-%d\n" % LOADER_VERSION + raw).hexdigest()
+        cached = self._read_cache(file_hash)
+        if cached:
+            version, patterns, policy = cached["version"], cached["patterns"], cached["policy"]
+        else:
+            data = json.loads(raw)
+            rules = json.dumps({"loader": LOADER_VERSION, "patterns": data["patterns"]}, sort_keys=True)
+            version = hashlib.sha256(rules.encode()).hexdigest()[:16]
+            patterns = _rules_from_data(data)
+            policy = _policy_from_data(data)
+            self._write_cache(file_hash, version, patterns, policy)
+
+        return mtime, LoadedPatterns(version, patterns, policy, RiskMatcher(patterns))
+
+    def _file_mtime(self):
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def reload(self):
+        with self.lock:
+            self.checked_at = time.monotonic()
+            try:
+                self.mtime, self.loaded = self._load()
+            except (ValueError, KeyError, re.error, OSError) as e:
+                # Broken or half-saved file: keep serving the last good rules. Its mtime is remembered so it isn't
+                # parsed again on every check, the next save changes the mtime and gets it loaded
+                print(f"Warning: couldn't reload {self.path} ({e}), keeping pattern version {self.loaded.version}")
+                self.mtime = self._file_mtime()
+        return self.loaded
+
+    def current(self) -> LoadedPatterns:
+        now = time.monotonic()
+        if now - self.checked_at >= RELOAD_CHECK_SECONDS:
+            self.checked_at = now
+            if self._file_mtime() != self.mtime:
+                return self.reload()
+        return self.loaded
+
+
+pattern_registry = PatternRegistry()
 
 
 # Risk checker:
-def risk_analysis(risks_found_list: list):
+def risk_analysis(risks_found_list: list, policy=None):
+    policy = policy or pattern_registry.current().policy
     risk_count = len(risks_found_list)
 
-    # Calculate safety score based on number of risks
-    if risk_count >= 5:
-        safety_score = 2
-    elif risk_count >= 3:
-        safety_score = 4
-    elif risk_count >= 2:
-        safety_score = 6
-    elif risk_count >= 1:
-        safety_score = 7
-    else:
-        safety_score = 9
+    # Calculate safety score based on the (weighted) number of risks
+    weights = policy["weights"]
+    risk_level = sum(weights.get(risk, policy["default_weight"]) for risk in risks_found_list)
+
+    safety_score = policy["base_score"]
+    for threshold in policy["thresholds"]:
+        if risk_level >= threshold["min_risk"]:
+            safety_score = threshold["score"]
+            break
 
     # Generate recommendation based on safety score
-    if safety_score >= 8:
-        recommendation = "The T&Cs look fine, you can continue..."
-    elif safety_score >= 6:
-        recommendation = "Proceed with caution"
-    else:
-        recommendation = "High risk - consider alternatives"
+    recommendation = policy["recommendations"][-1]["text"]
+    for rec in policy["recommendations"]:
+        if safety_score >= rec["min_score"]:
+            recommendation = rec["text"]
+            break
 
     return {
         "safety_score": f"{safety_score}/10",
@@ -73,52 +501,302 @@ def risk_analysis(risks_found_list: list):
         "risk_count": risk_count
     }
 
-def textsifter(txt: str):
-    if not txt or len(txt.strip()) < 50:
-        return {
-            'suspicious_clauses': [],
-            'safety_rating': "0/10",
-            'recommendation': "No content to analyze",
-            'risks_found': 0
-        }
 
-    # Preprocess the text
-    processed_data = text_preprocessor(txt)
-    cleantxt = processed_data["cleaned_stuff"]  # This is a List of sentences
-
-    # The for Loop that checks for the risks starts from here:
-    risks_found = []
-    sus_clauses = []
-
-    for sent in cleantxt:
-        for risk_category, pattern in risk_patterns.items():
-            match = re.search(pattern, sent, re.IGNORECASE)
-            if match:
-                risks_found.append(risk_category)
-                sus_clauses.append(sent)
-                break  # Only count one risk per sentence
-
-    # Remove duplicates while preserving order
-    unique_risks = []
-    unique_clauses = []
-    seen_risks = set()
-
-    for i, risk in enumerate(risks_found):
-        if risk not in seen_risks:
-            unique_risks.append(risk)
-            unique_clauses.append(sus_clauses[i])
-            seen_risks.add(risk)
+def score_matrix(hits, categories: list, policy=None):
+    """
+    Vectorised risk_analysis for a whole table of documents at once.
+    hits is a (documents x categories) array of per-category hit counts, columns in the order of `categories`.
+    Returns (safety scores as an int array, recommendation texts as an object array).
+    """
+    import numpy as np  # Only needed for re-scoring, keep it out of the normal import path
+
+    policy = policy or pattern_registry.current().policy
+    hits = np.asarray(hits)
+    if not len(hits):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=object)
+
+    weights = np.array(
+        [policy["weights"].get(c, policy["default_weight"]) for c in categories], dtype=np.float64
+    )
+    risk_level = (hits > 0).astype(np.float64) @ weights
+
+    scores = np.select(
+        [risk_level >= t["min_risk"] for t in policy["thresholds"]],
+        [t["score"] for t in policy["thresholds"]],
+        default=policy["base_score"],
+    ).astype(np.int64)
+
+    recs = policy["recommendations"]
+    rec_index = np.select(
+        [scores >= r["min_score"] for r in recs], list(range(len(recs))), default=len(recs) - 1
+    )
+    texts = np.array([r["text"] for r in recs], dtype=object)
+    return scores, texts[rec_index]
+
 
+def _sift_result(loaded: LoadedPatterns, risks: list, clauses: list, spans: list, hits: dict):
     # Calculate the safety score
-    ra = risk_analysis(unique_risks)
+    ra = risk_analysis(risks, loaded.policy)
 
     return {
-        'suspicious_clauses': unique_clauses[:5],  # Limit to top 5
+        'suspicious_clauses': clauses,
+        'clause_spans': [list(span) for span in spans],  # [start, end] of each clause in the analysed text
+        'risk_hits': hits,  # category -> number of sentences that matched it, lets results be re-scored later
         'safety_rating': ra["safety_score"],
         'recommendation': ra["recommendation"],
-        'risks_found': ra["risk_count"]
+        'risks_found': ra["risk_count"],
+        'pattern_version': loaded.version  # which rule set produced this, see PatternRegistry
     }
 
+
+def _no_content_result():
+    return {
+        'suspicious_clauses': [],
+        'clause_spans': [],
+        'risk_hits': {},
+        'safety_rating': "0/10",
+        'recommendation': "No content to analyze",
+        'risks_found': 0,
+        'pattern_version': pattern_registry.current().version
+    }
+
+
+def sift_spans(txt: str, spans, top_n: int = 5, known=None, hit_spans=None):
+    """
+    Matches the sentences txt[start:end] for each (start, end) in spans and builds the textsifter result.
+    Sentences are never copied, only the (at most top_n) reported clauses are sliced out of txt.
+    known: {sentence: category or None} verdicts used instead of the matcher for sentences found in it.
+    hit_spans: if given, [start, end, category] of every matching sentence is appended to it.
+    """
+    loaded = pattern_registry.current()
+    risk_matcher = loaded.matcher
+    low = risk_matcher.lowered_text(txt)
+
+    # category -> (start, end) of its first clause, in the order the categories were first seen
+    # (None once top_n are taken)
+    first_spans = {}
+    hits = {}
+
+    for start, end in spans:
+        if known is not None:
+            sentence = txt[start:end]
+            risk_category = known[sentence] if sentence in known else risk_matcher.match(txt, start, end, low)
+        else:
+            risk_category = risk_matcher.match(txt, start, end, low)
+        if not risk_category:  # Only count one risk per sentence
+            continue
+        if hit_spans is not None:
+            hit_spans.append([start, end, risk_category])
+        hits[risk_category] = hits.get(risk_category, 0) + 1
+        if risk_category not in first_spans:
+            first_spans[risk_category] = (start, end) if len(first_spans) < top_n else None
+
+    kept = [span for span in first_spans.values() if span is not None]
+    return _sift_result(loaded, list(first_spans), [txt[start:end] for start, end in kept], kept, hits)
+
+
+def textsifter(txt: str):
+    if not txt or len(txt.strip()) < 50:
+        return _no_content_result()
+
+    return sift_spans(txt, sentence_spans(txt), top_n=5)  # Limit to top 5
+
+
+def sentence_verdicts(txt: str, hit_spans):
+    # {sentence: category or None} for every sentence of an already sifted txt, from its hit_spans
+    known = dict.fromkeys(txt[start:end] for start, end in sentence_spans(txt))
+    for start, end, category in hit_spans:
+        known[txt[start:end]] = category
+    return known
+
+
+def sift_document(txt: str, reference=None, top_n: int = 5):
+    """
+    textsifter(txt) that also returns the [start, end, category] of every matching sentence, which is what
+    NearDup stores to let near-copies of txt be sifted incrementally later.
+    reference = (text, hit_spans) of a near-copy already sifted with the current rules: sentences found in it
+    reuse its verdicts and only the rest are matched. The result is the same as without it.
+    Returns (result, hit_spans).
+    """
+    if not txt or len(txt.strip()) < 50:
+        return _no_content_result(), []
+
+    known = sentence_verdicts(*reference) if reference else None
+    hit_spans = []
+    result = sift_spans(txt, sentence_spans(txt), top_n, known, hit_spans)
+    return result, hit_spans
+
+
+MAX_SENTENCE_CHARS = 50000  # a "sentence" longer than this gets cut, so memory stays bounded on run-on text
+
+
+def _finish_sentence(pieces: list, offset: int):
+    # (start, end, sentence) for the buffered pieces, offsets into the whole stream, or None if it's too short
+    raw = "".join(pieces)
+    start, end = _trimmed(raw, 0, len(raw))
+    if end - start > 10:
+        return offset + start, offset + end, raw[start:end]
+    return None
+
+
+def _stream_sentences(chunks, max_sentence_chars: int):
+    tail = []  # pieces of the sentence that hasn't ended yet
+    tail_len = 0
+    tail_start = 0  # where that sentence starts in the whole stream
+    offset = 0  # where the current chunk starts in the whole stream
+
+    for chunk in chunks:
+        prev = 0
+        for m in _SENTENCE_END.finditer(chunk):
+            tail.append(chunk[prev:m.start()])
+            found = _finish_sentence(tail, tail_start)
+            if found:
+                yield found
+            tail = []
+            tail_len = 0
+            tail_start = offset + m.end()
+            prev = m.end()
+
+        rest = chunk[prev:] if prev else chunk
+        tail.append(rest)
+        tail_len += len(rest)
+        offset += len(chunk)
+
+        if tail_len > max_sentence_chars:
+            found = _finish_sentence(tail, tail_start)
+            if found:
+                yield found
+            tail = []
+            tail_len = 0
+            tail_start = offset
+
+    found = _finish_sentence(tail, tail_start)
+    if found:
+        yield found
+
+
+def iter_sentences(chunks, max_sentence_chars: int = MAX_SENTENCE_CHARS):
+    """
+    Same sentences text_preprocessor would give, but read from an iterator of text chunks (HTML text nodes,
+    HTTP body chunks, ...). Sentences can span chunk boundaries, only the unfinished one is buffered.
+    """
+    for _, _, sent in _stream_sentences(chunks, max_sentence_chars):
+        yield sent
+
+
+class _ContentCounter:
+    # Passes chunks through and keeps track of what len(whole_text.strip()) would be
+    def __init__(self, chunks, encoding: str):
+        self.chunks = chunks
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self.total = 0
+        self.leading = 0  # whitespace before the first real character
+        self.trailing = 0  # whitespace after the last real character
+        self.seen_text = False
+
+    def _count(self, chunk: str):
+        self.total += len(chunk)
+        stripped = chunk.rstrip()
+        if not stripped:
+            if self.seen_text:
+                self.trailing += len(chunk)
+            else:
+                self.leading += len(chunk)
+            return
+        if not self.seen_text:
+            self.leading += len(chunk) - len(chunk.lstrip())
+            self.seen_text = True
+        self.trailing = len(chunk) - len(stripped)
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            if isinstance(chunk, bytes):
+                chunk = self.decoder.decode(chunk)
+            self._count(chunk)
+            yield chunk
+        rest = self.decoder.decode(b"", final=True)
+        if rest:
+            self._count(rest)
+            yield rest
+
+    def stripped_length(self) -> int:
+        return max(0, self.total - self.leading - self.trailing)
+
+
+def textsifter_stream(chunks, top_n: int = 5, encoding: str = "utf-8"):
+    """
+    Streaming textsifter: takes an iterator of str (or bytes, decoded with `encoding`) chunks and
+    matches sentences as they complete. Memory stays flat however big the document is.
+    clause_spans are offsets into the concatenated (decoded) chunks.
+    """
+    counter = _ContentCounter(chunks, encoding)
+    loaded = pattern_registry.current()
+    risk_matcher = loaded.matcher
+
+    first_clauses = {}  # category -> (start, end, clause), same idea as in sift_spans
+    hits = {}
+    for start, end, sent in _stream_sentences(counter, MAX_SENTENCE_CHARS):
+        risk_category = risk_matcher.match(sent)
+        if not risk_category:
+            continue
+        hits[risk_category] = hits.get(risk_category, 0) + 1
+        if risk_category not in first_clauses:
+            first_clauses[risk_category] = (start, end, sent) if len(first_clauses) < top_n else None
+
+    if counter.stripped_length() < 50:
+        return _no_content_result()
+
+    kept = [clause for clause in first_clauses.values() if clause is not None]
+    return _sift_result(
+        loaded,
+        list(first_clauses), [sent for _, _, sent in kept], [(start, end) for start, end, _ in kept], hits
+    )
+
+
+def _init_batch_worker():
+    # Runs once per worker process. Importing this module already compiled the patterns (forked workers
+    # inherit them), this just makes sure the matcher is warm before the first chunk arrives
+    pattern_registry.current().matcher.match("warm up the matcher, collect personal data")
+
+
+def _sift_chunk(docs: list):
+    # One task = a whole chunk of documents, so pickling/IPC is paid per chunk rather than per document
+    return [textsifter(doc) for doc in docs]
+
+
+def _chunked(docs, chunksize: int):
+    chunk = []
+    for doc in docs:
+        chunk.append(doc)
+        if len(chunk) >= chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def textsifter_batch(docs, workers=None, chunksize: int = 16):
+    """
+    Runs textsifter over many documents on a process pool and returns the results in input order.
+    docs can be any iterable (e.g. rows streamed out of the database), only a few chunks per worker
+    are in flight at once. workers=None uses every core, workers=1 runs in this process.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        return [textsifter(doc) for doc in docs]
+
+    results = []
+    in_flight = collections.deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker) as pool:
+        for chunk in _chunked(docs, chunksize):
+            in_flight.append(pool.submit(_sift_chunk, chunk))
+            # Keep the workers busy without pulling the whole input into memory
+            if len(in_flight) >= workers * 2:
+                results.extend(in_flight.popleft().result())
+        while in_flight:
+            results.extend(in_flight.popleft().result())
+    return results
+
 if __name__ == "__main__":
     print("Enter Text below:")
     text = input()
@@ -0,0 +1,69 @@
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# The modules import each other flat, the way main.py runs them from inside readbeforedoom/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "readbeforedoom"))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # path -> (status, headers, body) from server.routes, anything else is a 404. Requests to paths in
+    # server.delays are answered that many seconds late, server.peak / peak_per_host track how many were open at once
+    def _route(self):
+        server = self.server
+        host = self.headers.get("Host", "")
+        with server.lock:
+            server.hits.append((self.command, self.path))
+            server.active[host] = server.active.get(host, 0) + 1
+            server.peak = max(server.peak, sum(server.active.values()))
+            server.peak_per_host[host] = max(server.peak_per_host.get(host, 0), server.active[host])
+        try:
+            time.sleep(server.delays.get(self.path, server.delay))
+        finally:
+            with server.lock:
+                server.active[host] -= 1
+        return server.routes.get(self.path, (404, {}, b"not found"))
+
+    def _respond(self, body_too: bool):
+        status, headers, body = self._route()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body_too:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond(True)
+
+    def do_HEAD(self):
+        self._respond(False)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    """Local HTTP server on a free port: set server.routes[path] = (status, headers, body), server.hits logs requests"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.routes = {}
+    server.hits = []
+    server.delay = 0.0
+    server.delays = {}
+    server.lock = threading.Lock()
+    server.active = {}
+    server.peak = 0
+    server.peak_per_host = {}
+    server.daemon_threads = True
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,123 @@
+import asyncio
+import contextlib
+
+import httpx
+
+from AsyncLinkgate import linkgate_many
+from DnsCache import DnsCache, StubResolver
+
+PUBLIC_IP = "93.184.216.34"  # Linkgate refuses private addresses, the transport below sends everything home anyway
+
+
+class _LocalTransport(httpx.AsyncBaseTransport):
+    # Every request goes to the local test server, with its original Host header
+    def __init__(self, server):
+        self.port = server.server_address[1]
+        self.inner = httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request):
+        request.url = request.url.copy_with(scheme="http", host="127.0.0.1", port=self.port)
+        return await self.inner.handle_async_request(request)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+def _dns(hosts, delay=0.0):
+    return DnsCache(StubResolver({host: {"A": [PUBLIC_IP]} for host in hosts}, delay=delay))
+
+
+async def _collect(urls, server, dns_cache, **kwargs):
+    async with httpx.AsyncClient(transport=_LocalTransport(server)) as client:
+        return [r async for r in linkgate_many(urls, dns_cache=dns_cache, client=client, cache=False, **kwargs)]
+
+
+def test_results_match_linkgate_verdicts(http_server):
+    http_server.routes["/ok"] = (200, {}, b"")
+    http_server.routes["/moved"] = (301, {"Location": "https://www.example.com/new"}, b"")
+    http_server.routes["/down"] = (503, {}, b"")
+    urls = [
+        "https://example.com/ok",
+        "https://example.com/moved",
+        "https://example.com/down",
+        "https://example.com/missing",
+        "https://nxdomain.example.org/",
+        "ftp://example.com/",
+        "https://bad..host.com/",
+    ]
+    results = dict(asyncio.run(_collect(urls, http_server, _dns(["example.com"]))))
+
+    assert set(results) == set(urls)
+    assert results["https://example.com/ok"]["valid"]
+    assert results["https://example.com/moved"] == {
+        "valid": True, "url": "https://www.example.com/new", "message": "URL is valid and reachable",
+    }
+    assert not results["https://example.com/down"]["valid"]
+    assert not results["https://example.com/missing"]["valid"]
+    assert not results["https://nxdomain.example.org/"]["valid"]
+    assert "scheme" in results["ftp://example.com/"]["message"]
+    assert not results["https://bad..host.com/"]["valid"]
+    # Only the URLs that passed the offline checks and DNS reached the server
+    assert sorted(path for _, path in http_server.hits) == ["/down", "/missing", "/moved", "/ok"]
+
+
+def test_global_and_per_host_limits(http_server):
+    http_server.delay = 0.05
+    hosts = [f"site{i}.example.com" for i in range(6)]
+    urls = [f"https://{host}/page{j}" for host in hosts for j in range(6)]
+    results = asyncio.run(_collect(urls, http_server, _dns(hosts), concurrency=8, per_host=2))
+
+    assert len(results) == len(urls)
+    assert http_server.peak <= 8
+    assert max(http_server.peak_per_host.values()) <= 2
+    assert http_server.peak > 2  # Different hosts really ran side by side
+
+
+def test_results_stream_in_completion_order(http_server):
+    http_server.delays["/slow"] = 0.5
+    urls = ["https://slow.example.com/slow"] + [f"https://fast{i}.example.com/" for i in range(5)]
+    dns = _dns(["slow.example.com"] + [f"fast{i}.example.com" for i in range(5)])
+    results = asyncio.run(_collect(urls, http_server, dns))
+    assert [url for url, _ in results][-1] == "https://slow.example.com/slow"
+
+
+def test_input_is_consumed_lazily(http_server):
+    pulled = []
+
+    def urls():
+        for i in range(50):
+            pulled.append(i)
+            yield f"https://example.com/{i}"
+
+    async def first_result():
+        async with httpx.AsyncClient(transport=_LocalTransport(http_server)) as client:
+            gen = linkgate_many(urls(), concurrency=5, dns_cache=_dns(["example.com"]), client=client, cache=False)
+            async with contextlib.aclosing(gen):
+                async for result in gen:
+                    return result
+
+    asyncio.run(first_result())
+    assert len(pulled) < 50
+
+
+def test_early_exit_cleans_up_pending_work(http_server):
+    # The consumer stops while lookups are still in flight: nothing may be left half-cancelled behind it
+    hosts = [f"slow{i}.example.com" for i in range(20)]
+    dns = _dns(hosts + ["fast.example.com"], delay=0.3)
+    dns.lookup("fast.example.com")  # Cached, so this one finishes first
+
+    async def first_then_stop():
+        async with httpx.AsyncClient(transport=_LocalTransport(http_server)) as client:
+            urls = ["https://fast.example.com/"] + [f"https://{host}/" for host in hosts]
+            gen = linkgate_many(urls, dns_cache=dns, client=client, cache=False)
+            async with contextlib.aclosing(gen):
+                async for result in gen:
+                    break
+            # Checked before asyncio.run gets to cancel leftovers itself
+            leftovers = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            return result, leftovers, dict(dns.async_in_flight)
+
+    (url, _), leftovers, in_flight = asyncio.run(first_then_stop())
+    assert url == "https://fast.example.com/"
+    assert leftovers == []
+    assert in_flight == {}
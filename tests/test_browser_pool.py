@@ -0,0 +1,146 @@
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+
+import BrowserPool as bp
+
+
+def _pool(**kwargs):
+    return bp.BrowserPool(bp.FakeBackend(), settle_ms=0, **kwargs)
+
+
+def test_fetch_reuses_browser_and_pages(http_server):
+    http_server.routes["/terms"] = (200, {"Content-Type": "text/html"}, b"<p>terms</p>")
+    pool = _pool()
+    try:
+        assert pool.fetch(http_server.url + "/terms") == "<p>terms</p>"
+        assert pool.fetch(http_server.url + "/terms") == "<p>terms</p>"
+        assert pool.stats["launches"] == 1
+        assert len(pool.backend.browsers[0].contexts) == 1  # The second fetch got the idle page back
+    finally:
+        pool.close()
+
+
+def test_error_status_is_none(http_server):
+    pool = _pool()
+    try:
+        assert pool.fetch(http_server.url + "/missing") is None
+        assert pool.stats["failures"] == 0  # A 404 is an answer, not a broken browser
+    finally:
+        pool.close()
+
+
+def test_recycles_after_max_navigations(http_server):
+    http_server.routes["/"] = (200, {}, b"home")
+    pool = _pool(max_navigations=2)
+    try:
+        for _ in range(5):
+            assert pool.fetch(http_server.url + "/") == "home"
+        assert pool.stats["launches"] == 3
+        assert pool.stats["recycles"] == 2
+        assert [b.connected for b in pool.backend.browsers] == [False, False, True]
+    finally:
+        pool.close()
+
+
+def test_relaunches_crashed_browser(http_server):
+    http_server.routes["/"] = (200, {}, b"home")
+    pool = _pool()
+    try:
+        pool.fetch(http_server.url + "/")
+        pool.backend.crash()
+        assert pool.fetch(http_server.url + "/") == "home"
+        assert pool.stats["launches"] == 2
+    finally:
+        pool.close()
+
+
+def test_navigation_failure_drops_the_page():
+    pool = _pool()
+    try:
+        assert pool.fetch("http://127.0.0.1:9/") is None  # Nothing listens on the discard port
+        assert pool.stats["failures"] == 1
+        assert pool.workers[0].idle is None
+    finally:
+        pool.close()
+
+
+def test_close_stops_backend_and_refuses_fetches(http_server):
+    stopped = []
+    pool = _pool(workers=2)
+    pool.backend.stop = lambda: stopped.append(threading.current_thread().name)
+    pool.fetch(http_server.url + "/")
+    pool.close()
+    pool.close()
+    assert sorted(stopped) == ["browser-pool-0", "browser-pool-1"]  # Each worker stops its own Playwright
+    assert not pool.backend.browsers[0].connected
+    assert pool.fetch(http_server.url + "/") is None
+    assert not any(worker.thread.is_alive() for worker in pool.workers)
+
+
+def test_workers_fetch_in_parallel(http_server):
+    http_server.routes["/slow"] = (200, {}, b"slow")
+    http_server.delays["/slow"] = 0.3
+    pool = _pool(workers=2)
+    try:
+        threads = [threading.Thread(target=pool.fetch, args=(http_server.url + "/slow",)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert http_server.peak == 2
+        assert pool.stats["launches"] == 2 and pool.stats["navigations"] == 4
+    finally:
+        pool.close()
+
+
+def test_one_worker_fetches_one_page_at_a_time(http_server):
+    http_server.routes["/slow"] = (200, {}, b"slow")
+    http_server.delays["/slow"] = 0.1
+    pool = _pool(workers=1)
+    try:
+        threads = [threading.Thread(target=pool.fetch, args=(http_server.url + "/slow",)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert http_server.peak == 1
+    finally:
+        pool.close()
+
+
+def test_default_pool_is_closed_at_exit():
+    # A real interpreter exit, with the process-wide pool built on a FakeBackend that reports its stop()
+    script = textwrap.dedent(
+        """
+        import BrowserPool as bp
+
+        import threading
+
+        class Backend(bp.FakeBackend):
+            def stop(self):
+                print("stopped on", threading.current_thread().name, flush=True)
+
+        bp.PlaywrightBackend = Backend
+        bp.get_browser_pool().fetch("http://127.0.0.1:9/")
+        """
+    )
+    package_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "readbeforedoom")
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=package_dir, capture_output=True, text=True, timeout=60
+    )
+    # atexit runs after concurrent.futures stopped its executors, the workers' own threads are still there
+    assert sorted(result.stdout.split("\n")[:-1]) == ["stopped on browser-pool-0", "stopped on browser-pool-1"], result.stderr
+    assert "Traceback" not in result.stderr
+
+
+def test_set_browser_pool_swaps_default():
+    pool = _pool()
+    bp.set_browser_pool(pool)
+    try:
+        assert bp.get_browser_pool() is pool
+    finally:
+        bp.set_browser_pool(None)
+        pool.close()
@@ -0,0 +1,83 @@
+import time
+
+import ClauseFetch
+from ClauseFetch import _fetch_static, probe_candidates
+
+PAGE = (200, {"Content-Type": "text/html"}, b"<html><body><p>Terms of Service</p></body></html>")
+TERMS = "<html><body><h1>Terms of Service</h1>%s</body></html>" % "".join(
+    f"<p>{i}. By using the service you agree to these terms and conditions. We may terminate your account.</p>"
+    for i in range(12)
+)
+
+
+def _trust(url):
+    # The local server is on 127.0.0.1, which linkgate's SSRF rules refuse: let the first url through as is
+    return "valid", {"valid": True, "url": url}
+
+
+def test_static_fetch_validates_the_url(http_server):
+    http_server.routes["/terms"] = PAGE
+    page = _fetch_static(http_server.url + "/terms", timeout=5)
+    assert page["doc"] is None and "127.0.0.1" in page["error"]
+    assert http_server.hits == []
+
+
+def test_static_fetch_validates_every_redirect_hop(http_server, monkeypatch):
+    monkeypatch.setattr(ClauseFetch, "_validate_url", _trust)
+    http_server.routes["/moved"] = (302, {"Location": "/terms"}, b"")
+    http_server.routes["/terms"] = PAGE
+    page = _fetch_static(http_server.url + "/moved", timeout=5)
+    assert page["doc"] is None and page["error"].startswith("Redirect rejected")
+    assert http_server.hits == [("GET", "/moved")]
+
+
+def test_static_fetch_reads_the_page(http_server, monkeypatch):
+    monkeypatch.setattr(ClauseFetch, "_validate_url", _trust)
+    http_server.routes["/terms"] = PAGE
+    page = _fetch_static(http_server.url + "/terms", timeout=5)
+    assert page["error"] is None and "Terms of Service" in page["doc"].text
+
+
+def _terms_site(server, paths, delay=0.0):
+    # Both host names reach the same local server, its peak_per_host tells them apart by the Host header
+    for path in paths:
+        server.routes[path] = (200, {"Content-Type": "text/html"}, TERMS.encode())
+        server.delays[path] = delay
+
+
+def test_probing_caps_requests_per_host(http_server, monkeypatch):
+    monkeypatch.setattr(ClauseFetch, "_validate_url", _trust)
+    paths = [f"/terms{i}" for i in range(6)]
+    _terms_site(http_server, paths, delay=0.2)
+    port = http_server.server_address[1]
+    candidates = [f"http://{host}:{port}{path}" for host in ("127.0.0.1", "localhost") for path in paths]
+
+    found = probe_candidates(candidates, use_playwright=False, workers=8, per_host=2)
+    assert len(found) == len(candidates)
+    assert sorted(http_server.peak_per_host.values()) == [2, 2]
+    assert http_server.peak > 2  # The cap is per host, the two hosts were probed side by side
+
+
+def test_stop_after_drops_the_remaining_probes(http_server, monkeypatch):
+    monkeypatch.setattr(ClauseFetch, "_validate_url", _trust)
+    _terms_site(http_server, ["/terms"])
+    _terms_site(http_server, [f"/slow{i}" for i in range(5)], delay=1.0)
+    candidates = [http_server.url + "/terms"] + [http_server.url + f"/slow{i}" for i in range(5)]
+
+    started = time.monotonic()
+    found = probe_candidates(candidates, use_playwright=False, workers=2, per_host=1, stop_after=1)
+    assert [doc["url"] for doc in found] == [http_server.url + "/terms"]
+    assert time.monotonic() - started < 0.9  # Didn't wait for a slow probe that had already started
+    # At most one slow probe got its slot before the stop, the others never reached the server
+    assert len(http_server.hits) <= 2
+
+
+def test_results_come_back_in_candidate_order(http_server, monkeypatch):
+    monkeypatch.setattr(ClauseFetch, "_validate_url", _trust)
+    for i, delay in enumerate((0.3, 0.2, 0.1, 0.0)):  # Completion order is the reverse of the candidate order
+        _terms_site(http_server, [f"/terms{i}"], delay=delay)
+    candidates = [http_server.url + f"/terms{i}" for i in range(4)]
+    candidates.insert(2, http_server.url + "/missing")  # A 404 is skipped, not a gap
+
+    found = probe_candidates(candidates, use_playwright=False, workers=5, per_host=5)
+    assert [doc["url"] for doc in found] == [url for url in candidates if not url.endswith("/missing")]
@@ -0,0 +1,56 @@
+import json
+import sqlite3
+
+import pytest
+
+import Database
+import textsifter
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "tc_analysis.db")
+    monkeypatch.setattr(Database, "DB_PATH", path)
+    return path
+
+
+def _store(path, rows):
+    with sqlite3.connect(path) as connect:
+        connect.executemany(
+            """
+            INSERT INTO tc_analysis_results (url, url_hash, risk_hits, safety_rating, recommendation)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [(f"https://site{i}.example/", f"{i:064x}", *row) for i, row in enumerate(rows)],
+        )
+
+
+def _expected(hits):
+    analysis = textsifter.risk_analysis(list(hits))
+    return analysis["safety_score"].split("/")[0], analysis["recommendation"]
+
+
+def test_schema_is_set_up_once_per_file(db_path, monkeypatch):
+    calls = []
+    original = Database.init_db
+    monkeypatch.setattr(Database, "init_db", lambda connect: calls.append(1) or original(connect))
+    assert Database.get_fetch_strategy("example.com") is None
+    Database.record_fetch_strategy("example.com", "browser")
+    assert Database.get_fetch_strategy("example.com") == "browser"
+    assert calls == [1]
+
+
+def test_rescore_matches_the_per_document_scorer(db_path):
+    Database.stored_result_urls()  # Creates the tables
+    categories = list(textsifter.pattern_registry.current().patterns)
+    hit_sets = [{}, {categories[0]: 3}, {c: 1 for c in categories[:4]}, {c: 2 for c in categories}]
+    _store(db_path, [(json.dumps(hits), "?", "stale") for hits in hit_sets])
+
+    result = Database.rescore_all_results(batch_size=3)
+    assert result == {"success": True, "rescored": 4, "updated": 4}
+    with sqlite3.connect(db_path) as connect:
+        stored = connect.execute("SELECT safety_rating, recommendation FROM tc_analysis_results ORDER BY id").fetchall()
+    assert stored == [_expected(hits) for hits in hit_sets]
+
+    # Nothing moved, nothing is written
+    assert Database.rescore_all_results()["updated"] == 0
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from DnsCache import DnsCache, StubResolver
+
+RECORDS = {
+    "example.com": {"A": ["93.184.216.34"], "AAAA": ["2606:2800:220:1::1"]},
+    "v4only.example": {"A": ["192.0.2.1"]},
+    "a.example": {"A": ["192.0.2.10"]},
+    "b.example": {"A": ["192.0.2.11"]},
+    "c.example": {"A": ["192.0.2.12"]},
+}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def _cache(clock, ttl=300, timeouts=(), **kwargs):
+    return DnsCache(StubResolver(RECORDS, ttl=ttl, timeouts=timeouts), clock=clock, **kwargs)
+
+
+def test_answer_is_cached_for_its_ttl(clock):
+    cache = _cache(clock, ttl=120)
+    assert cache.lookup("Example.com.") == {"iplist": ["93.184.216.34", "2606:2800:220:1::1"]}
+    clock.now += 119
+    assert cache.lookup("example.com")["iplist"][0] == "93.184.216.34"
+    assert len(cache.resolver.queries) == 2  # A and AAAA once
+    assert cache.stats["hits"] == 1
+
+    clock.now += 1
+    cache.lookup("example.com")
+    assert len(cache.resolver.queries) == 4
+    assert cache.stats["expired"] == 1 and cache.stats["misses"] == 2
+
+
+@pytest.mark.parametrize("ttl, cached_for", [(5, 30), (86400, 3600)])
+def test_ttl_is_clamped(clock, ttl, cached_for):
+    cache = _cache(clock, ttl=ttl)
+    cache.lookup("v4only.example")
+    clock.now += cached_for - 1
+    cache.lookup("v4only.example")
+    assert cache.stats["misses"] == 1
+    clock.now += 1
+    cache.lookup("v4only.example")
+    assert cache.stats["misses"] == 2
+
+
+def test_nxdomain_is_cached_for_the_negative_ttl(clock):
+    cache = _cache(clock, negative_ttl=60)
+    result = cache.lookup("nope.example")
+    assert result["valid"] is False and "does not exist" in result["message"]
+    assert "transient" not in result
+
+    clock.now += 59
+    assert cache.lookup("nope.example") == result
+    assert cache.stats["negative_hits"] == 1
+    assert cache.resolver.queries.count(("nope.example", "A")) == 1
+
+    clock.now += 1
+    cache.lookup("nope.example")
+    assert cache.stats["misses"] == 2
+
+
+def test_timeouts_are_not_cached(clock):
+    cache = _cache(clock, timeouts=["slow.example"])
+    result = cache.lookup("slow.example")
+    assert result["transient"] is True and "timed out" in result["message"]
+    assert cache.lookup("slow.example")["transient"] is True
+    assert cache.stats["misses"] == 2
+    assert "slow.example" not in cache.entries
+
+    # Once the resolver answers again, the next lookup gets through
+    cache.resolver.timeouts.clear()
+    cache.resolver.records["slow.example"] = {"A": ["192.0.2.20"]}
+    assert cache.lookup("slow.example") == {"iplist": ["192.0.2.20"]}
+
+
+def test_lru_evicts_the_least_recently_used_host(clock):
+    cache = _cache(clock, max_entries=2)
+    cache.lookup("a.example")
+    cache.lookup("b.example")
+    cache.lookup("a.example")  # a is now the most recently used
+    cache.lookup("c.example")
+    assert list(cache.entries) == ["a.example", "c.example"]
+    assert cache.stats["evictions"] == 1
+
+    cache.lookup("b.example")
+    assert cache.stats["misses"] == 4
+
+
+def test_async_lookup_shares_the_cache(clock):
+    cache = _cache(clock, ttl=60)
+    assert cache.lookup("v4only.example") == {"iplist": ["192.0.2.1"]}
+    assert asyncio.run(cache.alookup("v4only.example")) == {"iplist": ["192.0.2.1"]}
+    clock.now += 60
+    asyncio.run(cache.alookup("v4only.example"))
+    assert cache.stats["misses"] == 2 and cache.stats["hits"] == 1
@@ -0,0 +1,27 @@
+import time
+
+from HttpClient import HttpClient
+
+
+def test_short_retry_after_is_waited_out(http_server):
+    http_server.routes["/busy"] = (503, {"Retry-After": "1"}, b"")
+    client = HttpClient()
+    started = time.monotonic()
+    assert client.head(http_server.url + "/busy", timeout=5).status_code == 503
+    assert time.monotonic() - started >= 1
+    assert http_server.hits == [("HEAD", "/busy")] * 2
+
+
+def test_long_retry_after_returns_at_once(http_server):
+    http_server.routes["/busy"] = (429, {"Retry-After": "30"}, b"")
+    client = HttpClient()
+    started = time.monotonic()
+    assert client.head(http_server.url + "/busy", timeout=5).status_code == 429
+    assert time.monotonic() - started < 2
+    assert http_server.hits == [("HEAD", "/busy")]
+
+
+def test_one_retry_by_default(http_server):
+    http_server.routes["/down"] = (502, {}, b"")
+    assert HttpClient().get(http_server.url + "/down").status_code == 502
+    assert http_server.hits == [("GET", "/down")] * 2
@@ -0,0 +1,51 @@
+import json
+import os
+
+import pytest
+
+import textsifter
+from textsifter import PatternRegistry
+
+RULES = {"patterns": {"arbitration": {"regex": r"\bbinding arbitration\b", "severity": "high"}}}
+
+
+@pytest.fixture
+def registry(tmp_path):
+    path = tmp_path / "risk_patterns.json"
+    path.write_text(json.dumps(RULES), encoding="utf-8")
+    return PatternRegistry(str(path), cache_dir=str(tmp_path / "cache"))
+
+
+def _save(registry, content, mtime):
+    with open(registry.path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.utime(registry.path, (mtime, mtime))
+    registry.checked_at -= textsifter.RELOAD_CHECK_SECONDS  # Due for an mtime check on the next current()
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        '{"patterns": {"arbitration": {"regex": ',  # Half-saved
+        json.dumps({"patterns": {"arbitration": {"regex": "(unclosed"}}}),
+        json.dumps({"scoring": {}}),
+    ],
+)
+def test_bad_file_keeps_the_last_good_rules(registry, content, monkeypatch, capsys):
+    good = registry.current()
+    _save(registry, content, 2000000000)
+    assert registry.current() is good
+    assert "keeping pattern version" in capsys.readouterr().out
+
+    # Not parsed again until the file changes
+    loads = []
+    original = registry._load
+    monkeypatch.setattr(registry, "_load", lambda: loads.append(1) or original())
+    registry.checked_at -= textsifter.RELOAD_CHECK_SECONDS
+    assert registry.current() is good
+    assert loads == []
+
+    _save(registry, json.dumps({"patterns": {"refunds": {"regex": r"\bno refunds\b"}}}), 2000000100)
+    fixed = registry.current()
+    assert loads == [1]
+    assert list(fixed.patterns) == ["refunds"] and fixed.version != good.version
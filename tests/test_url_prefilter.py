@@ -0,0 +1,170 @@
+import json
+import random
+import re
+
+import pytest
+
+from Linkgate import _precheck, is_valid_hostname, validate_url
+from UrlPrefilter import normalize_url, prefilter, prefilter_file
+from VerdictCache import cache_key, with_scheme
+
+
+@pytest.mark.parametrize(
+    "url, reason",
+    [
+        ("http://[bad/", "malformed"),
+        ("mailto:bob@example.com", "bad_scheme"),
+        ("javascript:void(0)", "bad_scheme"),
+        ("data:text/html,hi", "bad_scheme"),
+        ("ftp:host", "bad_scheme"),
+        ("ftp://example.com/file", "bad_scheme"),
+        ("https://", "no_host"),
+        ("http://example.com:99999/", "bad_port"),
+        ("http://example.com:http/", "bad_port"),
+        ("http://1.2.3.4/", "ip_literal"),
+        ("http://[::1]/", "ip_literal"),
+        ("http://\u0080.com/", "idna"),
+        ("http://-bad-.com/", "bad_label"),
+        ("http://a..com/", "bad_label"),
+        ("http://example.com.", "bad_label"),  # Empty last label, linkgate's hostname check refuses it too
+        ("http://wwww.example.com/", "bad_label"),
+        ("http://" + "a" * 64 + ".com/", "bad_label"),
+        ("http://foo.notatld/", "unknown_tld"),
+    ],
+)
+def test_rejection_reasons(url, reason):
+    normalized, host, problem = normalize_url(url)
+    assert normalized is None and host is None
+    assert problem[0] == reason
+
+
+@pytest.mark.parametrize(
+    "url, normalized",
+    [
+        ("example.com", "https://example.com/"),
+        ("example.com:8080/x", "https://example.com:8080/x"),
+        ("//Example.com/a", "https://example.com/a"),
+        ("HTTPS://Example.COM:443/b?q=1#frag", "https://example.com/b?q=1"),
+        ("http://example.com:80", "http://example.com/"),
+        ("https://bücher.de/agb", "https://xn--bcher-kva.de/agb"),
+        ("https://example.com/a;p?q", "https://example.com/a;p?q"),
+    ],
+)
+def test_normalization(url, normalized):
+    assert normalize_url(url)[0] == normalized
+
+
+def test_with_scheme_tells_ports_from_schemes():
+    assert with_scheme("localhost:8080") == "https://localhost:8080"
+    assert with_scheme("mailto:bob@example.com") == "mailto:bob@example.com"
+    assert cache_key("mailto:bob@example.com") == "mailto:bob@example.com"
+    assert cache_key("example.com:8080/x") == "https://example.com:8080/x"
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "mailto:bob@example.com",
+        "javascript:alert(1)",
+        "ftp:host",
+        "example.com",
+        "example.com:8080/x",
+        "//Example.com/a",
+        "http://example.com.",
+        "http://example.com:99999/",
+        "https://",
+        "http://1.2.3.4/",
+        "https://bücher.de/agb",
+        "https://BÜCHER.de/",
+        "http://\u0080.com/",
+        "http://a..com/",
+        "http://foo.notatld/",
+    ],
+)
+def test_prefilter_agrees_with_linkgate(url):
+    # What the prefilter lets through linkgate must not reject offline, and the other way around
+    normalized, host, problem = normalize_url(url)
+    kind, checked = _precheck(url)
+    assert (problem is None) == (kind is None)
+    if problem is None:
+        assert checked[1] == host
+    else:
+        assert checked["message"] == problem[1]
+
+
+def test_linkgate_names_the_bad_scheme():
+    for url in ("mailto:bob@example.com", "javascript:alert(1)", "ftp:host"):
+        assert "scheme" in validate_url(url)["message"]
+
+
+def test_prefilter_streams_in_order_and_dedupes_hosts():
+    lines = ["", "# comment", "example.com/a", "HTTPS://Example.COM/b", "ftp://x.com", "https://other.org/"]
+    records = list(prefilter(iter(lines)))
+    assert [r["input"] for r in records] == ["example.com/a", "HTTPS://Example.COM/b", "ftp://x.com", "https://other.org/"]
+    assert [r["reason"] for r in records] == [None, "duplicate", "bad_scheme", None]
+    assert [r["url"] for r in records] == ["https://example.com/a", None, None, "https://other.org/"]
+
+
+def test_dedupe_per_url():
+    lines = ["example.com/a", "https://example.com/b", "HTTPS://EXAMPLE.com/a#x"]
+    assert [r["reason"] for r in prefilter(lines, dedupe_hosts=False)] == [None, None, "duplicate"]
+
+
+def test_prefilter_file(tmp_path):
+    src = tmp_path / "urls.txt"
+    src.write_text("example.com\nmailto:x@example.com\nexample.com/again\nhttp://10.0.0.1/\n", encoding="utf-8")
+    counts = prefilter_file(str(src), str(tmp_path / "ok.txt"), str(tmp_path / "rejects.jsonl"))
+    assert counts == {"survivors": 1, "bad_scheme": 1, "duplicate": 1, "ip_literal": 1}
+    assert (tmp_path / "ok.txt").read_text(encoding="utf-8") == "https://example.com/\n"
+    rejects = [json.loads(line) for line in (tmp_path / "rejects.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert [r["reason"] for r in rejects] == ["bad_scheme", "duplicate", "ip_literal"]
+
+
+@pytest.mark.parametrize(
+    "hostname, valid",
+    [
+        ("example.com", True),
+        ("a.b-c.d1.com", True),
+        ("xn--bcher-kva.de", True),
+        ("www.example.com", True),
+        ("wwww.example.com", False),  # Runs of one character are typos, not labels
+        ("aaa.com", True),
+        ("-a.com", False),
+        ("a-.com", False),
+        ("a..com", False),
+        ("a_b.com", False),
+        ("ab" * 31 + "a.com", True),
+        ("ab" * 32 + ".com", False),  # 64 character label
+        (".".join(["ab" * 31] * 4) + ".c", True),  # 253 characters
+        (".".join(["ab" * 31] * 4) + ".co", False),
+        ("", False),
+    ],
+)
+def test_is_valid_hostname(hostname, valid):
+    assert is_valid_hostname(hostname) is valid
+
+
+def _legacy_is_valid_hostname(hostname):
+    # The three-pass check is_valid_hostname replaced, kept here to pin down that behaviour didn't change
+    if len(hostname) > 253:
+        return False
+    labels = hostname.split(".")
+    for label in labels:
+        if len(label) > 63:
+            return False
+    pattern = re.compile(r"^[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?$", re.IGNORECASE)
+    for label in labels:
+        if not pattern.match(label):
+            return False
+    for label in labels:
+        if re.match(r"^(.)\1{3,}$", label, re.IGNORECASE):
+            return False
+    return True
+
+
+def test_is_valid_hostname_matches_the_old_check():
+    rng = random.Random(6008)
+    alphabet = "ab0-_.wW"
+    for _ in range(20000):
+        host = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+        assert is_valid_hostname(host) == _legacy_is_valid_hostname(host), host
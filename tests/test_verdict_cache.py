@@ -0,0 +1,143 @@
+import pytest
+
+import Linkgate
+from Linkgate import _status_kind
+from VerdictCache import VerdictCache, cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def cache(clock):
+    return VerdictCache(backoff_base=30, backoff_max=120, clock=clock)
+
+
+def _fail(url):
+    return {"valid": False, "url": url, "message": "Connection failed"}
+
+
+def test_cache_key_normalizes():
+    assert cache_key("Example.COM") == "https://example.com/"
+    assert cache_key("HTTP://Example.com/A?q=1#frag") == "http://example.com/A?q=1"
+
+
+@pytest.mark.parametrize("kind, ttl", [("valid", 3600), ("invalid", 24 * 3600), ("blocked", 60), ("unreachable", 60)])
+def test_each_kind_expires_after_its_ttl(cache, clock, kind, ttl):
+    cache.put("https://example.com/", kind, {"valid": kind == "valid", "url": "https://example.com/"})
+    clock.now += ttl - 1
+    assert cache.get("https://example.com/")[0] == kind
+    clock.now += 1
+    cache.backoff.clear()
+    assert cache.get("https://example.com/") is None
+
+
+def test_hits_and_misses_are_counted(cache):
+    assert cache.get("https://example.com/") is None
+    cache.put("https://example.com/", "valid", {"valid": True, "url": "https://example.com/"})
+    cache.get("example.com")  # Same key after normalization
+    assert cache.stats["misses"] == 1
+    assert cache.stats["hits"] == cache.stats["valid_hits"] == 1
+
+
+def test_live_response_is_not_stored(cache):
+    cache.put("https://example.com/", "valid", {"valid": True, "url": "https://example.com/", "response": object()})
+    assert "response" not in cache.get("https://example.com/")[1]
+
+
+def test_backoff_doubles_and_caps(cache, clock):
+    delays = []
+    for _ in range(4):
+        cache.put("https://down.example/", "unreachable", _fail("https://down.example/"))
+        failures, retry_at = cache.backoff["down.example"]
+        delays.append(retry_at - clock.now)
+    assert delays == [30, 60, 120, 120]
+    assert failures == 4
+
+
+def test_backoff_skips_other_urls_on_the_host_until_it_runs_out(cache, clock):
+    cache.put("https://down.example/a", "unreachable", _fail("https://down.example/a"))
+    kind, result = cache.get("https://down.example/b")
+    assert kind == "unreachable" and not result["valid"]
+    assert cache.stats["backoff_skips"] == 1
+
+    clock.now += 30
+    assert cache.get("https://down.example/b") is None
+
+
+def test_valid_verdict_resets_backoff(cache, clock):
+    cache.put("https://flaky.example/", "unreachable", _fail("https://flaky.example/"))
+    cache.put("https://flaky.example/", "unreachable", _fail("https://flaky.example/"))
+    clock.now += 60
+    cache.put("https://flaky.example/", "valid", {"valid": True, "url": "https://flaky.example/"})
+    assert "flaky.example" not in cache.backoff
+
+    cache.put("https://flaky.example/x", "unreachable", _fail("https://flaky.example/x"))
+    assert cache.backoff["flaky.example"][0] == 1  # Counting starts over
+
+
+def test_redirect_target_failure_backs_off_the_target_only(cache):
+    # The origin answered with a redirect, the hop it pointed to timed out
+    cache.put("https://origin.example/", "unreachable", _fail("https://cdn.other.example/page"))
+    assert "origin.example" not in cache.backoff
+    assert "cdn.other.example" in cache.backoff
+    assert cache.get("https://origin.example/elsewhere") is None
+    assert cache.get("https://cdn.other.example/else")[0] == "unreachable"
+
+
+def test_dns_timeout_on_bare_host_backs_off_that_host(cache):
+    # DNS errors carry the bare hostname as their "url"
+    cache.put("https://origin.example/", "unreachable", _fail("slow-dns.example"))
+    assert list(cache.backoff) == ["slow-dns.example"]
+
+
+def test_fetch_path_only_gets_failures(cache):
+    cache.put("https://ok.example/", "valid", {"valid": True, "url": "https://ok.example/"})
+    cache.put("https://gone.example/", "invalid", _fail("https://gone.example/"))
+    cache.put("https://nohead.example/", "blocked", _fail("https://nohead.example/"))
+    assert cache.get("https://ok.example/", valid=False) is None
+    assert cache.get("https://nohead.example/", valid=False) is None
+    assert cache.get("https://gone.example/", valid=False)[0] == "invalid"
+    assert cache.get("https://ok.example/")[0] == "valid"
+
+
+def test_fetch_path_still_honours_backoff(cache):
+    cache.put("https://down.example/", "unreachable", _fail("https://down.example/"))
+    assert cache.get("https://down.example/other", valid=False)[0] == "unreachable"
+
+
+def test_lru_evicts_oldest(clock):
+    cache = VerdictCache(max_entries=2, clock=clock)
+    for name in ("a", "b", "c"):
+        cache.put(f"https://{name}.example/", "invalid", _fail(f"https://{name}.example/"))
+    assert cache.get("https://a.example/") is None
+    assert cache.get("https://c.example/")[0] == "invalid"
+
+
+@pytest.mark.parametrize(
+    "status, kind",
+    [(404, "invalid"), (410, "invalid"), (403, "blocked"), (405, "blocked"), (408, "blocked"),
+     (429, "unreachable"), (503, "unreachable")],
+)
+def test_status_kinds(status, kind):
+    assert _status_kind(status) == kind
+
+
+def test_scheme_less_host_and_port_cannot_poison_the_explicit_url(cache, monkeypatch):
+    # "example.com:8080/x" is keyed as https://example.com:8080/x, so linkgate has to read it that way too
+    # instead of caching a bad-scheme verdict for the real url for a whole day
+    monkeypatch.setattr(Linkgate, "get_verdict_cache", lambda: cache)
+    monkeypatch.setattr(Linkgate, "ipvcollector", lambda host: {"iplist": ["93.184.216.34"]})
+    monkeypatch.setattr(Linkgate, "_head_check", lambda url1: ("valid", {"valid": True, "url": url1}))
+    assert Linkgate.linkgate("example.com:8080/x") == {"valid": True, "url": "https://example.com:8080/x"}
+    assert cache.get("https://example.com:8080/x")[0] == "valid"